@@ -4,6 +4,10 @@
 CREATE SCHEMA IF NOT EXISTS staging;
 CREATE SCHEMA IF NOT EXISTS core;
 
+-- Trigram and btree GIN operator classes for the dimension search indexes
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
 -- Drop all tables in both schemas to reset the state if condition is true
 DO $$
 DECLARE
@@ -28,27 +32,74 @@ END $$;
 -- =========================================================
 -- Dimensions
 -- =========================================================
+-- Table: dim_tenant, one row per portfolio company hosted by this deployment.
+-- Every company-specific table carries tenant_id and leads its keys and indexes
+-- with it; the calendar, currencies and FX rates are shared.
+CREATE TABLE IF NOT EXISTS core.dim_tenant (
+  tenant_id TEXT PRIMARY KEY CHECK (tenant_id ~ '^[A-Za-z0-9_]{1,63}$'),
+  tenant_name TEXT NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Function: current_tenant, the tenant of this session (set by core.db.tenant_session);
+-- errors when no tenant was selected, so unscoped reads fail instead of mixing tenants.
+-- A pooled connection's tenant is RESET on checkin, which leaves the setting '' rather
+-- than undefined, so both count as unset.
+CREATE OR REPLACE FUNCTION core.current_tenant() RETURNS TEXT
+  LANGUAGE plpgsql STABLE PARALLEL SAFE
+  AS $$
+DECLARE
+  v_tenant_id TEXT := NULLIF(current_setting('app.tenant_id', true), '');
+BEGIN
+  IF v_tenant_id IS NULL THEN
+    RAISE EXCEPTION 'no tenant selected: app.tenant_id is not set'
+      USING HINT = 'Run the query inside core.db.tenant_session().';
+  END IF;
+  RETURN v_tenant_id;
+END $$;
+
 -- Table: dim_product
 CREATE TABLE IF NOT EXISTS core.dim_product (
-  product_id TEXT PRIMARY KEY,
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  product_id TEXT NOT NULL,
+  product_key INT GENERATED ALWAYS AS IDENTITY UNIQUE,
   product_name TEXT NOT NULL,
   product_type TEXT NOT NULL,
   currency TEXT NOT NULL,
   price_monthly NUMERIC(18,2) NOT NULL,
-  price_annual NUMERIC(18,2) NOT NULL
+  price_annual NUMERIC(18,2) NOT NULL,
+  PRIMARY KEY (tenant_id, product_id)
 );
 
+-- Search indexes (core.dim_queries): the C-collated lower(name) btree serves
+-- prefix matches and keyset paging in name order, the trigram GIN substrings
+CREATE INDEX IF NOT EXISTS ix_dim_product_name_search
+  ON core.dim_product (tenant_id, (lower(product_name)) COLLATE "C", product_id);
+CREATE INDEX IF NOT EXISTS ix_dim_product_name_trgm
+  ON core.dim_product
+  USING GIN (tenant_id, (lower(product_name)) COLLATE "C" gin_trgm_ops);
+
 -- Table: dim_customer
 CREATE TABLE IF NOT EXISTS core.dim_customer (
-  customer_id TEXT PRIMARY KEY,
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  customer_id TEXT NOT NULL,
+  customer_key INT GENERATED ALWAYS AS IDENTITY UNIQUE,
   name TEXT NOT NULL,
   email TEXT NOT NULL,
   country TEXT NOT NULL,
   region TEXT NOT NULL,
   signup_date DATE NOT NULL,
-  is_active BOOLEAN NOT NULL
+  is_active BOOLEAN NOT NULL,
+  PRIMARY KEY (tenant_id, customer_id)
 );
 
+CREATE INDEX IF NOT EXISTS ix_dim_customer_country
+  ON core.dim_customer (tenant_id, country);
+CREATE INDEX IF NOT EXISTS ix_dim_customer_name_search
+  ON core.dim_customer (tenant_id, (lower(name)) COLLATE "C", customer_id);
+CREATE INDEX IF NOT EXISTS ix_dim_customer_name_trgm
+  ON core.dim_customer USING GIN (tenant_id, (lower(name)) COLLATE "C" gin_trgm_ops);
+
 -- Table: dim_date
 CREATE TABLE IF NOT EXISTS core.dim_date (
   date_id DATE PRIMARY KEY,
@@ -59,6 +110,156 @@ CREATE TABLE IF NOT EXISTS core.dim_date (
   day INT NOT NULL
 );
 
+-- Function: month_key (months since 1970-01, so month arithmetic is integer arithmetic)
+CREATE OR REPLACE FUNCTION core.month_key(d DATE) RETURNS INT
+  LANGUAGE SQL IMMUTABLE PARALLEL SAFE
+  AS $$ SELECT ((EXTRACT(YEAR FROM d)::INT - 1970) * 12 + EXTRACT(MONTH FROM d)::INT - 1) $$;
+
+-- Function: customer_sample_bucket (stable hash bucket 0-1023 of a customer_id; the
+-- approximate-mode sample is every customer in buckets 0-63)
+CREATE OR REPLACE FUNCTION core.customer_sample_bucket(customer_id TEXT) RETURNS INT
+  LANGUAGE SQL IMMUTABLE PARALLEL SAFE
+  AS $$ SELECT hashtext(customer_id) & 1023 $$;
+
+-- Function: ensure_month_partitions, create any missing monthly range partitions of a
+-- table partitioned by month (a DATE column, or a month_key column when p_month_key)
+CREATE OR REPLACE FUNCTION core.ensure_month_partitions(
+  p_parent REGCLASS, p_from DATE, p_to DATE, p_month_key BOOLEAN DEFAULT FALSE
+) RETURNS INT
+  LANGUAGE plpgsql
+  AS $$
+DECLARE
+  v_schema TEXT;
+  v_table TEXT;
+  v_month DATE;
+  v_partition TEXT;
+  v_created INT := 0;
+BEGIN
+  IF p_from IS NULL OR p_to IS NULL THEN
+    RETURN 0;
+  END IF;
+
+  SELECT n.nspname, c.relname INTO v_schema, v_table
+  FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+  WHERE c.oid = p_parent;
+
+  v_month := DATE_TRUNC('month', p_from)::DATE;
+  WHILE v_month <= p_to LOOP
+    v_partition := v_table || '_' || TO_CHAR(v_month, 'YYYYMM');
+    IF to_regclass(format('%I.%I', v_schema, v_partition)) IS NULL THEN
+      IF p_month_key THEN
+        EXECUTE format(
+          'CREATE TABLE %I.%I PARTITION OF %s FOR VALUES FROM (%s) TO (%s)',
+          v_schema, v_partition, p_parent,
+          core.month_key(v_month), core.month_key(v_month) + 1
+        );
+      ELSE
+        EXECUTE format(
+          'CREATE TABLE %I.%I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+          v_schema, v_partition, p_parent,
+          v_month, (v_month + INTERVAL '1 month')::DATE
+        );
+      END IF;
+      v_created := v_created + 1;
+    END IF;
+    v_month := (v_month + INTERVAL '1 month')::DATE;
+  END LOOP;
+  RETURN v_created;
+END $$;
+
+-- Function: drop_month_partitions, retention by dropping whole monthly partitions
+-- (no table-wide DELETE) for months before p_before; the monthly partitions may sit
+-- directly under p_parent or under its tenant partitions
+CREATE OR REPLACE FUNCTION core.drop_month_partitions(
+  p_parent REGCLASS, p_before DATE
+) RETURNS INT
+  LANGUAGE plpgsql
+  AS $$
+DECLARE
+  v_partition REGCLASS;
+  v_parent REGCLASS;
+  v_dropped INT := 0;
+BEGIN
+  FOR v_partition, v_parent IN
+    SELECT t.relid, t.parentrelid
+    FROM pg_partition_tree(p_parent) t
+    JOIN pg_class c ON c.oid = t.relid
+    WHERE t.isleaf
+      AND t.level > 0
+      AND RIGHT(c.relname, 6) ~ '^[0-9]{6}$'
+      AND TO_DATE(RIGHT(c.relname, 6), 'YYYYMM') < DATE_TRUNC('month', p_before)
+  LOOP
+    EXECUTE format('ALTER TABLE %s DETACH PARTITION %s', v_parent, v_partition);
+    EXECUTE format('DROP TABLE %s', v_partition);
+    v_dropped := v_dropped + 1;
+  END LOOP;
+  RETURN v_dropped;
+END $$;
+
+-- Function: tenant_partition, get a tenant's partition of a table list-partitioned by
+-- tenant_id, creating it when missing. With p_month_column it is range-partitioned by
+-- month on that column (months are added by ensure_month_partitions); with
+-- p_references it gets a foreign key on (tenant_id, p_ref_column) to that table's
+-- partition of the same tenant, so a reload can TRUNCATE the pair without touching
+-- other tenants.
+CREATE OR REPLACE FUNCTION core.tenant_partition(
+  p_parent REGCLASS,
+  p_tenant_id TEXT,
+  p_month_column TEXT DEFAULT NULL,
+  p_references REGCLASS DEFAULT NULL,
+  p_ref_column TEXT DEFAULT NULL
+) RETURNS REGCLASS
+  LANGUAGE plpgsql
+  AS $$
+DECLARE
+  v_schema TEXT;
+  v_table TEXT;
+  v_partition TEXT;
+  v_regclass REGCLASS;
+BEGIN
+  SELECT n.nspname, c.relname INTO v_schema, v_table
+  FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+  WHERE c.oid = p_parent;
+
+  -- Leave room for the _YYYYMM suffix of month partitions within 63 characters
+  v_partition := v_table || '_t_' || p_tenant_id;
+  IF length(v_partition) > 56 THEN
+    v_partition := v_table || '_t_' || left(md5(p_tenant_id), 12);
+  END IF;
+
+  v_regclass := to_regclass(format('%I.%I', v_schema, v_partition));
+  IF v_regclass IS NOT NULL THEN
+    RETURN v_regclass;
+  END IF;
+
+  EXECUTE format(
+    'CREATE TABLE %I.%I PARTITION OF %s FOR VALUES IN (%L)%s',
+    v_schema, v_partition, p_parent, p_tenant_id,
+    CASE WHEN p_month_column IS NOT NULL
+      THEN format(' PARTITION BY RANGE (%I)', p_month_column) ELSE '' END
+  );
+  v_regclass := format('%I.%I', v_schema, v_partition)::REGCLASS;
+  IF p_references IS NOT NULL THEN
+    EXECUTE format(
+      'ALTER TABLE %s ADD FOREIGN KEY (tenant_id, %I) REFERENCES %s (tenant_id, %I)',
+      v_regclass, p_ref_column,
+      core.tenant_partition(p_references, p_tenant_id), p_ref_column
+    );
+  END IF;
+  RETURN v_regclass;
+END $$;
+
+-- Derived Table: dim_month from dim_date
+CREATE TABLE IF NOT EXISTS core.dim_month (
+  month_key INT PRIMARY KEY,
+  month_start DATE NOT NULL UNIQUE,
+  month_end DATE NOT NULL,
+  year INT NOT NULL,
+  quarter INT NOT NULL,
+  month INT NOT NULL,
+  month_label TEXT NOT NULL
+);
+
 -- Table: dim_currency
 CREATE TABLE IF NOT EXISTS core.dim_currency (
   currency_code TEXT PRIMARY KEY,
@@ -67,27 +268,37 @@ CREATE TABLE IF NOT EXISTS core.dim_currency (
 
 -- Table: dim_department
 CREATE TABLE IF NOT EXISTS core.dim_department (
-  department_id TEXT PRIMARY KEY,
-  department_name TEXT NOT NULL
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  department_id TEXT NOT NULL,
+  department_name TEXT NOT NULL,
+  PRIMARY KEY (tenant_id, department_id)
 );
 
 --  Table: dim_employee
 CREATE TABLE IF NOT EXISTS core.dim_employee (
-  employee_id TEXT PRIMARY KEY,
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  employee_id TEXT NOT NULL,
   employee_name TEXT NOT NULL,
   hire_date DATE NOT NULL,
   termination_date DATE,
-  department_id TEXT NOT NULL REFERENCES core.dim_department(department_id),
+  department_id TEXT NOT NULL,
   country TEXT NOT NULL,
   title TEXT NOT NULL,
-  salary NUMERIC(18,2) NOT NULL
+  salary NUMERIC(18,2) NOT NULL,
+  -- Set while the employee is missing from the source; history is kept
+  is_deleted BOOLEAN NOT NULL DEFAULT FALSE,
+  PRIMARY KEY (tenant_id, employee_id),
+  FOREIGN KEY (tenant_id, department_id)
+    REFERENCES core.dim_department(tenant_id, department_id)
 );
 
 -- Table: dim_other_expense_type
 CREATE TABLE IF NOT EXISTS core.dim_other_expense_type (
-  other_expense_type_id TEXT PRIMARY KEY,
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  other_expense_type_id TEXT NOT NULL,
   expense_type_name TEXT NOT NULL,
-  expense_description TEXT NOT NULL
+  expense_description TEXT NOT NULL,
+  PRIMARY KEY (tenant_id, other_expense_type_id)
 );
 
 -- =========================================================
@@ -101,12 +312,13 @@ CREATE TABLE IF NOT EXISTS core.fact_fx_rate (
   CONSTRAINT pk_fx PRIMARY KEY (date_id, currency_code)
 );
 
--- Table: fact_subscription_revenue
+-- Table: fact_subscription_revenue (partitioned by month of date_id)
 CREATE TABLE IF NOT EXISTS core.fact_subscription_revenue (
-  fact_id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  fact_id BIGSERIAL NOT NULL,
   date_id DATE NOT NULL REFERENCES core.dim_date(date_id),
-  customer_id TEXT NOT NULL REFERENCES core.dim_customer(customer_id),
-  product_id TEXT NOT NULL REFERENCES core.dim_product(product_id),
+  customer_key INT NOT NULL REFERENCES core.dim_customer(customer_key),
+  product_key INT NOT NULL REFERENCES core.dim_product(product_key),
   billing_cycle TEXT NOT NULL,
   amount_lcy NUMERIC(18,2) NOT NULL,
   currency_code TEXT NOT NULL REFERENCES core.dim_currency(currency_code),
@@ -118,69 +330,99 @@ CREATE TABLE IF NOT EXISTS core.fact_subscription_revenue (
   ingest_batch_id TEXT,
   ingest_ts TIMESTAMPTZ NOT NULL DEFAULT now(),
 
+  PRIMARY KEY (fact_id, date_id),
   CONSTRAINT fk_subrev_fx
     FOREIGN KEY (date_id, currency_code)
     REFERENCES core.fact_fx_rate(date_id, currency_code)
     DEFERRABLE INITIALLY DEFERRED
-);
+) PARTITION BY RANGE (date_id);
 
 CREATE INDEX IF NOT EXISTS ix_subrev_slide
-  ON core.fact_subscription_revenue (date_id, customer_id, product_id, billing_cycle);
-
--- Derived Table: fact_subscription from fact_subscription_revenue
+  ON core.fact_subscription_revenue (
+    tenant_id, date_id, customer_key, product_key, billing_cycle
+  );
+CREATE INDEX IF NOT EXISTS brin_subrev_date
+  ON core.fact_subscription_revenue USING BRIN (date_id);
+
+-- Derived Table: fact_subscription from fact_subscription_revenue (partitioned by
+-- tenant, so a tenant's rebuild truncates its own partition)
 CREATE TABLE IF NOT EXISTS core.fact_subscription (
-  subscription_id BIGSERIAL PRIMARY KEY, --Check this
-  customer_id TEXT NULL,
-  product_id TEXT NULL,
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  subscription_id BIGSERIAL NOT NULL,
+  customer_key INT NULL,
+  product_key INT NULL,
   billing_cycle TEXT NULL,
   price_per_period NUMERIC(18,2) NOT NULL,
   mrr_value NUMERIC(18,2) NOT NULL,
   currency_code TEXT NOT NULL,
   start_date TEXT NOT NULL,
   end_date TEXT,
-  status TEXT NOT NULL
-);
+  status TEXT NOT NULL,
+  PRIMARY KEY (tenant_id, subscription_id)
+) PARTITION BY LIST (tenant_id);
 
 -- Create index
 CREATE UNIQUE INDEX IF NOT EXISTS uq_fact_subscription_mvp
   ON core.fact_subscription (
-    customer_id, 
-    product_id, 
+    tenant_id,
+    customer_key, 
+    product_key, 
     billing_cycle,
     price_per_period,
     currency_code,
     start_date
 );
 
--- Derived Table: fact_subscription_snapshot_monthly from fact_subscription
+-- Derived Table: fact_subscription_snapshot_monthly from fact_subscription (partitioned
+-- by tenant, then by month_key; each tenant partition references that tenant's
+-- fact_subscription partition, see core.tenant_partition)
 CREATE TABLE IF NOT EXISTS core.fact_subscription_snapshot_monthly (
-  snapshot_month DATE NOT NULL,
-  subscription_id BIGINT NOT NULL REFERENCES core.fact_subscription(subscription_id),
-  customer_id TEXT NOT NULL,
-  product_id TEXT NOT NULL,
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  month_key INT NOT NULL REFERENCES core.dim_month(month_key),
+  subscription_id BIGINT NOT NULL,
+  customer_key INT NOT NULL,
+  product_key INT NOT NULL,
   mrr_value NUMERIC(18,2) NOT NULL,
-  PRIMARY KEY (snapshot_month, subscription_id)
-);
+  PRIMARY KEY (tenant_id, month_key, subscription_id)
+) PARTITION BY LIST (tenant_id);
+
+-- Derived Table: fact_subscription_snapshot_sample, the snapshot rows of a fixed
+-- customer-hash sample for approximate KPIs (rebuilt with the snapshot; partitioned
+-- by tenant)
+CREATE TABLE IF NOT EXISTS core.fact_subscription_snapshot_sample (
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  month_key INT NOT NULL REFERENCES core.dim_month(month_key),
+  subscription_id BIGINT NOT NULL,
+  customer_key INT NOT NULL,
+  product_key INT NOT NULL,
+  replicate SMALLINT NOT NULL, -- jackknife group of the customer (bucket % 16)
+  mrr_value NUMERIC(18,2) NOT NULL,
+  PRIMARY KEY (tenant_id, month_key, subscription_id)
+) PARTITION BY LIST (tenant_id);
 
 -- Table: fact_cloud_cost
 CREATE TABLE IF NOT EXISTS core.fact_cloud_cost (
-  cloud_cost_id TEXT PRIMARY KEY,
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  cloud_cost_id TEXT NOT NULL,
   date_id DATE NOT NULL REFERENCES core.dim_date(date_id),
   provider_name TEXT NOT NULL,
   amount_lcy NUMERIC(18,2) NOT NULL,
   currency_code TEXT NOT NULL REFERENCES core.dim_currency(currency_code),
+  PRIMARY KEY (tenant_id, cloud_cost_id),
   CONSTRAINT fk_cloud_fx
     FOREIGN KEY (date_id, currency_code)
     REFERENCES core.fact_fx_rate(date_id, currency_code)
     DEFERRABLE INITIALLY DEFERRED
 );
 
--- Table: fact_payment_processing_cost
+-- Table: fact_payment_processing_cost (partitioned by month of date_id)
 CREATE TABLE IF NOT EXISTS core.fact_payment_processing_cost (
-  payment_proc_cost_id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  payment_proc_cost_id BIGSERIAL NOT NULL,
   date_id DATE NOT NULL REFERENCES core.dim_date(date_id),
   processor_name TEXT NOT NULL,
-  transaction_id BIGINT NOT NULL REFERENCES core.fact_subscription_revenue(fact_id),
+  transaction_id BIGINT NOT NULL,
+  transaction_date DATE NOT NULL,
   amount_lcy NUMERIC(18,2) NOT NULL,
   currency_code TEXT NOT NULL REFERENCES core.dim_currency(currency_code),
 
@@ -191,24 +433,35 @@ CREATE TABLE IF NOT EXISTS core.fact_payment_processing_cost (
   ingest_batch_id TEXT,
   ingest_ts TIMESTAMPTZ NOT NULL DEFAULT now(),
 
+  PRIMARY KEY (payment_proc_cost_id, date_id),
+  CONSTRAINT fk_payproc_transaction
+    FOREIGN KEY (transaction_id, transaction_date)
+    REFERENCES core.fact_subscription_revenue(fact_id, date_id),
   CONSTRAINT fk_payproc_fx
     FOREIGN KEY (date_id, currency_code)
     REFERENCES core.fact_fx_rate(date_id, currency_code)
     DEFERRABLE INITIALLY DEFERRED
-);
+) PARTITION BY RANGE (date_id);
 
 CREATE INDEX IF NOT EXISTS ix_payproc_date_ccy
-  ON core.fact_payment_processing_cost (date_id, currency_code);
+  ON core.fact_payment_processing_cost (tenant_id, date_id, currency_code);
+CREATE INDEX IF NOT EXISTS brin_payproc_date
+  ON core.fact_payment_processing_cost USING BRIN (date_id);
 
 -- Table: fact_other_expenses
 CREATE TABLE IF NOT EXISTS core.fact_other_expenses (
-  other_expense_id TEXT PRIMARY KEY,
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  other_expense_id TEXT NOT NULL,
   date_id DATE NOT NULL REFERENCES core.dim_date(date_id),
-  other_expense_type_id TEXT NOT NULL REFERENCES core.dim_other_expense_type(other_expense_type_id),
+  other_expense_type_id TEXT NOT NULL,
   vendor_name TEXT NOT NULL,
   invoice_number TEXT NOT NULL,
   amount_lcy NUMERIC(18,2) NOT NULL,
   currency_code TEXT NOT NULL REFERENCES core.dim_currency(currency_code),
+  PRIMARY KEY (tenant_id, other_expense_id),
+  CONSTRAINT fk_other_type
+    FOREIGN KEY (tenant_id, other_expense_type_id)
+    REFERENCES core.dim_other_expense_type(tenant_id, other_expense_type_id),
   CONSTRAINT fk_other_fx
     FOREIGN KEY (date_id, currency_code)
     REFERENCES core.fact_fx_rate(date_id, currency_code)
@@ -217,29 +470,137 @@ CREATE TABLE IF NOT EXISTS core.fact_other_expenses (
 
 -- Table: fact_marketing_spend
 CREATE TABLE IF NOT EXISTS core.fact_marketing_spend (
-  marketing_spend_id TEXT PRIMARY KEY,
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  marketing_spend_id TEXT NOT NULL,
   date_id DATE NOT NULL REFERENCES core.dim_date(date_id),
   channel TEXT NOT NULL,
   campaign_id TEXT NOT NULL,
   amount_lcy NUMERIC(18,2) NOT NULL,
   currency_code TEXT NOT NULL REFERENCES core.dim_currency(currency_code),
+  PRIMARY KEY (tenant_id, marketing_spend_id),
   CONSTRAINT fk_marketing_fx
     FOREIGN KEY (date_id, currency_code)
     REFERENCES core.fact_fx_rate(date_id, currency_code)
     DEFERRABLE INITIALLY DEFERRED
 );
 
--- Table: fact_cash_balance
+-- Table: fact_cash_balance (partitioned by tenant, then by month of date_id)
 CREATE TABLE IF NOT EXISTS core.fact_cash_balance (
-  cash_balance_id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  cash_balance_id BIGSERIAL NOT NULL,
   date_id DATE NOT NULL REFERENCES core.dim_date(date_id),
   cash_in NUMERIC(18,2),
   cash_out NUMERIC(18,2),
-  cash_balance NUMERIC(18,2) NOT NULL
-);
+  cash_balance NUMERIC(18,2) NOT NULL,
+  PRIMARY KEY (tenant_id, cash_balance_id, date_id)
+) PARTITION BY LIST (tenant_id);
 -- index
 CREATE UNIQUE INDEX IF NOT EXISTS ix_cash_balance_date
-  ON core.fact_cash_balance (date_id);
+  ON core.fact_cash_balance (tenant_id, date_id);
+CREATE INDEX IF NOT EXISTS brin_cash_balance_date
+  ON core.fact_cash_balance USING BRIN (date_id);
+
+-- =========================================================
+-- Metadata
+-- =========================================================
+-- Table: load_state, bumped by every run of transform_upsert.sql for the tenant
+CREATE TABLE IF NOT EXISTS core.load_state (
+  tenant_id TEXT PRIMARY KEY REFERENCES core.dim_tenant(tenant_id),
+  data_version BIGINT NOT NULL,
+  latest_month_key INT, -- latest month with subscription snapshots
+  sample_fraction DOUBLE PRECISION NOT NULL DEFAULT 0, -- share of customers sampled
+  loaded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Table: cost_allocation_driver, how each indirect cost category is split across
+-- products at load time (categories without a row use the load's default driver;
+-- payment processing always follows its transaction's product)
+CREATE TABLE IF NOT EXISTS core.cost_allocation_driver (
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  cost_category TEXT NOT NULL, -- cloud | other_expenses | marketing | payroll
+  driver TEXT NOT NULL -- product share of MRR, active subscriptions or customers
+    CHECK (driver IN ('mrr', 'subscriptions', 'customers', 'none')),
+  PRIMARY KEY (tenant_id, cost_category)
+);
+
+-- =========================================================
+-- Aggregates
+-- =========================================================
+-- Derived Table: agg_payroll_month, prorated payroll and headcount per department
+-- from dim_employee tenure (refreshed incrementally at load time)
+CREATE TABLE IF NOT EXISTS core.agg_payroll_month (
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  month_key INT NOT NULL REFERENCES core.dim_month(month_key),
+  department_id TEXT NOT NULL,
+  headcount INT NOT NULL, -- employed at month end
+  fte NUMERIC(10,2) NOT NULL, -- employed days / days in month, summed
+  payroll_lcy NUMERIC(18,2) NOT NULL, -- salary / 12, prorated by employed days
+  PRIMARY KEY (tenant_id, month_key, department_id),
+  FOREIGN KEY (tenant_id, department_id)
+    REFERENCES core.dim_department(tenant_id, department_id)
+);
+
+-- Derived Table: agg_cost_month from the cost facts (refreshed at load time)
+CREATE TABLE IF NOT EXISTS core.agg_cost_month (
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  month_key INT NOT NULL REFERENCES core.dim_month(month_key),
+  cost_group TEXT NOT NULL, -- cogs | opex
+  cost_category TEXT NOT NULL, -- cloud | payment_processing | other_expenses | marketing | payroll
+  subcategory TEXT NOT NULL, -- provider, processor, expense type, channel or department
+  amount_lcy NUMERIC(18,2) NOT NULL,
+  PRIMARY KEY (tenant_id, month_key, cost_category, subcategory)
+);
+
+CREATE INDEX IF NOT EXISTS ix_agg_cost_month_group
+  ON core.agg_cost_month (tenant_id, month_key, cost_group) INCLUDE (amount_lcy);
+
+-- Derived Table: agg_product_cost_month, agg_cost_month allocated to products
+-- (refreshed at load time; unallocated costs stay company-level only)
+CREATE TABLE IF NOT EXISTS core.agg_product_cost_month (
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  month_key INT NOT NULL REFERENCES core.dim_month(month_key),
+  product_key INT NOT NULL REFERENCES core.dim_product(product_key),
+  cost_group TEXT NOT NULL, -- cogs | opex
+  cost_category TEXT NOT NULL, -- as in agg_cost_month
+  amount_lcy NUMERIC(18,2) NOT NULL,
+  PRIMARY KEY (tenant_id, month_key, product_key, cost_category)
+);
+
+-- Derived Table: kpi_cube, precomputed KPIs and ARR bridge for every dashboard slice
+CREATE TABLE IF NOT EXISTS core.kpi_cube (
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  month_key INT NOT NULL REFERENCES core.dim_month(month_key),
+  time_range TEXT NOT NULL, -- Last 12M | YTD | QTD
+  product_id TEXT NOT NULL, -- product_id or 'All'
+  country TEXT NOT NULL, -- country or 'All'
+  arr BIGINT NOT NULL, -- cents
+  arr_growth DOUBLE PRECISION NOT NULL,
+  nrr DOUBLE PRECISION NOT NULL,
+  grr DOUBLE PRECISION NOT NULL,
+  gross_margin DOUBLE PRECISION NOT NULL,
+  op_margin DOUBLE PRECISION NOT NULL,
+  burn_multiple DOUBLE PRECISION NOT NULL,
+  runway_months DOUBLE PRECISION NOT NULL,
+  net_monthly_burn BIGINT NOT NULL, -- cents
+  ending_cash_balance BIGINT NOT NULL, -- cents
+  bridge_starting BIGINT, -- cents
+  bridge_new BIGINT, -- cents
+  bridge_expansion BIGINT, -- cents
+  bridge_contraction BIGINT, -- cents
+  bridge_churn BIGINT, -- cents
+  bridge_ending BIGINT, -- cents
+  built_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (tenant_id, month_key, time_range, product_id, country)
+);
+
+-- Table: kpi_cube_state, input fingerprints per month for incremental cube refreshes
+CREATE TABLE IF NOT EXISTS core.kpi_cube_state (
+  tenant_id TEXT NOT NULL REFERENCES core.dim_tenant(tenant_id),
+  month_key INT NOT NULL REFERENCES core.dim_month(month_key),
+  fingerprint TEXT NOT NULL,
+  built_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (tenant_id, month_key)
+);
 
 
 -- =========================================================
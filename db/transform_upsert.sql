@@ -1,6 +1,21 @@
+-- Loads the staging tables into core for one tenant:
+--   psql -v tenant_id=<tenant> -f db/transform_upsert.sql
+-- Tenant-owned tables are only written (and derived tables only rebuilt) for that
+-- tenant; the shared calendar, currencies and FX rates are upserted as before.
+\if :{?tenant_id}
+\else
+  \set tenant_id default
+\endif
+
+-- Table: dim_tenant
+INSERT INTO core.dim_tenant (tenant_id, tenant_name)
+VALUES (:'tenant_id', :'tenant_id')
+ON CONFLICT (tenant_id) DO NOTHING;
+
 -- Table: dim_product
 WITH cleaned AS (
   SELECT
+    :'tenant_id' AS tenant_id,
     product_id,
     product_name,
     product_type,
@@ -10,6 +25,7 @@ WITH cleaned AS (
   FROM staging.dim_product
 )
 INSERT INTO core.dim_product AS t (
+  tenant_id,
   product_id,
   product_name,
   product_type,
@@ -18,7 +34,7 @@ INSERT INTO core.dim_product AS t (
   price_annual
 )
 SELECT * FROM cleaned
-ON CONFLICT (product_id) DO UPDATE
+ON CONFLICT (tenant_id, product_id) DO UPDATE
 SET product_name = EXCLUDED.product_name,
     product_type = EXCLUDED.product_type,
     currency = EXCLUDED.currency,
@@ -28,6 +44,7 @@ SET product_name = EXCLUDED.product_name,
 -- Table: dim_customer
 WITH cleaned AS (
   SELECT
+    :'tenant_id' AS tenant_id,
     customer_id,
     name,
     email,
@@ -41,6 +58,7 @@ WITH cleaned AS (
   FROM staging.dim_customer
 )
 INSERT INTO core.dim_customer AS t(
+  tenant_id,
   customer_id, 
   name, 
   email, 
@@ -50,7 +68,7 @@ INSERT INTO core.dim_customer AS t(
   is_active
 )
 SELECT * FROM cleaned
-ON CONFLICT (customer_id) DO UPDATE
+ON CONFLICT (tenant_id, customer_id) DO UPDATE
 SET name = EXCLUDED.name,
     email = EXCLUDED.email,
     country = EXCLUDED.country,
@@ -78,6 +96,37 @@ SET date = EXCLUDED.date,
     month = EXCLUDED.month,
     day = EXCLUDED.day;
 
+-- Table: dim_month (derived from dim_date)
+WITH months AS (
+  SELECT DISTINCT DATE_TRUNC('month', date)::DATE AS month_start
+  FROM core.dim_date
+)
+INSERT INTO core.dim_month AS t (
+  month_key,
+  month_start,
+  month_end,
+  year,
+  quarter,
+  month,
+  month_label
+)
+SELECT
+  core.month_key(month_start),
+  month_start,
+  (month_start + INTERVAL '1 month - 1 day')::DATE,
+  EXTRACT(YEAR FROM month_start)::INT,
+  EXTRACT(QUARTER FROM month_start)::INT,
+  EXTRACT(MONTH FROM month_start)::INT,
+  TO_CHAR(month_start, 'YYYY-MM')
+FROM months
+ON CONFLICT (month_key) DO UPDATE
+SET month_start = EXCLUDED.month_start,
+    month_end = EXCLUDED.month_end,
+    year = EXCLUDED.year,
+    quarter = EXCLUDED.quarter,
+    month = EXCLUDED.month,
+    month_label = EXCLUDED.month_label;
+
 -- Table: dim_currency
 WITH cleaned AS (
   SELECT
@@ -93,18 +142,26 @@ SET currency_name = EXCLUDED.currency_name;
 -- Table: dim_department
 WITH cleaned AS (
   SELECT
+    :'tenant_id' AS tenant_id,
     department_id,
     department_name
   FROM staging.dim_department
 )
-INSERT INTO core.dim_department AS t (department_id, department_name)
+INSERT INTO core.dim_department AS t (tenant_id, department_id, department_name)
 SELECT * FROM cleaned
-ON CONFLICT (department_id) DO UPDATE
+ON CONFLICT (tenant_id, department_id) DO UPDATE
 SET department_name = EXCLUDED.department_name;
 
--- Table: dim_employee
+-- Table: dim_employee (the old and new tenure of changed employees is kept for
+-- the payroll rollup)
+CREATE TEMP TABLE IF NOT EXISTS payroll_changes (
+  hire_date DATE,
+  termination_date DATE
+);
+TRUNCATE TABLE payroll_changes;
 WITH cleaned AS (
   SELECT
+    :'tenant_id' AS tenant_id,
     employee_id,
     employee_name,
     TO_DATE(NULLIF(hire_date, ''), 'YYYYMMDD') AS hire_date,
@@ -114,42 +171,85 @@ WITH cleaned AS (
     title,
     NULLIF(salary, '')::NUMERIC(18,2) AS salary
   FROM staging.dim_employee
+),
+previous AS (
+  -- Sees the table as it was before the upsert below
+  SELECT e.employee_id, e.hire_date, e.termination_date
+  FROM core.dim_employee e
+  JOIN cleaned c ON c.tenant_id = e.tenant_id AND c.employee_id = e.employee_id
+),
+upserted AS (
+  INSERT INTO core.dim_employee AS t (
+    tenant_id,
+    employee_id, 
+    employee_name, 
+    hire_date, 
+    termination_date, 
+    department_id, 
+    country, 
+    title, 
+    salary
+  )
+  SELECT * FROM cleaned
+  ON CONFLICT (tenant_id, employee_id) DO UPDATE
+  SET employee_name = EXCLUDED.employee_name,
+      hire_date = EXCLUDED.hire_date,
+      termination_date = EXCLUDED.termination_date,
+      department_id = EXCLUDED.department_id,
+      country = EXCLUDED.country,
+      title = EXCLUDED.title,
+      salary = EXCLUDED.salary,
+      is_deleted = FALSE
+  WHERE t.is_deleted
+     OR (t.employee_name, t.hire_date, t.termination_date, t.department_id,
+         t.country, t.title, t.salary)
+    IS DISTINCT FROM
+        (EXCLUDED.employee_name, EXCLUDED.hire_date, EXCLUDED.termination_date,
+         EXCLUDED.department_id, EXCLUDED.country, EXCLUDED.title, EXCLUDED.salary)
+  RETURNING t.employee_id, t.hire_date, t.termination_date
 )
-INSERT INTO core.dim_employee AS t (
-  employee_id, 
-  employee_name, 
-  hire_date, 
-  termination_date, 
-  department_id, 
-  country, 
-  title, 
-  salary
+INSERT INTO payroll_changes (hire_date, termination_date)
+SELECT hire_date, termination_date FROM upserted
+UNION ALL
+SELECT p.hire_date, p.termination_date
+FROM previous p
+JOIN upserted u ON u.employee_id = p.employee_id;
+
+-- Employees gone from the source snapshot are flagged, not deleted, so a partial
+-- file loses no history; the payroll rollup skips them and the months of their
+-- tenure are rebuilt (an empty staging table means no employee feed). They are
+-- restored by the upsert above when they come back.
+WITH removed AS (
+  UPDATE core.dim_employee e
+  SET is_deleted = TRUE
+  WHERE e.tenant_id = :'tenant_id'
+    AND NOT e.is_deleted
+    AND EXISTS (SELECT 1 FROM staging.dim_employee)
+    AND NOT EXISTS (
+      SELECT 1 FROM staging.dim_employee s WHERE s.employee_id = e.employee_id
+    )
+  RETURNING e.hire_date, e.termination_date
 )
-SELECT * FROM cleaned
-ON CONFLICT (employee_id) DO UPDATE
-SET employee_name = EXCLUDED.employee_name,
-    hire_date = EXCLUDED.hire_date,
-    termination_date = EXCLUDED.termination_date,
-    department_id = EXCLUDED.department_id,
-    country = EXCLUDED.country,
-    title = EXCLUDED.title,
-    salary = EXCLUDED.salary;
+INSERT INTO payroll_changes (hire_date, termination_date)
+SELECT hire_date, termination_date FROM removed;
 
 -- Table: dim_other_expense_type
 WITH cleaned AS (
   SELECT
+    :'tenant_id' AS tenant_id,
     other_expense_type_id,
     expense_type_name,
     expense_description
   FROM staging.dim_other_expense_type
 )
 INSERT INTO core.dim_other_expense_type AS t (
+  tenant_id,
   other_expense_type_id, 
   expense_type_name, 
   expense_description
 )
 SELECT * FROM cleaned
-ON CONFLICT (other_expense_type_id) DO UPDATE
+ON CONFLICT (tenant_id, other_expense_type_id) DO UPDATE
 SET expense_type_name = EXCLUDED.expense_type_name,
     expense_description = EXCLUDED.expense_description;
 
@@ -168,8 +268,17 @@ SET rate_to_usd = EXCLUDED.rate_to_usd;
 
 -- Table: fact_subscription_revenue
 -- one-time DDL to create constraint on source_system and source_record_id
+-- (unique indexes on a partitioned table must include the partition key)
 CREATE UNIQUE INDEX IF NOT EXISTS uq_subrev_source
-  ON core.fact_subscription_revenue (source_system, source_record_id);
+  ON core.fact_subscription_revenue (tenant_id, source_system, source_record_id, date_id);
+
+-- partitions for the months being loaded
+SELECT core.ensure_month_partitions(
+  'core.fact_subscription_revenue',
+  MIN(TO_DATE(NULLIF(date_id, ''), 'YYYYMMDD')),
+  MAX(TO_DATE(NULLIF(date_id, ''), 'YYYYMMDD'))
+)
+FROM staging.fact_subscription_revenue;
 
 -- load
 WITH cleaned AS (
@@ -177,22 +286,26 @@ WITH cleaned AS (
     r.source_system,
     r.source_record_id,
     TO_DATE(NULLIF(r.date_id, ''), 'YYYYMMDD') AS date_id,
-    r.customer_id,
-    r.product_id,
+    dc.customer_key,
+    dp.product_key,
     r.billing_cycle,
     CASE WHEN r.billing_cycle = 'monthly' THEN dp.price_monthly ELSE dp.price_annual END AS amount_lcy,
     r.currency_code,
     r.country,
     r.ingest_batch_id
   FROM staging.fact_subscription_revenue r
-  LEFT JOIN core.dim_product dp ON r.product_id = dp.product_id
+  LEFT JOIN core.dim_product dp
+    ON dp.tenant_id = :'tenant_id' AND r.product_id = dp.product_id
+  LEFT JOIN core.dim_customer dc
+    ON dc.tenant_id = :'tenant_id' AND r.customer_id = dc.customer_id
 )
 INSERT INTO core.fact_subscription_revenue AS t (
+  tenant_id,
   source_system,
   source_record_id,
   date_id,
-  customer_id,
-  product_id,
+  customer_key,
+  product_key,
   billing_cycle,
   amount_lcy,
   currency_code,
@@ -200,23 +313,25 @@ INSERT INTO core.fact_subscription_revenue AS t (
   ingest_batch_id
 )
 SELECT 
+  :'tenant_id',
   source_system,
   source_record_id,
   date_id,
-  customer_id,
-  product_id,
+  customer_key,
+  product_key,
   billing_cycle,
   amount_lcy,
   currency_code,
   country,
   ingest_batch_id 
 FROM cleaned
-ON CONFLICT (source_system, source_record_id) DO NOTHING;
+ON CONFLICT (tenant_id, source_system, source_record_id, date_id) DO NOTHING;
 
 
 -- Table: fact_cloud_cost
 WITH cleaned AS (
   SELECT
+    :'tenant_id' AS tenant_id,
     cloud_cost_id,
     TO_DATE(NULLIF(date_id, ''), 'YYYYMMDD') AS date_id,
     provider_name,
@@ -225,6 +340,7 @@ WITH cleaned AS (
   FROM staging.fact_cloud_cost
 )
 INSERT INTO core.fact_cloud_cost AS t (
+  tenant_id,
   cloud_cost_id, 
   date_id, 
   provider_name, 
@@ -232,7 +348,7 @@ INSERT INTO core.fact_cloud_cost AS t (
   currency_code
 )
 SELECT * FROM cleaned
-ON CONFLICT (cloud_cost_id) DO UPDATE
+ON CONFLICT (tenant_id, cloud_cost_id) DO UPDATE
 SET date_id = EXCLUDED.date_id,
     provider_name = EXCLUDED.provider_name,
     amount_lcy = EXCLUDED.amount_lcy,
@@ -241,16 +357,26 @@ SET date_id = EXCLUDED.date_id,
 -- Table: fact_payment_processor_fees
 -- one-time DDL to create constraint on source_system and source_record_id
 CREATE UNIQUE INDEX IF NOT EXISTS uq_ppc_tx
-  ON core.fact_payment_processing_cost (transaction_id);
+  ON core.fact_payment_processing_cost (transaction_id, date_id);
 
--- one-time DDL for lineage (needed for ON CONFLICT)
-ALTER TABLE core.fact_payment_processing_cost
-  ADD CONSTRAINT uq_ppc_source UNIQUE (source_system, source_record_id);
+-- one-time DDL for lineage (needed for ON CONFLICT); IF NOT EXISTS so the next
+-- tenant's load (or a reload) does not fail here
+CREATE UNIQUE INDEX IF NOT EXISTS uq_ppc_source
+  ON core.fact_payment_processing_cost (tenant_id, source_system, source_record_id, date_id);
+
+-- partitions for the months being loaded
+SELECT core.ensure_month_partitions(
+  'core.fact_payment_processing_cost',
+  MIN(TO_DATE(NULLIF(date_id, ''), 'YYYYMMDD')),
+  MAX(TO_DATE(NULLIF(date_id, ''), 'YYYYMMDD'))
+)
+FROM staging.fact_payment_processing_cost;
 
 -- load
 WITH ins_sub AS (
   SELECT fact_id, source_system, source_record_id, date_id, currency_code
   FROM core.fact_subscription_revenue
+  WHERE tenant_id = :'tenant_id'
 ),
 cleaned AS (
   SELECT
@@ -271,6 +397,7 @@ joined AS (
     c.date_id,
     c.processor_name,
     s.fact_id AS transaction_id,
+    s.date_id AS transaction_date,
     c.amount_lcy,
     c.currency_code
   FROM cleaned c
@@ -279,33 +406,38 @@ joined AS (
    AND s.source_record_id = c.sub_source_record_id
 )
 INSERT INTO core.fact_payment_processing_cost AS t (
+  tenant_id,
   source_system,
   sub_source_record_id,
   source_record_id,
   date_id,
   processor_name,
   transaction_id,
+  transaction_date,
   amount_lcy,
   currency_code,
   ingest_batch_id
 )
 SELECT
+  :'tenant_id',
   j.source_system,
   j.sub_source_record_id,
   j.source_record_id,
   j.date_id,
   j.processor_name,
   j.transaction_id,
+  j.transaction_date,
   j.amount_lcy,
   j.currency_code,
   'ppc_batch_1'
 FROM joined AS j
-ON CONFLICT (source_system, source_record_id) DO NOTHING;
+ON CONFLICT (tenant_id, source_system, source_record_id, date_id) DO NOTHING;
 
 
 -- Table: fact_other_expenses
 WITH cleaned AS (
   SELECT
+    :'tenant_id' AS tenant_id,
     other_expense_id,
     TO_DATE(NULLIF(date_id, ''), 'YYYYMMDD') AS date_id,
     other_expense_type_id,
@@ -316,6 +448,7 @@ WITH cleaned AS (
   FROM staging.fact_other_expenses
 )
 INSERT INTO core.fact_other_expenses AS t (
+  tenant_id,
   other_expense_id,
   date_id,
   other_expense_type_id,
@@ -325,7 +458,7 @@ INSERT INTO core.fact_other_expenses AS t (
   currency_code
 )
 SELECT * FROM cleaned
-ON CONFLICT (other_expense_id) DO UPDATE
+ON CONFLICT (tenant_id, other_expense_id) DO UPDATE
 SET date_id = EXCLUDED.date_id,
     other_expense_type_id = EXCLUDED.other_expense_type_id,
     vendor_name = EXCLUDED.vendor_name,
@@ -336,6 +469,7 @@ SET date_id = EXCLUDED.date_id,
 -- Table: fact_marketing_spend
 WITH cleaned AS (
   SELECT
+    :'tenant_id' AS tenant_id,
     marketing_spend_id,
     TO_DATE(NULLIF(date_id, ''), 'YYYYMMDD') AS date_id,
     channel,
@@ -345,6 +479,7 @@ WITH cleaned AS (
   FROM staging.fact_marketing_spend
 )
 INSERT INTO core.fact_marketing_spend AS t (
+  tenant_id,
   marketing_spend_id,
   date_id,
   channel,
@@ -353,17 +488,162 @@ INSERT INTO core.fact_marketing_spend AS t (
   currency_code
 )
 SELECT * FROM cleaned
-ON CONFLICT (marketing_spend_id) DO UPDATE
+ON CONFLICT (tenant_id, marketing_spend_id) DO UPDATE
 SET date_id = EXCLUDED.date_id,
     channel = EXCLUDED.channel,
     campaign_id = EXCLUDED.campaign_id,
     amount_lcy = EXCLUDED.amount_lcy,
     currency_code = EXCLUDED.currency_code;
 
--- Table: fact_cash_balance
-TRUNCATE TABLE core.fact_cash_balance;
+-- Table: agg_payroll_month (rebuild only the months changed or removed employees
+-- touch before or after the load, plus months not built yet; an empty table is a
+-- full rebuild)
+CREATE TEMP TABLE IF NOT EXISTS payroll_dirty_months (month_key INT PRIMARY KEY);
+TRUNCATE TABLE payroll_dirty_months;
+WITH built AS (
+  SELECT MAX(month_key) AS last_month
+  FROM core.agg_payroll_month
+  WHERE tenant_id = :'tenant_id'
+)
+INSERT INTO payroll_dirty_months (month_key)
+SELECT m.month_key
+FROM core.dim_month m
+CROSS JOIN built b
+WHERE b.last_month IS NULL
+   OR m.month_key > b.last_month
+   OR EXISTS (
+     SELECT 1 FROM payroll_changes c
+     WHERE c.hire_date <= m.month_end
+       AND (c.termination_date IS NULL OR c.termination_date >= m.month_start)
+   );
+
+DELETE FROM core.agg_payroll_month a
+USING payroll_dirty_months d
+WHERE a.tenant_id = :'tenant_id'
+  AND a.month_key = d.month_key;
+
+WITH tenure AS (
+  -- Each employee x month overlap, as employed days over days in the month
+  SELECT
+    m.month_key,
+    e.department_id,
+    e.salary,
+    (e.termination_date IS NULL OR e.termination_date >= m.month_end) AS at_month_end,
+    (LEAST(COALESCE(e.termination_date, m.month_end), m.month_end)
+      - GREATEST(e.hire_date, m.month_start) + 1)::NUMERIC
+      / (m.month_end - m.month_start + 1) AS employed_share
+  FROM payroll_dirty_months d
+  JOIN core.dim_month m ON m.month_key = d.month_key
+  JOIN core.dim_employee e
+    ON e.tenant_id = :'tenant_id'
+   AND NOT e.is_deleted
+   AND e.hire_date <= m.month_end
+   AND (e.termination_date IS NULL OR e.termination_date >= m.month_start)
+)
+INSERT INTO core.agg_payroll_month (
+  tenant_id,
+  month_key,
+  department_id,
+  headcount,
+  fte,
+  payroll_lcy
+)
+SELECT
+  :'tenant_id',
+  month_key,
+  department_id,
+  COUNT(*) FILTER (WHERE at_month_end),
+  ROUND(SUM(employed_share), 2),
+  ROUND(SUM(salary / 12 * employed_share), 2)
+FROM tenure
+GROUP BY month_key, department_id;
+
+-- Table: agg_cost_month (derived from the cost facts and the payroll rollup)
+DELETE FROM core.agg_cost_month WHERE tenant_id = :'tenant_id';
+WITH costs AS (
+  SELECT
+    core.month_key(date_id) AS month_key,
+    'cogs' AS cost_group,
+    'cloud' AS cost_category,
+    provider_name AS subcategory,
+    amount_lcy
+  FROM core.fact_cloud_cost
+  WHERE tenant_id = :'tenant_id'
+  UNION ALL
+  SELECT
+    core.month_key(date_id),
+    'cogs',
+    'payment_processing',
+    processor_name,
+    amount_lcy
+  FROM core.fact_payment_processing_cost
+  WHERE tenant_id = :'tenant_id'
+  UNION ALL
+  SELECT
+    core.month_key(oe.date_id),
+    'opex',
+    'other_expenses',
+    COALESCE(et.expense_type_name, oe.other_expense_type_id),
+    oe.amount_lcy
+  FROM core.fact_other_expenses oe
+  LEFT JOIN core.dim_other_expense_type et
+    ON et.tenant_id = oe.tenant_id
+   AND et.other_expense_type_id = oe.other_expense_type_id
+  WHERE oe.tenant_id = :'tenant_id'
+  UNION ALL
+  SELECT
+    core.month_key(date_id),
+    'opex',
+    'marketing',
+    channel,
+    amount_lcy
+  FROM core.fact_marketing_spend
+  WHERE tenant_id = :'tenant_id'
+  UNION ALL
+  SELECT
+    pm.month_key,
+    'opex',
+    'payroll',
+    COALESCE(d.department_name, pm.department_id),
+    pm.payroll_lcy
+  FROM core.agg_payroll_month pm
+  LEFT JOIN core.dim_department d
+    ON d.tenant_id = pm.tenant_id
+   AND d.department_id = pm.department_id
+  WHERE pm.tenant_id = :'tenant_id'
+)
+INSERT INTO core.agg_cost_month (
+  tenant_id,
+  month_key,
+  cost_group,
+  cost_category,
+  subcategory,
+  amount_lcy
+)
+SELECT
+  :'tenant_id',
+  month_key,
+  cost_group,
+  cost_category,
+  subcategory,
+  SUM(amount_lcy)
+FROM costs
+GROUP BY month_key, cost_group, cost_category, subcategory;
+
+-- Table: fact_cash_balance (reloaded by truncating the tenant's partition, which
+-- leaves other tenants' partitions alone)
+SELECT format(
+  'TRUNCATE %s', core.tenant_partition('core.fact_cash_balance', :'tenant_id', 'date_id')
+) \gexec
+SELECT core.ensure_month_partitions(
+  core.tenant_partition('core.fact_cash_balance', :'tenant_id', 'date_id'),
+  MIN(TO_DATE(NULLIF(date_id, ''), 'YYYYMMDD')),
+  MAX(TO_DATE(NULLIF(date_id, ''), 'YYYYMMDD'))
+)
+FROM staging.fact_cash_balance;
 WITH cleaned AS (
   SELECT
+    :'tenant_id' AS tenant_id,
     TO_DATE(NULLIF(date_id, ''), 'YYYYMMDD') AS date_id,
     NULLIF(cash_in, '')::NUMERIC(18,2) AS cash_in,
     NULLIF(cash_out, '')::NUMERIC(18,2) AS cash_out,
@@ -371,28 +651,40 @@ WITH cleaned AS (
   FROM staging.fact_cash_balance
 )
 INSERT INTO core.fact_cash_balance (
+  tenant_id,
   date_id,
   cash_in,
   cash_out,
   cash_balance
 )
 SELECT * FROM cleaned
-ON CONFLICT (date_id) DO UPDATE
+ON CONFLICT (tenant_id, date_id) DO UPDATE
 SET cash_in = EXCLUDED.cash_in,
     cash_out = EXCLUDED.cash_out,
     cash_balance = EXCLUDED.cash_balance;
 
--- Table: fact_subscription (derived from fact_subscription_revenue)
-TRUNCATE TABLE core.fact_subscription CASCADE;
+-- Table: fact_subscription (derived from fact_subscription_revenue; the tenant's
+-- partitions of it and of the snapshots built from it are truncated together and
+-- rebuilt below)
+SELECT format(
+  'TRUNCATE %s, %s, %s',
+  core.tenant_partition('core.fact_subscription_snapshot_sample', :'tenant_id'),
+  core.tenant_partition(
+    'core.fact_subscription_snapshot_monthly', :'tenant_id', 'month_key',
+    'core.fact_subscription', 'subscription_id'
+  ),
+  core.tenant_partition('core.fact_subscription', :'tenant_id')
+) \gexec
 WITH ev AS (
   SELECT
     date_id AS event_date,
-    customer_id,
-    product_id,
+    customer_key,
+    product_key,
     LOWER(billing_cycle) AS billing_cycle,
     amount_lcy::NUMERIC(18,2) AS price_per_period,
     currency_code
   FROM core.fact_subscription_revenue
+  WHERE tenant_id = :'tenant_id'
 ),
 ev_norm AS (
   SELECT e.*,
@@ -405,9 +697,9 @@ ev_norm AS (
 ),
 ordered AS (
   SELECT *,
-    LAG(event_date) OVER (PARTITION BY customer_id, product_id ORDER BY event_date) AS prev_date,
-    LAG(billing_cycle) OVER (PARTITION BY customer_id, product_id ORDER BY event_date) AS prev_cycle,
-    LAG(price_per_period) OVER (PARTITION BY customer_id, product_id ORDER BY event_date) AS prev_price
+    LAG(event_date) OVER (PARTITION BY customer_key, product_key ORDER BY event_date) AS prev_date,
+    LAG(billing_cycle) OVER (PARTITION BY customer_key, product_key ORDER BY event_date) AS prev_cycle,
+    LAG(price_per_period) OVER (PARTITION BY customer_key, product_key ORDER BY event_date) AS prev_price
   FROM ev_norm
 ),
 with_thresholds AS (
@@ -433,21 +725,21 @@ flags AS (
 runs AS (
   SELECT *,
     SUM(is_new_run) OVER (
-      PARTITION BY customer_id, product_id
+      PARTITION BY customer_key, product_key
       ORDER BY event_date
     ) AS run_id
   FROM flags
 ),
 agg AS (
   SELECT
-    customer_id, product_id, billing_cycle, currency_code,
+    customer_key, product_key, billing_cycle, currency_code,
     MAX(price_per_period) AS price_per_period,
     MAX(mrr_value) AS mrr_value,
     MIN(event_date) AS start_date,
     MAX(event_date) AS last_event_date,
     run_id
   FROM runs
-  GROUP BY customer_id, product_id, billing_cycle, currency_code, run_id
+  GROUP BY customer_key, product_key, billing_cycle, currency_code, run_id
 ),
 asof AS (
   SELECT MAX(date_id) AS asof_date
@@ -464,8 +756,9 @@ end_calc AS (
   FROM agg a
 )
 INSERT INTO core.fact_subscription (
-  customer_id,
-  product_id,
+  tenant_id,
+  customer_key,
+  product_key,
   billing_cycle,
   price_per_period,
   mrr_value,
@@ -475,8 +768,9 @@ INSERT INTO core.fact_subscription (
   status
 )
 SELECT
-  customer_id,
-  product_id,
+  :'tenant_id',
+  customer_key,
+  product_key,
   billing_cycle,
   price_per_period,
   mrr_value,
@@ -491,31 +785,163 @@ SELECT
 FROM end_calc;
 
 
--- Table: fact_subscription_snapshot_monthly
-TRUNCATE TABLE core.fact_subscription_snapshot_monthly;
-WITH months AS (
-	SELECT DISTINCT DATE_TRUNC('month', date_id)::DATE AS month_start
-	FROM core.dim_date
-	ORDER BY 1
-),
-subs AS (
-	SELECT * FROM core.fact_subscription
+-- Table: fact_subscription_snapshot_monthly (the tenant's rows were cleared above)
+SELECT core.ensure_month_partitions(
+  core.tenant_partition('core.fact_subscription_snapshot_monthly', :'tenant_id'),
+  MIN(month_start), MAX(month_start), TRUE
+)
+FROM core.dim_month;
+WITH subs AS (
+	SELECT * FROM core.fact_subscription WHERE tenant_id = :'tenant_id'
 ),
 active AS (
 	SELECT 
-		m.month_start AS snapshot_month,
+		s.tenant_id,
+		m.month_key,
 		s.subscription_id,
-		s.customer_id,
-		s.product_id,
+		s.customer_key,
+		s.product_key,
 		s.mrr_value
-	FROM months m
+	FROM core.dim_month m
 	JOIN subs s
-	ON s.start_date::DATE <= (m.month_start + INTERVAL '1 month - 1 day')::DATE
+	ON s.start_date::DATE <= m.month_end
 	AND (s.end_date::DATE IS NULL OR s.end_date::DATE >= m.month_start) 
 )
 INSERT INTO core.fact_subscription_snapshot_monthly
-  (snapshot_month, subscription_id, customer_id, product_id, mrr_value)
+  (tenant_id, month_key, subscription_id, customer_key, product_key, mrr_value)
 SELECT * FROM active
-ON CONFLICT (snapshot_month, subscription_id) DO UPDATE
+ON CONFLICT (tenant_id, month_key, subscription_id) DO UPDATE
 SET mrr_value = EXCLUDED.mrr_value;
 
+-- Table: fact_subscription_snapshot_sample (customers in hash buckets 0-63 of 1024,
+-- split into 16 replicate groups for the jackknife error bounds)
+WITH sampled AS (
+	SELECT customer_key, core.customer_sample_bucket(customer_id) AS bucket
+	FROM core.dim_customer
+	WHERE tenant_id = :'tenant_id'
+)
+INSERT INTO core.fact_subscription_snapshot_sample
+  (tenant_id, month_key, subscription_id, customer_key, product_key, replicate, mrr_value)
+SELECT s.tenant_id, s.month_key, s.subscription_id, s.customer_key, s.product_key,
+	(c.bucket % 16)::SMALLINT, s.mrr_value
+FROM core.fact_subscription_snapshot_monthly s
+JOIN sampled c ON c.customer_key = s.customer_key
+WHERE s.tenant_id = :'tenant_id'
+  AND c.bucket < 64;
+
+-- Table: agg_product_cost_month (payment fees follow their transaction's product;
+-- every other category is split by its driver's product share of the month)
+DELETE FROM core.agg_product_cost_month WHERE tenant_id = :'tenant_id';
+WITH product_month AS (
+  SELECT
+    month_key,
+    product_key,
+    SUM(mrr_value) AS mrr,
+    COUNT(*) AS subscriptions,
+    COUNT(DISTINCT customer_key) AS customers
+  FROM core.fact_subscription_snapshot_monthly
+  WHERE tenant_id = :'tenant_id'
+  GROUP BY month_key, product_key
+),
+drivers AS (
+  SELECT c.cost_category, COALESCE(d.driver, c.default_driver) AS driver
+  FROM (VALUES
+    ('cloud', 'subscriptions'),
+    ('other_expenses', 'mrr'),
+    ('marketing', 'mrr'),
+    ('payroll', 'mrr')
+  ) AS c (cost_category, default_driver)
+  LEFT JOIN core.cost_allocation_driver d
+    ON d.tenant_id = :'tenant_id'
+   AND d.cost_category = c.cost_category
+),
+weights AS (
+  SELECT
+    pm.month_key,
+    pm.product_key,
+    dr.cost_category,
+    CASE dr.driver
+      WHEN 'mrr' THEN pm.mrr
+      WHEN 'subscriptions' THEN pm.subscriptions
+      WHEN 'customers' THEN pm.customers
+    END AS weight
+  FROM product_month pm
+  CROSS JOIN drivers dr
+),
+shares AS (
+  SELECT
+    month_key,
+    product_key,
+    cost_category,
+    weight / SUM(weight) OVER (PARTITION BY month_key, cost_category) AS share
+  FROM weights
+  WHERE weight > 0
+),
+category_month AS (
+  SELECT month_key, cost_group, cost_category, SUM(amount_lcy) AS amount_lcy
+  FROM core.agg_cost_month
+  WHERE tenant_id = :'tenant_id'
+    AND cost_category <> 'payment_processing'
+  GROUP BY month_key, cost_group, cost_category
+),
+allocated AS (
+  SELECT
+    cm.month_key,
+    s.product_key,
+    cm.cost_group,
+    cm.cost_category,
+    cm.amount_lcy * s.share AS amount_lcy
+  FROM category_month cm
+  JOIN shares s
+    ON s.month_key = cm.month_key
+   AND s.cost_category = cm.cost_category
+  UNION ALL
+  SELECT
+    core.month_key(pp.date_id),
+    r.product_key,
+    'cogs',
+    'payment_processing',
+    pp.amount_lcy
+  FROM core.fact_payment_processing_cost pp
+  JOIN core.fact_subscription_revenue r
+    ON r.fact_id = pp.transaction_id
+   AND r.date_id = pp.transaction_date
+  WHERE pp.tenant_id = :'tenant_id'
+)
+INSERT INTO core.agg_product_cost_month (
+  tenant_id,
+  month_key,
+  product_key,
+  cost_group,
+  cost_category,
+  amount_lcy
+)
+SELECT
+  :'tenant_id',
+  month_key,
+  product_key,
+  cost_group,
+  cost_category,
+  ROUND(SUM(amount_lcy), 2)
+FROM allocated
+GROUP BY month_key, product_key, cost_group, cost_category;
+
+-- Table: load_state (bump the data version once everything above has loaded)
+INSERT INTO core.load_state AS t
+  (tenant_id, data_version, latest_month_key, sample_fraction, loaded_at)
+SELECT :'tenant_id', 1, MAX(month_key), 64 / 1024.0, now()
+FROM core.fact_subscription_snapshot_monthly
+WHERE tenant_id = :'tenant_id'
+ON CONFLICT (tenant_id) DO UPDATE
+SET data_version = t.data_version + 1,
+    latest_month_key = EXCLUDED.latest_month_key,
+    sample_fraction = EXCLUDED.sample_fraction,
+    loaded_at = EXCLUDED.loaded_at;
+
+-- Notify listening dashboards (core.listener) of the tenant's new data version
+SELECT pg_notify(
+  'data_loaded',
+  json_build_object('tenant_id', tenant_id, 'data_version', data_version)::TEXT
+)
+FROM core.load_state
+WHERE tenant_id = :'tenant_id';
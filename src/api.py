@@ -0,0 +1,291 @@
+"""Headless JSON API for the dashboard KPIs.
+
+Run with `python src/api.py`; it shares the pooled engine and metrics layer with
+the Streamlit app. Every response carries an ETag derived from the data version,
+so clients can poll with If-None-Match and get a 304 until the next load.
+Money fields (ARR, burn, cash, bridge steps) are integer cents. Every endpoint
+takes an optional ``tenant_id`` (default: the TENANT_ID environment variable).
+The /v1/search endpoints take ``q``, ``limit`` and the ``after`` cursor returned
+as ``next`` by the previous page.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from cachetools import LRUCache
+
+from core.db import DEFAULT_TENANT, check_tenant_id, tenant_session
+from core.dim_data import (
+    SEARCH_PAGE_SIZE,
+    get_all_products,
+    get_all_countries,
+    get_all_months,
+    get_data_version,
+    search_countries,
+    search_customers,
+    search_products,
+)
+from core.helpers import month_label, parse_month_label
+from core.kpi_cube import TIME_RANGES, cube_kpis
+from core.listener import start_listener
+from core.metrics import exec_overview_kpis, arr_bridge
+
+# Largest page a dimension search returns
+MAX_SEARCH_LIMIT = 100
+
+logger = logging.getLogger(__name__)
+
+_responses = LRUCache(maxsize=int(os.getenv("API_CACHE_SIZE", "1024")))
+_responses_lock = threading.Lock()
+
+
+class ApiError(Exception):
+    """Client error returned as a JSON body with the given status."""
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# -------------- Helpers --------------#
+def _json_safe(value):
+    """Replace NaN/inf (not valid JSON) with None."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _param(query, name, default=None):
+    values = query.get(name)
+    return values[0] if values and values[0] != "" else default
+
+
+def _slice_params(conn, query) -> dict:
+    """Parse and validate the month / time range / product / country query params."""
+    time_range = _param(query, "time_range", "Last 12M")
+    if time_range not in TIME_RANGES:
+        raise ApiError(
+            HTTPStatus.BAD_REQUEST, f"time_range must be one of {TIME_RANGES}"
+        )
+
+    label = _param(query, "month")
+    if label is None:
+        months = get_all_months(conn)["month"]
+        if months.empty:
+            raise ApiError(HTTPStatus.NOT_FOUND, "No months loaded")
+        end_month = int(months.max())
+    else:
+        try:
+            end_month = parse_month_label(label)
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "month must be YYYY-MM")
+
+    product_id = _param(query, "product_id")
+    country = _param(query, "country")
+    return dict(
+        end_month=end_month,
+        time_range=time_range,
+        product_id=None if product_id == "All" else product_id,
+        country=None if country == "All" else country,
+    )
+
+
+def _etag_matches(etag: str, if_none_match: str) -> bool:
+    """Whether an If-None-Match header lists ``etag`` (weak comparison) or is *."""
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in (t[2:] if t.startswith("W/") else t for t in tags)
+
+
+def _encode_cursor(cursor):
+    """Encode a search cursor as an opaque URL-safe token."""
+    if cursor is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(list(cursor)).encode()).decode()
+
+
+def _search_params(query, cursor_length: int) -> dict:
+    """Parse and validate the q / after / limit search query params.
+
+    A cursor is the sort key of a page's last row: ``cursor_length`` strings.
+    """
+    after = _param(query, "after")
+    if after is not None:
+        try:
+            after = json.loads(base64.urlsafe_b64decode(after.encode()))
+        except (binascii.Error, ValueError):
+            after = None
+        if not (
+            isinstance(after, list)
+            and len(after) == cursor_length
+            and all(isinstance(v, str) for v in after)
+        ):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "after must be a returned cursor")
+        after = tuple(after)
+    try:
+        limit = int(_param(query, "limit", SEARCH_PAGE_SIZE))
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "limit must be an integer")
+    if not 1 <= limit <= MAX_SEARCH_LIMIT:
+        raise ApiError(
+            HTTPStatus.BAD_REQUEST, f"limit must be between 1 and {MAX_SEARCH_LIMIT}"
+        )
+    return dict(term=_param(query, "q", ""), after=after, limit=limit)
+
+
+# -------------- Endpoints --------------#
+def kpis_endpoint(conn, query):
+    params = _slice_params(conn, query)
+    cached = cube_kpis(conn, **params)
+    kpis = cached[0] if cached is not None else exec_overview_kpis(conn, **params)
+    return {
+        "month": month_label(params["end_month"]),
+        "time_range": params["time_range"],
+        "product_id": params["product_id"] or "All",
+        "country": params["country"] or "All",
+        "kpis": {k: _json_safe(v) for k, v in kpis.items()},
+    }
+
+
+def arr_bridge_endpoint(conn, query):
+    params = _slice_params(conn, query)
+    cached = cube_kpis(conn, **params)
+    bridge = cached[1] if cached is not None else arr_bridge(conn, **params)
+    return {
+        "month": month_label(params["end_month"]),
+        "time_range": params["time_range"],
+        "product_id": params["product_id"] or "All",
+        "country": params["country"] or "All",
+        "steps": [
+            {"step": r.step, "value": int(r.value), "type": r.type}
+            for r in bridge.itertuples(index=False)
+        ],
+    }
+
+
+def products_endpoint(conn, query):
+    return {"products": get_all_products(conn).to_dict(orient="records")}
+
+
+def countries_endpoint(conn, query):
+    return {"countries": get_all_countries(conn)["country"].tolist()}
+
+
+def months_endpoint(conn, query):
+    return {"months": get_all_months(conn)["month_label"].tolist()}
+
+
+def _search_endpoint(search, cursor_length: int):
+    """Endpoint returning one page of ``search`` and the cursor of the next."""
+
+    def endpoint(conn, query):
+        page, cursor = search(conn, **_search_params(query, cursor_length))
+        return {
+            "results": page.to_dict(orient="records"),
+            "next": _encode_cursor(cursor),
+        }
+
+    return endpoint
+
+
+ROUTES = {
+    "/v1/kpis": kpis_endpoint,
+    "/v1/arr-bridge": arr_bridge_endpoint,
+    "/v1/dims/products": products_endpoint,
+    "/v1/dims/countries": countries_endpoint,
+    "/v1/dims/months": months_endpoint,
+    "/v1/search/customers": _search_endpoint(search_customers, 2),
+    "/v1/search/products": _search_endpoint(search_products, 2),
+    "/v1/search/countries": _search_endpoint(search_countries, 1),
+}
+
+
+# -------------- Server --------------#
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            return self._send(HTTPStatus.OK, b'{"status":"ok"}')
+
+        endpoint = ROUTES.get(url.path)
+        if endpoint is None:
+            return self._send_error(HTTPStatus.NOT_FOUND, "Unknown endpoint")
+
+        query = parse_qs(url.query)
+        try:
+            tenant_id = check_tenant_id(_param(query, "tenant_id", DEFAULT_TENANT))
+        except ValueError as e:
+            return self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+        query.pop("tenant_id", None)
+        canonical = f"{tenant_id}:{url.path}?" + "&".join(
+            f"{k}={v}" for k, vs in sorted(query.items()) for v in vs
+        )
+
+        try:
+            with tenant_session(tenant_id) as conn:
+                version = get_data_version(conn)
+                digest = hashlib.sha1(canonical.encode()).hexdigest()[:16]
+                etag = f'"{version}-{digest}"'
+
+                # Conditional GET: nothing changed since the client's copy
+                if _etag_matches(etag, self.headers.get("If-None-Match", "")):
+                    return self._send(HTTPStatus.NOT_MODIFIED, b"", etag)
+
+                with _responses_lock:
+                    body = _responses.get((canonical, version))
+                if body is None:
+                    body = json.dumps(endpoint(conn, query)).encode()
+                    with _responses_lock:
+                        _responses[(canonical, version)] = body
+        except ApiError as e:
+            return self._send_error(e.status, e.message)
+        except Exception:
+            # Answer instead of dropping the keep-alive connection mid-request
+            logger.exception("%s failed", canonical)
+            return self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR, "Internal error")
+
+        return self._send(HTTPStatus.OK, body, etag)
+
+    def _send(self, status, body: bytes, etag=None):
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if status != HTTPStatus.NOT_MODIFIED:
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        return self._send(status, json.dumps({"error": message}).encode())
+
+    def log_message(self, format, *args):
+        if os.getenv("API_ACCESS_LOG") == "1":
+            super().log_message(format, *args)
+
+
+def main():
+    host = os.getenv("API_HOST", "0.0.0.0")
+    port = int(os.getenv("API_PORT", "8502"))
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    start_listener()  # ETags follow pushed data versions without polling
+    print(f"Serving KPI API on http://{host}:{port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from . import queries as q
+from core.cache import cached_read
+from core.metrics import (
+    BRIDGE_STEPS,
+    KPI_COLUMNS,
+    MONEY,
+    company_costs_and_cash,
+    kpis_from_flows,
+    latest_month,
+    month_anchors,
+    row_results,
+    slice_flows,
+    window_bounds,
+)
+
+# Replicate groups the sample is split into at load time (hash bucket % 16)
+REPLICATES = 16
+# Hash buckets of core.customer_sample_bucket; the sample is the lowest of them
+SAMPLE_BUCKETS = 1024
+# Two-sided 95% normal quantile
+Z_95 = 1.96
+FLOW_COLUMNS = [
+    "curr_mrr",
+    "prev_mrr",
+    "prev_q_mrr",
+    "new",
+    "expansion",
+    "contraction",
+    "churn",
+]
+
+# Margins per KPI / bridge column; None where the replicates are not all finite
+Margins = Dict[str, Optional[float]]
+
+
+# -------------- Sample --------------#
+def _sample_fraction(conn) -> float:
+    return float(cached_read(conn, q.sample_fraction_sql())["sample_fraction"].iloc[0])
+
+
+def _sample_shares(conn, fraction: float, product_id, country) -> np.ndarray:
+    """Get the sampled share of the slice's customers, as realized by the hash.
+
+    Element 0 is the full sample's share; element r + 1 leaves replicate group r
+    out. A filtered slice's share can be far from the nominal fraction.
+    """
+    sql_params = q.sample_share_sql(
+        round(fraction * SAMPLE_BUCKETS), REPLICATES, product_id, country
+    )
+    counts = (
+        cached_read(conn, sql_params)
+        .set_index("replicate")
+        .reindex(range(REPLICATES), fill_value=0)
+    )
+    population = counts["customers"].sum()
+    sampled = counts["sampled"].to_numpy()
+    shares = np.concatenate([[sampled.sum()], sampled.sum() - sampled])
+    return shares / population if population > 0 else np.zeros(len(shares))
+
+
+def _sample_spine(conn, months: List[int], product_id, country) -> pd.DataFrame:
+    df = cached_read(conn, q.sample_mrr_at_months_sql(months, product_id, country))
+    df["customer_key"] = df["customer_key"].astype("int32")
+    df["replicate"] = df["replicate"].astype("int16")
+    df["month"] = df["month"].astype("int32")
+    df["mrr"] = df["mrr"].fillna(0).astype(MONEY)
+    return df
+
+
+def _estimates(spine: pd.DataFrame, anchors: Dict[str, int], shares: np.ndarray):
+    """Scale sampled flows up to the population by the slice's sampled shares.
+
+    Row 0 is the full-sample estimate; rows 1..R drop one replicate group each
+    and rescale by the remaining sampled share (delete-a-group jackknife). A row
+    left with no sampled customers estimates 0, which widens the margins.
+    """
+
+    per_rep = (
+        slice_flows(spine, ["replicate"], anchors)
+        .set_index("replicate")
+        .reindex(range(REPLICATES), fill_value=0)
+    )
+    money = per_rep[FLOW_COLUMNS]
+    total = money.sum()
+    est = pd.concat([total.to_frame().T, total - money], ignore_index=True)
+    est = est.div(np.where(shares > 0, shares, 1.0), axis=0).round().astype(MONEY)
+
+    rows = per_rep["rows"]
+    est["rows"] = np.concatenate([[rows.sum()], rows.sum() - rows.to_numpy()])
+    return est
+
+
+def _margins(kpis: pd.DataFrame, z: float) -> Margins:
+    """Get +/- z standard errors per column from the leave-one-group-out rows."""
+    margins = {}
+    columns = KPI_COLUMNS + [col for _, col, _ in BRIDGE_STEPS]
+    for col in columns:
+        values = kpis[col].iloc[1:].astype(float).to_numpy()
+        if not np.isfinite(values).all():
+            margins[col] = None
+            continue
+        var = (REPLICATES - 1) / REPLICATES * ((values - values.mean()) ** 2).sum()
+        margins[col] = float(z * np.sqrt(var))
+    return margins
+
+
+# -------------- Public API --------------#
+def approximate_kpis(
+    conn,
+    end_month: Optional[int] = None,
+    time_range: str = "Last 12M",
+    product_id: Optional[str] = None,
+    country: Optional[str] = None,
+    z: float = Z_95,
+) -> Optional[Tuple[Dict[str, float], pd.DataFrame, Margins]]:
+    """Estimate KPIs and the ARR bridge from the load-time customer-hash sample.
+
+    Returns (kpis, bridge, margins) like cube_kpis plus the +/- half-width of
+    every KPI and bridge column, or None without a sample. Only the sampled
+    snapshot rows are read, so the cost is a fixed share of the full spine, plus
+    one pass over the slice's subscriptions for its realized sampled share.
+    """
+
+    fraction = _sample_fraction(conn)
+    if fraction <= 0:
+        return None
+    if end_month is None:
+        end_month = latest_month(conn)
+    start_month, end_month = window_bounds(conn, end_month, time_range)
+    anchors = month_anchors(start_month, end_month)
+    if not anchors:
+        return None
+
+    spine = _sample_spine(conn, list(anchors.values()), product_id, country)
+    shares = _sample_shares(conn, fraction, product_id, country)
+    if spine.empty or shares[0] <= 0:
+        return None
+
+    cogs, opex, net_monthly_burn, ending_cash_balance = company_costs_and_cash(
+        conn, end_month, start_month, end_month
+    )
+    kpis = kpis_from_flows(
+        _estimates(spine, anchors, shares),
+        cogs,
+        opex,
+        net_monthly_burn,
+        ending_cash_balance,
+    )
+    estimate, bridge = row_results(kpis.iloc[0])
+    return estimate, bridge, _margins(kpis, z)
@@ -0,0 +1,193 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import weakref
+from pathlib import Path
+from typing import Dict, Optional
+import pandas as pd
+from cachetools import LRUCache
+from core.db import current_tenant
+from core.dim_queries import get_data_version_sql
+from core.inflight import tracked
+
+# Results are keyed on (tenant, data version, SQL text, params). The version is
+# bumped by every load of the tenant (core.load_state), so a load invalidates
+# that tenant's results without TTLs and leaves other tenants' results alone.
+RESULT_CACHE_MB = int(os.getenv("RESULT_CACHE_MB", "256"))
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR")  # optional Arrow IPC disk tier
+
+
+def _frame_size(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum()) or 1
+
+
+def _key_version(key: str, tenant: str) -> int:
+    """Get the data version of a cache key of the tenant (prefix ``tenant``)."""
+    version = key[len(tenant) :].split("-", 1)[0]
+    return int(version[1:]) if version[1:].isdigit() else -1
+
+
+class ResultCache:
+    """Size-bounded LRU of query results with an optional shared disk tier."""
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None):
+        self._memory = LRUCache(maxsize=max_bytes, getsizeof=_frame_size)
+        self._lock = threading.Lock()
+        self._disk = Path(disk_dir) if disk_dir else None
+        self._versions: Dict[str, int] = {}  # latest seen per tenant
+        if self._disk:
+            self._disk.mkdir(parents=True, exist_ok=True)
+
+    # -------------- Keys --------------#
+    @staticmethod
+    def key(tenant_id: str, version: int, sql: str, params) -> str:
+        payload = json.dumps([sql, params or {}], sort_keys=True, default=str)
+        digest = hashlib.sha256(payload.encode()).hexdigest()
+        return f"t{tenant_id}-v{version}-{digest}"
+
+    # -------------- Get / Put --------------#
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        with self._lock:
+            df = self._memory.get(key)
+        if df is None and self._disk:
+            df = self._read_disk(key)
+            if df is not None:
+                self._put_memory(key, df)
+        return df.copy() if df is not None else None
+
+    def put(self, key: str, df: pd.DataFrame) -> None:
+        self._put_memory(key, df.copy())
+        if self._disk:
+            self._write_disk(key, df)
+
+    def _put_memory(self, key: str, df: pd.DataFrame) -> None:
+        with self._lock:
+            try:
+                self._memory[key] = df
+            except ValueError:
+                pass  # larger than the whole cache
+
+    # -------------- Invalidation --------------#
+    def observe_version(self, tenant_id: str, version: int) -> None:
+        """Drop a tenant's entries from older data versions once a newer one is seen.
+
+        A version older than the latest seen (a process or thread that has not
+        caught up with a load yet) evicts nothing, so it never deletes the newer
+        entries other workers share through the disk tier.
+        """
+        tenant = f"t{tenant_id}-"
+        with self._lock:
+            if version <= self._versions.get(tenant_id, -1):
+                return
+            self._versions[tenant_id] = version
+            for key in [k for k in self._memory if k.startswith(tenant)]:
+                if _key_version(key, tenant) < version:
+                    del self._memory[key]
+        if self._disk:
+            for path in self._disk.glob(f"{tenant}v*.arrow"):
+                if _key_version(path.stem, tenant) < version:
+                    path.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+    # -------------- Disk tier --------------#
+    def _read_disk(self, key: str) -> Optional[pd.DataFrame]:
+        from pyarrow import feather
+
+        path = self._disk / f"{key}.arrow"
+        try:
+            return feather.read_table(path).to_pandas()
+        except (FileNotFoundError, OSError):
+            return None
+
+    def _write_disk(self, key: str, df: pd.DataFrame) -> None:
+        from pyarrow import feather
+
+        path = self._disk / f"{key}.arrow"
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            feather.write_feather(df.reset_index(drop=True), tmp)
+            os.replace(tmp, path)  # atomic, so other processes never see partial files
+        except (OSError, ValueError, TypeError):
+            tmp.unlink(missing_ok=True)
+
+
+result_cache = ResultCache(RESULT_CACHE_MB * 1024 * 1024, RESULT_CACHE_DIR)
+
+# Data version per SQLAlchemy connection checkout, so a unit of work
+# (`with engine.begin() as conn`) looks the version up once.
+_conn_versions: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+# Data versions pushed by core.listener (LISTEN on the load channel). While it is
+# connected they are current, so data_version() answers without a query.
+_pushed_versions: Dict[str, int] = {}
+_push_live = threading.Event()
+
+
+def push_version(tenant_id: str, version: int) -> bool:
+    """Record a tenant's new data version and evict its older results.
+
+    Returns whether the version changed.
+    """
+    changed = _pushed_versions.get(tenant_id) != version
+    _pushed_versions[tenant_id] = version
+    result_cache.observe_version(tenant_id, version)
+    return changed
+
+
+def set_push_live(live: bool) -> None:
+    """Mark pushed versions as current (listener connected) or stale."""
+    if live:
+        _push_live.set()
+    else:
+        _push_live.clear()
+
+
+def pushed_version(tenant_id: str) -> Optional[int]:
+    """Get the tenant's pushed data version, or None unless the listener is live."""
+    return _pushed_versions.get(tenant_id) if _push_live.is_set() else None
+
+
+def pushed_versions() -> Optional[Dict[str, int]]:
+    """Get every tenant's pushed data version, or None unless the listener is live."""
+    return dict(_pushed_versions) if _push_live.is_set() else None
+
+
+def data_version(conn) -> int:
+    """Get the tenant's current data version, once per connection checkout."""
+    try:
+        return _conn_versions[conn]
+    except (KeyError, TypeError):
+        pass
+
+    version = pushed_version(current_tenant(conn))
+    if version is not None:
+        return version
+
+    sql, params = get_data_version_sql()
+    with tracked(conn):
+        df = pd.read_sql(sql, conn, params=params)
+    version = int(df["data_version"].iloc[0]) if not df.empty else 0
+    result_cache.observe_version(current_tenant(conn), version)
+    try:
+        _conn_versions[conn] = version
+    except TypeError:
+        pass
+    return version
+
+
+def cached_read(conn, sql_params) -> pd.DataFrame:
+    """Read SQL with params through the result cache."""
+    sql, params = sql_params
+    key = ResultCache.key(current_tenant(conn), data_version(conn), sql, params)
+
+    df = result_cache.get(key)
+    if df is None:
+        with tracked(conn):
+            df = pd.read_sql(sql, conn, params=params)
+        result_cache.put(key, df)
+    return df
@@ -1,6 +1,11 @@
-import os, psycopg2
+import os, re, psycopg2
+from contextlib import contextmanager
 from functools import lru_cache
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+
+# Tenant used when none is chosen (the tenant seed_all.sh loads by default)
+DEFAULT_TENANT = os.getenv("TENANT_ID", "default")
+_TENANT_ID = re.compile(r"^[A-Za-z0-9_]{1,63}$")  # matches core.dim_tenant's check
 
 
 @lru_cache(maxsize=1)
@@ -12,12 +17,68 @@ def _dsn():
     return dsn
 
 
+def _reset_tenant(dbapi_connection, connection_record):
+    """Drop the tenant of a connection going back to the pool."""
+    connection_record.info.pop("tenant_id", None)
+    if dbapi_connection is None:  # invalidated
+        return
+    try:
+        with dbapi_connection.cursor() as cur:
+            cur.execute("RESET app.tenant_id")
+        dbapi_connection.commit()
+    except psycopg2.Error:
+        pass  # broken connections are discarded by the pool anyway
+
+
+@lru_cache(maxsize=1)
 def get_engine():
-    """Get a new database connection using the cached DSN."""
+    """Get the process-wide pooled engine using the cached DSN."""
     # return psycopg2.connect(_dsn())
-    return create_engine(_dsn(), pool_pre_ping=True, future=True)
+    engine = create_engine(
+        _dsn(),
+        pool_pre_ping=True,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        future=True,
+    )
+    event.listen(engine, "checkin", _reset_tenant)
+    return engine
 
 
 def get_conn():
     """Get a new database connection using the cached DSN."""
     return get_engine().connect()
+
+
+# -------------- Tenants --------------#
+def check_tenant_id(tenant_id=None) -> str:
+    """Get the tenant_id to use (the default if None), or raise ValueError."""
+    tenant_id = tenant_id or DEFAULT_TENANT
+    if not _TENANT_ID.match(tenant_id):
+        raise ValueError(f"Invalid tenant_id: {tenant_id!r}")
+    return tenant_id
+
+
+@contextmanager
+def tenant_session(tenant_id=None, engine=None):
+    """Begin a unit of work scoped to one tenant (like ``engine.begin()``).
+
+    Sets app.tenant_id, which core.current_tenant() and so every core.queries
+    builder filters on, and tags the connection so cached results are keyed
+    per tenant. The tenant is reset when the connection returns to the pool.
+    """
+    tenant_id = check_tenant_id(tenant_id)
+    with (engine or get_engine()).begin() as conn:
+        conn.exec_driver_sql(
+            "SELECT set_config('app.tenant_id', %(tenant_id)s, false)",
+            {"tenant_id": tenant_id},
+        )
+        conn.info["tenant_id"] = tenant_id
+        yield conn
+
+
+def current_tenant(conn) -> str:
+    """Get the tenant a connection was scoped to by tenant_session()."""
+    tenant_id = getattr(conn, "info", {}).get("tenant_id")
+    if tenant_id is None:
+        raise ValueError("Connection is not scoped to a tenant; use tenant_session()")
+    return tenant_id
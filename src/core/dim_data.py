@@ -1,25 +1,80 @@
 import pandas as pd
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple
+from core.cache import cached_read, data_version
 from core.dim_queries import (
+    get_all_tenants_sql,
     get_all_products_sql,
     get_all_countries_sql,
     get_all_months_sql,
+    search_countries_sql,
+    search_customers_sql,
+    search_products_sql,
 )
 
+# Rows per page of a dimension search
+SEARCH_PAGE_SIZE = 20
+
+
+def get_all_tenants(conn) -> pd.DataFrame:
+    """Get all tenants; works on any connection, scoped or not."""
+    sql, params = get_all_tenants_sql()
+    return pd.read_sql(sql, conn, params=params)
+
 
 def get_all_products(conn) -> pd.DataFrame:
     """Get all products from the dimension table."""
-    sql, params = get_all_products_sql()
-    return pd.read_sql(sql, conn, params=params)
+    return cached_read(conn, get_all_products_sql())
 
 
 def get_all_countries(conn) -> pd.DataFrame:
     """Get all countries from the dimension table."""
-    sql, params = get_all_countries_sql()
-    return pd.read_sql(sql, conn, params=params)
+    return cached_read(conn, get_all_countries_sql())
 
 
 def get_all_months(conn) -> pd.DataFrame:
     """Get all months from the dimension table."""
-    sql, params = get_all_months_sql()
-    return pd.read_sql(sql, conn, params=params)
+    return cached_read(conn, get_all_months_sql())
+
+
+def get_data_version(conn) -> int:
+    """Get the data version bumped by each load (0 before the first load)."""
+    return data_version(conn)
+
+
+# -------------- Search --------------#
+Page = Tuple[pd.DataFrame, Optional[tuple]]
+
+
+def _page(df: pd.DataFrame, limit: int, key: List[str]) -> Page:
+    """Split a result of limit + 1 rows into the page and the next page's cursor."""
+    cursor = tuple(df.iloc[limit - 1][key].tolist()) if len(df) > limit else None
+    return df.iloc[:limit].drop(columns="sort_key", errors="ignore"), cursor
+
+
+def search_customers(
+    conn, term: str = "", after: Optional[tuple] = None, limit: int = SEARCH_PAGE_SIZE
+) -> Page:
+    """Get one page of customers whose name matches ``term``, in name order.
+
+    Returns the page and the cursor to pass as ``after`` for the next one (None
+    on the last page).
+    """
+    df = cached_read(conn, search_customers_sql(term, after, limit + 1))
+    return _page(df, limit, ["sort_key", "customer_id"])
+
+
+def search_products(
+    conn, term: str = "", after: Optional[tuple] = None, limit: int = SEARCH_PAGE_SIZE
+) -> Page:
+    """Get one page of products whose name matches ``term``, like search_customers."""
+    df = cached_read(conn, search_products_sql(term, after, limit + 1))
+    return _page(df, limit, ["sort_key", "product_id"])
+
+
+def search_countries(
+    conn, term: str = "", after: Optional[tuple] = None, limit: int = SEARCH_PAGE_SIZE
+) -> Page:
+    """Get one page of countries matching ``term``, like search_customers."""
+    last = after[0] if after else None
+    df = cached_read(conn, search_countries_sql(term, last, limit + 1))
+    return _page(df, limit, ["country"])
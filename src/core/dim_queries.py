@@ -1,31 +1,197 @@
 from typing import Optional, Dict, Tuple
 
+# Search terms this long match anywhere in a name (trigram index); shorter ones
+# match as a prefix, since trigram lookups need three characters
+TRIGRAM_MIN = 3
+
+# Distinct countries by skipping through ix_dim_customer_country one probe per
+# country (a loose index scan), so the cost follows countries, not customers
+_COUNTRIES_CTE = """
+    WITH RECURSIVE countries AS (
+        (
+            SELECT country
+            FROM core.dim_customer
+            WHERE tenant_id = core.current_tenant()
+              AND country > %(after)s
+            ORDER BY country
+            LIMIT 1
+        )
+        UNION ALL
+        SELECT (
+            SELECT c.country
+            FROM core.dim_customer c
+            WHERE c.tenant_id = core.current_tenant()
+              AND c.country > countries.country
+            ORDER BY c.country
+            LIMIT 1
+        )
+        FROM countries
+        WHERE countries.country IS NOT NULL
+    )"""
+
+
+def get_all_tenants_sql() -> Tuple[str, Dict]:
+    """Generate SQL to get every tenant (not tenant-scoped)."""
+    sql = """
+    SELECT tenant_id, tenant_name
+    FROM core.dim_tenant
+    ORDER BY tenant_id
+    """
+    return sql, {}
+
 
 def get_all_products_sql() -> Tuple[str, Dict]:
     """Generate SQL to get all product names and IDs."""
     sql = """
     SELECT product_id, product_name
     FROM core.dim_product
+    WHERE tenant_id = core.current_tenant()
     """
     return sql, {}
 
 
 def get_all_countries_sql() -> Tuple[str, Dict]:
     """Generate SQL to get all countries."""
-    sql = """
-    SELECT DISTINCT country
-    FROM core.dim_customer
+    sql = f"""{_COUNTRIES_CTE}
+    SELECT country
+    FROM countries
     WHERE country IS NOT NULL
     ORDER BY country
     """
-    return sql, {}
+    return sql, {"after": ""}
+
+
+# -------------- Search --------------#
+def _search_key(column: str) -> str:
+    """The expression the dimension search indexes are built on."""
+    return f'lower({column}) COLLATE "C"'
+
+
+def _search_match(expr: str, term: str) -> Tuple[str, Dict]:
+    """Generate the LIKE predicate for a search term (TRUE for an empty term)."""
+    term = term.strip().lower()
+    if not term:
+        return "TRUE", {}
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    pattern = f"%{escaped}%" if len(term) >= TRIGRAM_MIN else f"{escaped}%"
+    return f"{expr} LIKE %(pattern)s", {"pattern": pattern}
+
+
+def _name_search_sql(
+    table: str,
+    id_column: str,
+    name_column: str,
+    columns: str,
+    term: str,
+    after: Optional[Tuple[str, str]],
+    limit: int,
+) -> Tuple[str, Dict]:
+    """Generate a keyset-paged name search over a tenant's dimension rows.
+
+    Rows come in (lower(name), id) order; ``after`` is that key of the last row
+    of the previous page.
+    """
+    key = _search_key(name_column)
+    match, params = _search_match(key, term)
+    where = ["tenant_id = core.current_tenant()", match]
+    if after is not None:
+        where.append(f"({key}, {id_column}) > (%(after_key)s, %(after_id)s)")
+        params.update(after_key=after[0], after_id=after[1])
+    params["limit"] = limit
+    sql = f"""
+    SELECT {columns}, {key} AS sort_key
+    FROM {table}
+    WHERE {" AND ".join(where)}
+    ORDER BY {key}, {id_column}
+    LIMIT %(limit)s
+    """
+    return sql, params
+
+
+def search_customers_sql(
+    term: str, after: Optional[Tuple[str, str]], limit: int
+) -> Tuple[str, Dict]:
+    """Generate SQL to search customers by name, one page at a time."""
+    return _name_search_sql(
+        "core.dim_customer",
+        "customer_id",
+        "name",
+        "customer_key, customer_id, name, country",
+        term,
+        after,
+        limit,
+    )
+
+
+def search_products_sql(
+    term: str, after: Optional[Tuple[str, str]], limit: int
+) -> Tuple[str, Dict]:
+    """Generate SQL to search products by name, one page at a time."""
+    return _name_search_sql(
+        "core.dim_product",
+        "product_id",
+        "product_name",
+        "product_id, product_name",
+        term,
+        after,
+        limit,
+    )
+
+
+def search_countries_sql(
+    term: str, after: Optional[str], limit: int
+) -> Tuple[str, Dict]:
+    """Generate SQL to search countries, one page at a time after ``after``."""
+    match, params = _search_match(_search_key("country"), term)
+    params.update(after=after or "", limit=limit)
+    sql = f"""{_COUNTRIES_CTE}
+    SELECT country
+    FROM countries
+    WHERE country IS NOT NULL AND {match}
+    ORDER BY country
+    LIMIT %(limit)s
+    """
+    return sql, params
 
 
 def get_all_months_sql() -> Tuple[str, Dict]:
-    """Generate SQL to get all months in YYYY-MM format."""
+    """Generate SQL to get all month keys with their YYYY-MM labels."""
+    sql = """
+    SELECT month_key AS month, month_label
+    FROM core.dim_month
+    ORDER BY month_key DESC
+    """
+    return sql, {}
+
+
+def get_data_version_sql() -> Tuple[str, Dict]:
+    """Generate SQL to get the data version bumped by each load."""
+    sql = """
+    SELECT data_version
+    FROM core.load_state
+    WHERE tenant_id = core.current_tenant()
+    """
+    return sql, {}
+
+
+def bump_data_version_sql() -> Tuple[str, Dict]:
+    """Generate SQL to bump the tenant's data version after derived tables change.
+
+    Listening dashboards (core.listener) are notified when the bump commits.
+    """
     sql = """
-    SELECT DISTINCT TO_CHAR(DATE_TRUNC('month', date), 'YYYY-MM') AS month
-    FROM core.dim_date
-    ORDER BY month DESC
+    WITH bumped AS (
+        INSERT INTO core.load_state AS t (tenant_id, data_version, loaded_at)
+        VALUES (core.current_tenant(), 1, now())
+        ON CONFLICT (tenant_id) DO UPDATE
+        SET data_version = t.data_version + 1,
+            loaded_at = EXCLUDED.loaded_at
+        RETURNING t.tenant_id, t.data_version
+    )
+    SELECT pg_notify(
+        'data_loaded',
+        json_build_object('tenant_id', tenant_id, 'data_version', data_version)::TEXT
+    )
+    FROM bumped
     """
     return sql, {}
@@ -0,0 +1,118 @@
+from __future__ import annotations
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from . import queries as q
+from core.cache import cached_read
+from core.metrics import MONEY
+
+RUNWAY_PERCENTILES = (10, 50, 90)
+# Runways beyond the horizon are reported like exec_overview_kpis' infinite runway
+NO_RUNWAY_END = 9999.0
+
+
+# -------------- History --------------#
+def _history(conn, end_month: int, lookback: int) -> pd.DataFrame:
+    """Get monthly cash flows, ending cash and total MRR (cents) up to end_month."""
+
+    start_month = end_month - lookback + 1
+    cash = cached_read(conn, q.cash_history_sql(start_month, end_month))
+    mrr = cached_read(conn, q.total_mrr_by_month_sql(start_month, end_month))
+    df = cash.merge(mrr, on="month", how="left")
+    df["month"] = df["month"].astype("int32")
+    for col in ["cash_in", "cash_out", "mrr"]:
+        df[col] = df[col].fillna(0).astype(MONEY)
+    return df
+
+
+def _growth(values: np.ndarray) -> np.ndarray:
+    """Month-over-month growth rates, NaN where the previous month is not positive."""
+    prev, curr = values[:-1].astype(float), values[1:].astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(prev > 0, curr / prev - 1.0, np.nan)
+
+
+# -------------- Simulation --------------#
+def simulate_cash_paths(
+    history: pd.DataFrame, paths: int, horizon: int, seed: Optional[int] = 0
+) -> np.ndarray:
+    """Simulate ending cash (cents) as a paths x horizon array.
+
+    Each simulated month draws one historical month and applies its MRR growth
+    and cash-out growth together, so their correlation is kept. Cash in scales
+    with MRR; cash out compounds on the latest month's spend.
+    """
+
+    mrr_growth = _growth(history["mrr"].to_numpy())
+    out_growth = _growth(history["cash_out"].to_numpy())
+    valid = np.isfinite(mrr_growth) & np.isfinite(out_growth)
+    if not valid.any():
+        mrr_growth, out_growth = np.zeros(1), np.zeros(1)
+    else:
+        mrr_growth, out_growth = mrr_growth[valid], out_growth[valid]
+
+    last = history.iloc[-1]
+    rng = np.random.default_rng(seed)
+    draws = rng.integers(0, len(mrr_growth), size=(paths, horizon))
+
+    cash_in = float(last["cash_in"]) * np.cumprod(1.0 + mrr_growth[draws], axis=1)
+    cash_out = float(last["cash_out"]) * np.cumprod(1.0 + out_growth[draws], axis=1)
+    burn = cash_out - cash_in
+    return float(last["ending_cash_balance"]) - np.cumsum(burn, axis=1)
+
+
+def _runway(cash: np.ndarray) -> np.ndarray:
+    """Months until cash first runs out on each path (inf if it never does)."""
+    broke = cash <= 0
+    return np.where(broke.any(axis=1), broke.argmax(axis=1) + 1, np.inf)
+
+
+def runway_forecast(
+    conn,
+    end_month: int,
+    paths: int = 5000,
+    horizon: int = 60,
+    lookback: int = 24,
+    seed: Optional[int] = 0,
+) -> Optional[Tuple[Dict[str, float], pd.DataFrame]]:
+    """Forecast runway percentiles and cash bands by resampling monthly history.
+
+    Returns (summary, bands) where ``bands`` holds p10/p50/p90 ending cash
+    (cents) per forecast month, or None without enough history. The forecast
+    starts after the last month with an actual ending balance (``anchor_month``
+    in the summary), which can be earlier than end_month. A fixed seed keeps the
+    bands stable across reruns.
+    """
+
+    history = _history(conn, end_month, lookback)
+    actual = history.loc[history["ending_cash_balance"].notna(), "month"]
+    if len(actual) < 2:
+        return None
+
+    # Keep every month so _growth only compares adjacent months: months without
+    # cash rows get NaN flows (no growth drawn across them) and a missing ending
+    # balance carries the previous one forward.
+    anchor = int(actual.iloc[-1])
+    months = pd.RangeIndex(int(actual.iloc[0]), anchor + 1, name="month")
+    history = history.set_index("month").reindex(months).reset_index()
+    history["ending_cash_balance"] = history["ending_cash_balance"].ffill()
+
+    cash = simulate_cash_paths(history, paths, horizon, seed)
+    runway = _runway(cash)
+
+    summary = {
+        f"runway_p{p}": float(v) if np.isfinite(v) else NO_RUNWAY_END
+        for p, v in zip(
+            RUNWAY_PERCENTILES,
+            np.percentile(runway, RUNWAY_PERCENTILES, method="lower"),
+        )
+    }
+    summary["prob_cash_out"] = float(np.isfinite(runway).mean())
+    summary["horizon_months"] = float(horizon)
+    summary["anchor_month"] = float(anchor)
+
+    bands = pd.DataFrame(
+        {f"p{p}": np.percentile(cash, p, axis=0) for p in RUNWAY_PERCENTILES}
+    ).round().astype(MONEY)
+    bands.insert(0, "month", np.arange(anchor + 1, anchor + horizon + 1))
+    return summary, bands
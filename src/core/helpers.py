@@ -1,4 +1,5 @@
 import math
+import re
 
 
 def safe_margin(numerator: float, denominator: float) -> float:
@@ -7,3 +8,39 @@ def safe_margin(numerator: float, denominator: float) -> float:
     if denominator == 0:
         return math.nan
     return numerator / denominator
+
+
+# Month keys count months since 1970-01, so month arithmetic is integer arithmetic.
+EPOCH_YEAR = 1970
+
+
+def month_key(year: int, month: int) -> int:
+    """Get the integer month key for a calendar year and month."""
+    return (year - EPOCH_YEAR) * 12 + (month - 1)
+
+
+def month_year(key: int) -> int:
+    """Get the calendar year of a month key."""
+    return key // 12 + EPOCH_YEAR
+
+
+def month_of_year(key: int) -> int:
+    """Get the calendar month (1-12) of a month key."""
+    return key % 12 + 1
+
+
+def month_label(key: int) -> str:
+    """Format a month key as a YYYY-MM label for display."""
+    return f"{month_year(key)}-{month_of_year(key):02d}"
+
+
+def parse_month_label(label: str) -> int:
+    """Parse a YYYY-MM label into a month key.
+
+    Raises ValueError for anything else (e.g. 2024-13, 2024-1, 2024-01-05), so a
+    bad label is never rolled into a neighbouring month.
+    """
+    match = re.fullmatch(r"(\d{4})-(\d{2})", label)
+    if match is None or not 1 <= int(match.group(2)) <= 12:
+        raise ValueError(f"Not a YYYY-MM month: {label!r}")
+    return month_key(int(match.group(1)), int(match.group(2)))
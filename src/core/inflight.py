@@ -0,0 +1,187 @@
+from __future__ import annotations
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+from cachetools import LRUCache
+
+# Statements that may hit Postgres (cache misses) per rerun
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "50"))
+# How often superseded reruns are checked for while statements run
+WATCH_INTERVAL = float(os.getenv("QUERY_WATCH_INTERVAL", "0.05"))
+
+
+class QueryCancelled(RuntimeError):
+    """The rerun that issued the statement was superseded and its SQL cancelled."""
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """The rerun issued more statements than its query budget allows."""
+
+
+class RerunScope:
+    """In-flight statements and query budget of one rerun of one session.
+
+    ``superseded`` is polled by a watcher thread while statements run; once it
+    returns True, every in-flight statement is cancelled server-side (the
+    cancel request pg_cancel_backend() would send) and later statements are
+    refused. ``on_cancel`` runs on the issuing thread before QueryCancelled is
+    raised, so the caller can hand control back to its own rerun handling.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        budget: int = QUERY_BUDGET,
+        superseded: Optional[Callable[[], bool]] = None,
+        on_cancel: Optional[Callable[[], None]] = None,
+    ):
+        self.key = key
+        self.budget = budget
+        self.superseded = superseded
+        self.on_cancel = on_cancel
+        self.used = 0
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._running: Dict[int, object] = {}  # id -> DBAPI connection
+
+    def cancel(self) -> None:
+        """Cancel every in-flight statement and refuse new ones.
+
+        The lock is held across the cancels: _exit waits for it, so a connection
+        cannot go back to the pool (and run another session's statement) between
+        being looked up here and being cancelled.
+        """
+        with self._lock:
+            self.cancelled = True
+            for dbapi_conn in self._running.values():
+                try:
+                    dbapi_conn.cancel()
+                except Exception:  # noqa: BLE001 - connection already closed or idle
+                    pass
+
+    def _enter(self, dbapi_conn) -> int:
+        with self._lock:
+            if self.cancelled:
+                raise QueryCancelled(f"rerun {self.key} was superseded")
+            if self.used >= self.budget:
+                raise QueryBudgetExceeded(
+                    f"rerun {self.key} exceeded its budget of {self.budget} queries"
+                )
+            self.used += 1
+            token = id(dbapi_conn)
+            self._running[token] = dbapi_conn
+            return token
+
+    def _exit(self, token: int) -> None:
+        with self._lock:
+            self._running.pop(token, None)
+
+    @property
+    def busy(self) -> bool:
+        return bool(self._running)
+
+
+_current: contextvars.ContextVar[Optional[RerunScope]] = contextvars.ContextVar(
+    "inflight_scope", default=None
+)
+_scopes: "LRUCache[str, RerunScope]" = LRUCache(maxsize=10_000)  # latest per key
+_scopes_lock = threading.Lock()
+_watcher: Optional[threading.Thread] = None
+
+
+# -------------- Scopes --------------#
+def begin_rerun(
+    key: str,
+    budget: int = QUERY_BUDGET,
+    superseded: Optional[Callable[[], bool]] = None,
+    on_cancel: Optional[Callable[[], None]] = None,
+) -> RerunScope:
+    """Start the rerun scope for ``key`` (e.g. a session), cancelling the last one."""
+
+    scope = RerunScope(key, budget, superseded, on_cancel)
+    with _scopes_lock:
+        previous = _scopes.get(key)
+        _scopes[key] = scope
+    if previous is not None:
+        previous.cancel()
+    _current.set(scope)
+    _ensure_watcher()
+    return scope
+
+
+@contextmanager
+def rerun_scope(key: str, **kwargs):
+    """begin_rerun for a block (e.g. a fragment), then restore the enclosing scope."""
+    previous = _current.get()
+    scope = begin_rerun(key, **kwargs)
+    try:
+        yield scope
+    finally:
+        _current.set(previous)
+
+
+def current_scope() -> Optional[RerunScope]:
+    return _current.get()
+
+
+# -------------- Statements --------------#
+def _dbapi_connection(conn):
+    """Get the DBAPI (psycopg2) connection behind a SQLAlchemy connection."""
+    try:
+        return conn.connection.dbapi_connection
+    except AttributeError:
+        return conn
+
+
+@contextmanager
+def tracked(conn):
+    """Run a statement on ``conn`` under the current rerun scope, if any."""
+
+    scope = _current.get()
+    if scope is None:
+        yield
+        return
+
+    try:
+        token = scope._enter(_dbapi_connection(conn))
+    except QueryCancelled:
+        if scope.on_cancel is not None:
+            scope.on_cancel()
+        raise
+    try:
+        yield
+    except Exception as e:
+        if scope.cancelled:
+            if scope.on_cancel is not None:
+                scope.on_cancel()
+            raise QueryCancelled(f"rerun {scope.key} was superseded") from e
+        raise
+    finally:
+        scope._exit(token)
+
+
+# -------------- Watcher --------------#
+def _watch() -> None:
+    while True:
+        with _scopes_lock:
+            scopes = [s for s in _scopes.values() if s.busy and not s.cancelled]
+        for scope in scopes:
+            try:
+                if scope.superseded is not None and scope.superseded():
+                    scope.cancel()
+            except Exception:  # noqa: BLE001 - never let the watcher die
+                pass
+        time.sleep(WATCH_INTERVAL)
+
+
+def _ensure_watcher() -> None:
+    global _watcher
+    with _scopes_lock:
+        if _watcher is None or not _watcher.is_alive():
+            _watcher = threading.Thread(
+                target=_watch, name="inflight-watcher", daemon=True
+            )
+            _watcher.start()
@@ -0,0 +1,192 @@
+from __future__ import annotations
+import argparse
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+import pandas as pd
+from . import queries as q
+from core.cache import cached_read
+from core.db import DEFAULT_TENANT, get_engine, tenant_session
+from core.dim_data import get_all_products, get_all_countries, get_all_months
+from core.dim_queries import bump_data_version_sql
+from core.metrics import (
+    exec_overview_kpis_by_slice,
+    ALL,
+    BRIDGE_STEPS,
+    KPI_COLUMNS,
+    row_results,
+)
+
+TIME_RANGES = ["Last 12M", "YTD", "QTD"]
+
+# A month's inputs feed the KPIs of that month and of the next three months
+# (previous-month flows and quarter-over-quarter ARR growth).
+_DEPENDENT_OFFSETS = (0, 1, 2, 3)
+
+
+# -------------- Lookup --------------#
+def cube_kpis(
+    conn,
+    end_month: int,
+    time_range: str = "Last 12M",
+    product_id: Optional[str] = None,
+    country: Optional[str] = None,
+) -> Optional[Tuple[Dict[str, float], pd.DataFrame]]:
+    """Get precomputed KPIs and ARR bridge for a slice, or None if not in the cube."""
+
+    df = cached_read(
+        conn,
+        q.kpi_cube_lookup_sql(end_month, time_range, product_id or ALL, country or ALL),
+    )
+    if df.empty:
+        return None
+
+    return row_results(df.iloc[0])
+
+
+# -------------- Build --------------#
+def _slice_lists(conn) -> Tuple[List[str], List[str]]:
+    """Get every product_id and country the dashboard can filter on."""
+    products = get_all_products(conn)["product_id"].tolist()
+    countries = get_all_countries(conn)["country"].tolist()
+    return products, countries
+
+
+def _init_worker() -> None:
+    """Drop pooled connections inherited from the parent process."""
+    get_engine().dispose(close=False)
+
+
+def _build_month(
+    month: int, products: List[str], countries: List[str], tenant_id: str
+) -> List[Dict]:
+    """Worker: compute every time range x slice for one month in one pass per range."""
+    frames = []
+    with tenant_session(tenant_id) as conn:
+        for time_range in TIME_RANGES:
+            df = exec_overview_kpis_by_slice(
+                conn, time_range, month, products=products, countries=countries
+            )
+            df["time_range"] = time_range
+            frames.append(df)
+    rows = pd.concat(frames, ignore_index=True)
+    rows["month_key"] = month
+    # Missing bridges are stored as NULL; NaN margins stay NaN like the live path
+    for _, col, _ in BRIDGE_STEPS:
+        rows[col] = rows[col].astype(object).where(rows[col].notna(), None)
+    return rows.to_dict(orient="records")
+
+
+def _write_month(conn, month: int, rows: List[Dict], fingerprint: str) -> None:
+    """Replace one month of the tenant's cube and record its input fingerprint."""
+    conn.exec_driver_sql(
+        "DELETE FROM core.kpi_cube "
+        "WHERE tenant_id = core.current_tenant() AND month_key = %(month)s",
+        {"month": month},
+    )
+    if rows:
+        cols = ["month_key", "time_range", "product_id", "country"] + KPI_COLUMNS
+        cols += [col for _, col, _ in BRIDGE_STEPS]
+        conn.exec_driver_sql(
+            f"INSERT INTO core.kpi_cube (tenant_id, {', '.join(cols)}) "
+            f"VALUES (core.current_tenant(), {', '.join(f'%({c})s' for c in cols)})",
+            rows,
+        )
+    conn.exec_driver_sql(
+        """
+        INSERT INTO core.kpi_cube_state (tenant_id, month_key, fingerprint, built_at)
+        VALUES (core.current_tenant(), %(month)s, %(fingerprint)s, now())
+        ON CONFLICT (tenant_id, month_key) DO UPDATE
+        SET fingerprint = EXCLUDED.fingerprint,
+            built_at = EXCLUDED.built_at
+        """,
+        {"month": month, "fingerprint": fingerprint},
+    )
+
+
+def _fingerprints(df: pd.DataFrame) -> Dict[int, str]:
+    """Map month keys to input fingerprints."""
+    return dict(zip(df["month"].astype(int).tolist(), df["fingerprint"].tolist()))
+
+
+def affected_months(
+    current: Dict[int, str], previous: Dict[int, str], months: Iterable[int]
+) -> List[int]:
+    """Get the cube months whose inputs (or dependent inputs) changed since the last build."""
+    changed = {m for m, fp in current.items() if previous.get(m) != fp}
+    months = set(months)
+    return sorted(
+        {m + offset for m in changed for offset in _DEPENDENT_OFFSETS} & months
+    )
+
+
+def refresh_kpi_cube(
+    engine,
+    tenant_id: Optional[str] = None,
+    full: bool = False,
+    workers: Optional[int] = None,
+) -> List[int]:
+    """Recompute the tenant's KPI cube for every month whose inputs changed.
+
+    Returns the months built.
+    """
+
+    tenant_id = tenant_id or DEFAULT_TENANT
+    with tenant_session(tenant_id, engine) as conn:
+        months = get_all_months(conn)["month"].tolist()
+        products, countries = _slice_lists(conn)
+        current = _fingerprints(cached_read(conn, q.kpi_cube_fingerprints_sql()))
+        previous = (
+            {} if full else _fingerprints(cached_read(conn, q.kpi_cube_state_sql()))
+        )
+
+    # New products or countries add slices to every month
+    slices_digest = hashlib.md5(repr((products, countries)).encode()).hexdigest()
+    current = {m: f"{fp}:{slices_digest}" for m, fp in current.items()}
+
+    todo = affected_months(current, previous, months)
+    if not todo:
+        return []
+
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(), initializer=_init_worker
+    ) as pool:
+        results = pool.map(
+            _build_month,
+            todo,
+            [products] * len(todo),
+            [countries] * len(todo),
+            [tenant_id] * len(todo),
+        )
+        for month, rows in zip(todo, results):
+            with tenant_session(tenant_id, engine) as conn:
+                _write_month(conn, month, rows, current.get(month, ""))
+
+    # Cached cube misses from before the refresh must not outlive it
+    with tenant_session(tenant_id, engine) as conn:
+        conn.exec_driver_sql(*bump_data_version_sql())
+    return todo
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Refresh the precomputed KPI cube.")
+    parser.add_argument(
+        "--full", action="store_true", help="Rebuild every month, not just changed ones."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Worker processes (default: CPUs)."
+    )
+    parser.add_argument(
+        "--tenant", default=DEFAULT_TENANT, help="Tenant to refresh (default: env)."
+    )
+    args = parser.parse_args()
+
+    built = refresh_kpi_cube(
+        get_engine(), args.tenant, full=args.full, workers=args.workers
+    )
+    print(f"KPI cube refreshed for {len(built)} month(s).")
+
+
+if __name__ == "__main__":
+    main()
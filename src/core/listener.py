@@ -0,0 +1,137 @@
+from __future__ import annotations
+import json
+import logging
+import os
+import select
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import psycopg2
+from core.cache import push_version, set_push_live
+from core.db import get_engine, tenant_session
+
+logger = logging.getLogger(__name__)
+
+# Channel transform_upsert.sql and bump_data_version_sql() notify after a load
+LOAD_CHANNEL = "data_loaded"
+# Seconds between reconnect attempts after the listening connection drops
+RECONNECT_DELAY = float(os.getenv("LISTENER_RECONNECT_DELAY", "5"))
+# Seconds to block waiting for notifications before checking for shutdown
+POLL_TIMEOUT = 30.0
+PREWARM = os.getenv("LISTENER_PREWARM", "1") == "1"
+
+
+def _listen_dsn() -> str:
+    """Get a libpq DSN for the app's database (psycopg2 cannot parse SQLAlchemy URLs)."""
+    url = get_engine().url.set(drivername="postgresql")
+    return url.render_as_string(hide_password=False)
+
+
+# -------------- Pre-warming --------------#
+def prewarm(tenant_id: str) -> None:
+    """Read the views most sessions open first so they hit the result cache."""
+    # Imported here: the metrics layer is only needed once a load arrives
+    from core.dim_data import get_all_countries, get_all_months, get_all_products
+    from core.forecast import runway_forecast
+    from core.kpi_cube import TIME_RANGES, cube_kpis
+    from core.metrics import latest_month, arr_bridge, cost_breakdown
+    from core.metrics import exec_overview_kpis
+
+    with tenant_session(tenant_id) as conn:
+        get_all_products(conn)
+        get_all_countries(conn)
+        get_all_months(conn)
+        month = latest_month(conn)
+        if month is None:
+            return
+        for time_range in TIME_RANGES:
+            if cube_kpis(conn, month, time_range) is None:
+                exec_overview_kpis(conn, time_range=time_range, end_month=month)
+                arr_bridge(conn, time_range=time_range, end_month=month)
+            cost_breakdown(conn, time_range=time_range, end_month=month)
+        runway_forecast(conn, month)
+
+
+# -------------- Listener --------------#
+class LoadListener(threading.Thread):
+    """Background LISTEN on the load channel for this process.
+
+    Each notification pushes the tenant's new data version to core.cache, which
+    evicts that tenant's older results, then pre-warms the tenant's common
+    views. While connected, data_version() needs no query; after a reconnect,
+    versions are re-read from core.load_state so missed loads are caught up.
+    """
+
+    def __init__(self, dsn: Optional[str] = None, prewarm_views: bool = PREWARM):
+        super().__init__(name="load-listener", daemon=True)
+        self.dsn = dsn or _listen_dsn()
+        self.prewarm_views = prewarm_views
+        self._stopping = threading.Event()
+        self._warmer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prewarm")
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self._listen()
+            except (psycopg2.Error, OSError) as e:
+                logger.warning("Load listener disconnected: %s", e)
+            finally:
+                set_push_live(False)
+            self._stopping.wait(RECONNECT_DELAY)
+
+    def _listen(self) -> None:
+        conn = psycopg2.connect(
+            self.dsn, keepalives=1, keepalives_idle=30, keepalives_interval=10
+        )
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {LOAD_CHANNEL}")
+                # Loads committed while this process was not listening
+                cur.execute("SELECT tenant_id, data_version FROM core.load_state")
+                for tenant_id, version in cur.fetchall():
+                    push_version(tenant_id, int(version))
+            set_push_live(True)
+
+            while not self._stopping.is_set():
+                if select.select([conn], [], [], POLL_TIMEOUT) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self._on_notify(conn.notifies.pop(0).payload)
+        finally:
+            conn.close()
+
+    def _on_notify(self, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+            tenant_id, version = message["tenant_id"], int(message["data_version"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed load notification: %r", payload)
+            return
+        if push_version(tenant_id, version) and self.prewarm_views:
+            self._warmer.submit(self._prewarm, tenant_id)
+
+    @staticmethod
+    def _prewarm(tenant_id: str) -> None:
+        try:
+            prewarm(tenant_id)
+        except Exception:  # noqa: BLE001 - sessions will simply load on demand
+            logger.exception("Pre-warming tenant %s failed", tenant_id)
+
+
+_listener: Optional[LoadListener] = None
+_listener_lock = threading.Lock()
+
+
+def start_listener(**kwargs) -> LoadListener:
+    """Start this process's load listener once; later calls return the same one."""
+    global _listener
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = LoadListener(**kwargs)
+            _listener.start()
+        return _listener
@@ -1,45 +1,84 @@
 from __future__ import annotations
-from typing import Optional, Dict
+import os
+from typing import Optional, Dict, Tuple
 import numpy as np
 import pandas as pd
 from . import queries as q
-from core.helpers import safe_margin
+from . import mrr_engine
+from core.cache import cached_read
+from core.helpers import safe_margin, month_of_year
+
+# Money is carried as int64 cents from SQL through every sum and flow; only
+# ui.components converts to display units.
+MONEY = "int64"
+
+# Point-in-time MRR from the snapshot table, or "events" for the event-delta engine
+MRR_SOURCE = os.getenv("MRR_SOURCE", "snapshot")
 
 
 # -------------- Utilities --------------#
 def _read(conn, sql_params):
-    """Helper to read SQL with params."""
-    sql, params = sql_params
-    return pd.read_sql(sql, conn, params=params)
+    """Helper to read SQL with params through the cross-session result cache."""
+    return cached_read(conn, sql_params)
+
+
+def latest_month(conn) -> Optional[int]:
+    """Get the latest loaded month key from load metadata."""
+    df = _read(conn, q.latest_month_sql())
+    latest = df["latest_month"].iloc[0] if not df.empty else None
+    return None if latest is None or pd.isna(latest) else int(latest)
 
 
-def _latest_month(series: pd.Series) -> Optional[str]:
-    """Get the latest month from a series of YYYY-MM strings."""
-    return series.sort_values().iloc[-1] if not series.empty else None
+def month_anchors(start_month, end_month) -> Dict[str, int]:
+    """Get the curr/prev/prev_q month keys a KPI reads, limited to the window."""
+    if end_month is None:
+        return {}
+    in_window = lambda m: start_month is None or m >= start_month
+    anchors = dict(
+        curr=end_month, prev=end_month - 1, prev_q=_prev_quarter_month(end_month)
+    )
+    return {name: m for name, m in anchors.items() if in_window(m)}
 
 
-def _prev_quarter_month(curr_month: str) -> Optional[str]:
-    """Get the month string (YYYY-MM) for the month 3 months before the given month."""
-    p = pd.Period(curr_month, freq="M") - 3
-    return str(p)
+def _prev_quarter_month(curr_month: int) -> int:
+    """Get the month key for the month 3 months before the given month."""
+    return curr_month - 3
 
 
 # -------------- Core Spines --------------#
 def _mrr_spine(
-    conn, product_id=None, country=None, start_month=None, end_month=None
+    conn, product_id=None, country=None, start_month=None, end_month=None, months=None
 ) -> pd.DataFrame:
-    """Get the monthly MRR spine with optional filters."""
+    """Get the monthly MRR spine with optional filters.
+
+    With ``months``, only those months are fetched (no first-paid anchors).
+    """
 
     if product_id == "All":
         product_id = None
     if country == "All":
         country = None
 
-    df = _read(
-        conn, q.monthly_customer_mrr_sql(product_id, country, start_month, end_month)
-    )
-    df["month"] = df["month"].astype(str)
-    df["mrr"] = df["mrr"].astype(float).fillna(0.0)
+    if months is not None:
+        if not months:
+            return pd.DataFrame(
+                {
+                    "customer_key": pd.Series(dtype="int32"),
+                    "month": pd.Series(dtype="int32"),
+                    "mrr": pd.Series(dtype=MONEY),
+                }
+            )
+        if MRR_SOURCE == "events":
+            return mrr_engine.customer_mrr(conn, product_id, country, months=months)
+        df = _read(conn, q.customer_mrr_at_months_sql(months, product_id, country))
+    else:
+        df = _read(
+            conn,
+            q.monthly_customer_mrr_sql(product_id, country, start_month, end_month),
+        )
+    df["customer_key"] = df["customer_key"].astype("int32")
+    df["month"] = df["month"].astype("int32")
+    df["mrr"] = df["mrr"].fillna(0).astype(MONEY)
     return df
 
 
@@ -47,60 +86,115 @@ def _costs_spine(conn, start_month=None, end_month=None) -> pd.DataFrame:
     """Get the monthly costs spine (COGS + OpEx)."""
 
     df = _read(conn, q.costs_by_month_sql(start_month, end_month))
-    df["month"] = df["month"].astype(str)
+    df["month"] = df["month"].astype("int32")
     for col in ["cogs", "opex"]:
-        df[col] = df[col].astype(float).fillna(0.0)
+        df[col] = df[col].fillna(0).astype(MONEY)
+    return df
+
+
+def _cost_breakdown_spine(
+    conn, start_month=None, end_month=None, cost_group=None
+) -> pd.DataFrame:
+    """Get the monthly costs by category and subcategory."""
+
+    df = _read(conn, q.cost_breakdown_by_month_sql(start_month, end_month, cost_group))
+    df["month"] = df["month"].astype("int32")
+    df["amount"] = df["amount"].fillna(0).astype(MONEY)
     return df
 
 
-def _burn_and_cash_spine(conn, month: str) -> pd.DataFrame:
+def _product_costs_spine(conn, month: Optional[int]) -> pd.DataFrame:
+    """Get the COGS and OpEx allocated to each product for one month."""
+
+    if month is None:
+        return pd.DataFrame(
+            {"cogs": pd.Series(dtype=MONEY), "opex": pd.Series(dtype=MONEY)},
+            index=pd.Index([], name="product_id", dtype=str),
+        )
+    df = _read(conn, q.product_costs_sql(month))
+    for col in ["cogs", "opex"]:
+        df[col] = df[col].fillna(0).astype(MONEY)
+    return df.set_index("product_id")
+
+
+def _burn_and_cash_spine(conn, month: int) -> pd.DataFrame:
     """Get the burn and cash balance for a specific month."""
 
     df = _read(conn, q.burn_and_cash_sql(month))
-    df["net_monthly_burn"] = df["net_monthly_burn"].astype(float).fillna(0.0)
-    df["ending_cash_balance"] = df["ending_cash_balance"].astype(float).fillna(0.0)
+    df["net_monthly_burn"] = df["net_monthly_burn"].fillna(0).astype(MONEY)
+    df["ending_cash_balance"] = df["ending_cash_balance"].fillna(0).astype(MONEY)
     return df
 
 
-def _data_bounds(conn) -> tuple[pd.Period, pd.Period]:
-    """Get the min and max month available in the data."""
+def _data_bounds(conn) -> tuple[Optional[int], Optional[int]]:
+    """Get the min and max month key available in the data."""
 
     df = _read(conn, q.data_bounds_sql())
 
     min_month = df["min_month"].iloc[0]
     max_month = df["max_month"].iloc[0]
 
-    return pd.Period(min_month, freq="M"), pd.Period(max_month, freq="M")
+    to_key = lambda m: None if pd.isna(m) else int(m)
 
+    return to_key(min_month), to_key(max_month)
 
-def _window_bounds(conn, end_month: str | None, time_range: str):
-    if not end_month:
+
+def window_bounds(conn, end_month: int | None, time_range: str):
+    if end_month is None:
         return None, None
 
-    end_dt = pd.Period(end_month, freq="M")
+    end_key = int(end_month)
+    month = month_of_year(end_key)
 
     if time_range == "Last 12M":
-        start_dt = end_dt - 11
+        start_key = end_key - 11
     elif time_range == "YTD":
-        start_dt = pd.Period(f"{end_dt.year}-01", freq="M")
+        start_key = end_key - (month - 1)
     elif time_range == "QTD":
-        q_start = ((end_dt.month - 1) // 3) * 3 + 1
-        start_dt = pd.Period(f"{end_dt.year}-{q_start:02d}", freq="M")
+        start_key = end_key - ((month - 1) % 3)
     else:
-        start_dt = None
+        start_key = None
 
-    start_date_for_query = (start_dt - 1) if start_dt else None
+    start_key_for_query = (start_key - 1) if start_key is not None else None
 
     # Check of date bounds in the database
     db_min_month, db_max_month = _data_bounds(conn)
-    if start_date_for_query and db_min_month and start_date_for_query < db_min_month:
-        start_date_for_query = db_min_month
-    if end_dt and db_max_month and end_dt > db_max_month:
-        end_dt = db_max_month
+    if (
+        start_key_for_query is not None
+        and db_min_month is not None
+        and start_key_for_query < db_min_month
+    ):
+        start_key_for_query = db_min_month
+    if db_max_month is not None and end_key > db_max_month:
+        end_key = db_max_month
+
+    return start_key_for_query, end_key
+
 
-    to_str = lambda dt: str(dt) if dt else None
+def company_costs_and_cash(conn, curr_month, start_month, end_month):
+    """Get COGS, OpEx, net burn and ending cash for the current month."""
+
+    costs = _costs_spine(conn, start_month, end_month)
+    current_month_costs = costs[costs["month"] == curr_month]
+    cogs = int(current_month_costs["cogs"].sum())
+    opex = int(current_month_costs["opex"].sum())
+
+    if curr_month is not None:
+        cash_and_burn = _burn_and_cash_spine(conn, curr_month)
+    else:
+        cash_and_burn = None
 
-    return to_str(start_date_for_query), to_str(end_dt)
+    net_monthly_burn = (
+        int(cash_and_burn["net_monthly_burn"].iloc[0])
+        if cash_and_burn is not None and not cash_and_burn.empty
+        else 0
+    )
+    ending_cash_balance = (
+        int(cash_and_burn["ending_cash_balance"].iloc[0])
+        if cash_and_burn is not None and not cash_and_burn.empty
+        else 0
+    )
+    return cogs, opex, net_monthly_burn, ending_cash_balance
 
 
 # -------------- KPI Block --------------#
@@ -109,33 +203,38 @@ def exec_overview_kpis(
     product_id: Optional[str] = None,
     country: Optional[str] = None,
     time_range: str = "Last 12M",
-    end_month: Optional[str] = None,
+    end_month: Optional[int] = None,
 ) -> Dict[str, float]:
-    """Calculate executive overview KPIs."""
+    """Calculate executive overview KPIs (money in integer cents)."""
 
     # If end_month is not provided, use the latest month from the data
     if end_month is None:
-        end_month = _latest_month(
-            _mrr_spine(conn, product_id, country, None, None)["month"]
-        )
+        end_month = latest_month(conn)
 
     # Get start and end months based on time_range
-    start_month, end_month = _window_bounds(conn, end_month, time_range)
+    start_month, end_month = window_bounds(conn, end_month, time_range)
 
-    # Get MRR spine
-    mrr = _mrr_spine(conn, product_id, country, start_month, end_month)
+    # Get MRR at the anchor months only
+    anchors = month_anchors(start_month, end_month)
+    mrr = _mrr_spine(conn, product_id, country, months=list(anchors.values()))
 
     # Month anchors
     curr_month = end_month
-    prev_quarter_month = _prev_quarter_month(curr_month) if curr_month else None
-    prev_month = str(pd.Period(curr_month, freq="M") - 1) if curr_month else None
+    prev_quarter_month = (
+        _prev_quarter_month(curr_month) if curr_month is not None else None
+    )
+    prev_month = curr_month - 1 if curr_month is not None else None
 
     # Revenue snapshots (latest month)
-    curr_rev = mrr[mrr["month"] == curr_month]["mrr"].sum() if curr_month else 0.0
+    curr_rev = (
+        int(mrr[mrr["month"] == curr_month]["mrr"].sum())
+        if curr_month is not None
+        else 0
+    )
     prev_q_rev = (
-        mrr[mrr["month"] == prev_quarter_month]["mrr"].sum()
-        if prev_quarter_month
-        else 0.0
+        int(mrr[mrr["month"] == prev_quarter_month]["mrr"].sum())
+        if prev_quarter_month is not None
+        else 0
     )
 
     # ARR + growth vs last quarter
@@ -143,15 +242,16 @@ def exec_overview_kpis(
     arr_growth = ((curr_rev - prev_q_rev) / prev_q_rev) if prev_q_rev > 0 else 0.0
 
     # NRR/GRR from latest month flows
-    prev = mrr[mrr["month"] == prev_month][["customer_id", "mrr"]].rename(
+    prev = mrr[mrr["month"] == prev_month][["customer_key", "mrr"]].rename(
         columns={"mrr": "prev_mrr"}
     )
-    curr = mrr[mrr["month"] == curr_month][["customer_id", "mrr"]].rename(
+    curr = mrr[mrr["month"] == curr_month][["customer_key", "mrr"]].rename(
         columns={"mrr": "curr_mrr"}
     )
-    flows = curr.merge(prev, on="customer_id", how="outer").fillna(0.0)
+    flows = curr.merge(prev, on="customer_key", how="outer").fillna(0)
+    flows[["curr_mrr", "prev_mrr"]] = flows[["curr_mrr", "prev_mrr"]].astype(MONEY)
 
-    starting_mrr = flows["prev_mrr"].sum()
+    starting_mrr = int(flows["prev_mrr"].sum())
     churn = ((flows["prev_mrr"] > 0) & (flows["curr_mrr"] == 0)) * flows["prev_mrr"]
     contraction = (
         (flows["curr_mrr"] < flows["prev_mrr"]) & (flows["curr_mrr"] > 0)
@@ -172,34 +272,23 @@ def exec_overview_kpis(
         else 0.0
     )
 
-    # Costs (COGS + OpEx) for latest month
-    costs = _costs_spine(conn, start_month, end_month)
-    current_month_costs = costs[costs["month"] == curr_month]
-    cogs = current_month_costs["cogs"].sum() if not current_month_costs.empty else 0.0
-    opex = current_month_costs["opex"].sum() if not current_month_costs.empty else 0.0
+    # Costs (COGS + OpEx), burn and cash for latest month
+    cogs, opex, net_monthly_burn, ending_cash_balance = company_costs_and_cash(
+        conn, curr_month, start_month, end_month
+    )
+
+    # A product slice carries the costs allocated to the product at load time
+    if product_id not in (None, ALL) and country in (None, ALL):
+        product_costs = _product_costs_spine(conn, curr_month)
+        cogs = int(product_costs["cogs"].get(product_id, 0))
+        opex = int(product_costs["opex"].get(product_id, 0))
 
     # Margins
     gross_margin = safe_margin(curr_rev - cogs, curr_rev)
     op_margin = safe_margin(curr_rev - cogs - opex, curr_rev)
 
     # Burn and Burn Multiple
-    net_new_arr = max((flows["curr_mrr"].sum() - starting_mrr) * 12.0, 0.0)
-
-    if curr_month:
-        cash_and_burn = _burn_and_cash_spine(conn, curr_month)
-    else:
-        cash_and_burn = None
-
-    net_monthly_burn = (
-        cash_and_burn["net_monthly_burn"].iloc[0]
-        if cash_and_burn is not None and not cash_and_burn.empty
-        else 0.0
-    )
-    ending_cash_balance = (
-        cash_and_burn["ending_cash_balance"].iloc[0]
-        if cash_and_burn is not None and not cash_and_burn.empty
-        else 0.0
-    )
+    net_new_arr = max((int(flows["curr_mrr"].sum()) - starting_mrr) * 12, 0)
 
     if net_monthly_burn <= 0:
         burn_multiple = 0.0
@@ -213,7 +302,7 @@ def exec_overview_kpis(
     runway_months = 9999.0 if not np.isfinite(runway_months) else float(runway_months)
 
     return dict(
-        arr=float(arr),
+        arr=int(arr),
         arr_growth=float(arr_growth),
         nrr=float(nrr),
         grr=float(grr),
@@ -221,8 +310,8 @@ def exec_overview_kpis(
         op_margin=float(op_margin),
         burn_multiple=float(burn_multiple),
         runway_months=float(runway_months),
-        net_monthly_burn=float(net_monthly_burn),
-        ending_cash_balance=float(ending_cash_balance),
+        net_monthly_burn=int(net_monthly_burn),
+        ending_cash_balance=int(ending_cash_balance),
     )
 
 
@@ -230,29 +319,30 @@ def exec_overview_kpis(
 def arr_bridge(
     conn, product_id=None, country=None, time_range="Last 12M", end_month=None
 ) -> pd.DataFrame:
-    """Calculate the ARR bridge components on a monthly basis."""
+    """Calculate the ARR bridge components (integer cents) on a monthly basis."""
 
     # If end_month is not provided, use the latest month from the data
     if end_month is None:
-        end_month = _latest_month(
-            _mrr_spine(conn, product_id, country, None, None)["month"]
-        )
+        end_month = latest_month(conn)
     # Get start and end months based on time_range
-    start_month, end_month = _window_bounds(conn, end_month, time_range)
+    start_month, end_month = window_bounds(conn, end_month, time_range)
 
-    prev_month = str(pd.Period(end_month, freq="M") - 1) if end_month else None
+    prev_month = end_month - 1 if end_month is not None else None
 
-    # Get MRR spine
-    mrr = _mrr_spine(conn, product_id, country, start_month, end_month)
+    # Get MRR at the current and previous month only
+    anchors = month_anchors(start_month, end_month)
+    months = [anchors[k] for k in ("curr", "prev") if k in anchors]
+    mrr = _mrr_spine(conn, product_id, country, months=months)
     if mrr.empty:
         return pd.DataFrame()
 
     # Get per customer deltas
     curr = mrr[mrr["month"] == end_month].copy()
-    prev = mrr[mrr["month"] == prev_month][["customer_id", "mrr"]].rename(
+    prev = mrr[mrr["month"] == prev_month][["customer_key", "mrr"]].rename(
         columns={"mrr": "prev_mrr"}
     )
-    flows = curr.merge(prev, on="customer_id", how="outer").fillna(0.0)
+    flows = curr.merge(prev, on="customer_key", how="outer").fillna(0)
+    flows[["mrr", "prev_mrr"]] = flows[["mrr", "prev_mrr"]].astype(MONEY)
 
     starting_mrr = flows["prev_mrr"].sum()
     ending_mrr = flows["mrr"].sum()
@@ -294,3 +384,266 @@ def arr_bridge(
         }
     )
     return bridge
+
+
+# -------------- Multi-slice KPIs --------------#
+KPI_COLUMNS = [
+    "arr",
+    "arr_growth",
+    "nrr",
+    "grr",
+    "gross_margin",
+    "op_margin",
+    "burn_multiple",
+    "runway_months",
+    "net_monthly_burn",
+    "ending_cash_balance",
+]
+
+# ARR bridge steps in display order, with their column and waterfall measure
+BRIDGE_STEPS = [
+    ("Starting ARR", "bridge_starting", "absolute"),
+    ("New", "bridge_new", "relative"),
+    ("Expansion", "bridge_expansion", "relative"),
+    ("Contraction", "bridge_contraction", "relative"),
+    ("Churn", "bridge_churn", "relative"),
+    ("Ending ARR", "bridge_ending", "total"),
+]
+
+# KPIs in integer cents; the rest are ratios or month counts
+MONEY_KPIS = ["arr", "net_monthly_burn", "ending_cash_balance"]
+
+ALL = "All"
+SLICE_COLUMNS = ["product_id", "country"]
+
+
+def _slice_spine(conn, months) -> pd.DataFrame:
+    """Get the unfiltered MRR spine at the given months, annotated with product and country."""
+
+    months = [int(m) for m in months]
+    if not months:
+        return pd.DataFrame(
+            {
+                "customer_key": pd.Series(dtype="int32"),
+                "product_id": pd.Series(dtype=str),
+                "country": pd.Series(dtype=str),
+                "month": pd.Series(dtype="int32"),
+                "mrr": pd.Series(dtype=MONEY),
+            }
+        )
+    if MRR_SOURCE == "events":
+        return mrr_engine.slice_mrr(conn, months)
+    df = _read(conn, q.monthly_slice_mrr_sql(months=months))
+    df["customer_key"] = df["customer_key"].astype("int32")
+    df["month"] = df["month"].astype("int32")
+    df["mrr"] = df["mrr"].fillna(0).astype(MONEY)
+    for col in SLICE_COLUMNS:
+        df[col] = df[col].astype(str)
+    return df
+
+
+def flow_columns(
+    curr: pd.Series, prev: pd.Series, prev_q: pd.Series
+) -> pd.DataFrame:
+    """Classify customer-level MRR into new/expansion/contraction/churn flows."""
+    return pd.DataFrame(
+        {
+            "curr_mrr": curr,
+            "prev_mrr": prev,
+            "prev_q_mrr": prev_q,
+            "new": curr.where((prev == 0) & (curr > 0), 0),
+            "expansion": (curr - prev).where((curr > prev) & (prev > 0), 0),
+            "contraction": (prev - curr).where((curr < prev) & (curr > 0), 0),
+            "churn": prev.where((prev > 0) & (curr == 0), 0),
+        }
+    )
+
+
+def slice_flows(mrr: pd.DataFrame, by: list, months: Dict[str, int]) -> pd.DataFrame:
+    """Sum customer-level MRR flows per slice for one grouping of the slice columns.
+
+    ``months`` maps curr/prev/prev_q to the month keys to read (absent ones count as 0).
+    """
+
+    cols = by + ["customer_key"]
+    per_customer = (
+        mrr[mrr["month"].isin(list(months.values()))]
+        .groupby(cols + ["month"], observed=True)["mrr"]
+        .sum()
+        .unstack("month", fill_value=0)
+    )
+    col = lambda name: (
+        per_customer[months[name]]
+        if name in months and months[name] in per_customer.columns
+        else pd.Series(0, index=per_customer.index, dtype=MONEY)
+    )
+    flows = flow_columns(col("curr"), col("prev"), col("prev_q"))
+
+    # Rows in the current/previous month decide whether a slice has an ARR bridge
+    bridge_months = [months[k] for k in ("curr", "prev") if k in months]
+    bridge_rows = mrr[mrr["month"].isin(bridge_months)]
+
+    if by:
+        sums = flows.groupby(level=by, observed=True).sum()
+        active = bridge_rows.groupby(by, observed=True).size().rename("rows")
+        sums = sums.join(active, how="outer").fillna(0).reset_index()
+    else:
+        sums = flows.sum().to_frame().T
+        sums["rows"] = len(bridge_rows)
+    for c in SLICE_COLUMNS:
+        if c not in by:
+            sums[c] = ALL
+    flow_cols = [c for c in sums.columns if c not in SLICE_COLUMNS]
+    sums[flow_cols] = sums[flow_cols].astype(MONEY)
+    return sums
+
+
+def exec_overview_kpis_by_slice(
+    conn,
+    time_range: str = "Last 12M",
+    end_month: Optional[int] = None,
+    products: Optional[list] = None,
+    countries: Optional[list] = None,
+) -> pd.DataFrame:
+    """Calculate executive overview KPIs and ARR bridge for every product x country slice.
+
+    One unfiltered spine is fetched and grouped by (product, country), product,
+    country and overall, so every slice including the "All" rollups costs one
+    pass. Pass ``products``/``countries`` to also emit empty slices.
+    """
+
+    if end_month is None:
+        end_month = latest_month(conn)
+    start_month, end_month = window_bounds(conn, end_month, time_range)
+
+    # Only the anchor months are fetched
+    anchors = month_anchors(start_month, end_month)
+    mrr = _slice_spine(conn, anchors.values())
+    for col in SLICE_COLUMNS:
+        mrr[col] = mrr[col].astype("category")
+
+    groupings = [SLICE_COLUMNS, ["product_id"], ["country"], []]
+    flows = pd.concat([slice_flows(mrr, by, anchors) for by in groupings])
+    flows = flows.set_index(SLICE_COLUMNS)
+
+    if products is not None and countries is not None:
+        grid = pd.MultiIndex.from_product(
+            [[ALL] + list(products), [ALL] + list(countries)], names=SLICE_COLUMNS
+        )
+        flows = flows.reindex(grid, fill_value=0)
+
+    cogs, opex, net_monthly_burn, ending_cash_balance = company_costs_and_cash(
+        conn, end_month, start_month, end_month
+    )
+    cogs, opex = _slice_costs(conn, flows.index, end_month, cogs, opex)
+    out = kpis_from_flows(flows, cogs, opex, net_monthly_burn, ending_cash_balance)
+    return out.reset_index()
+
+
+def _slice_costs(conn, index: pd.MultiIndex, month, cogs: int, opex: int):
+    """Get COGS and OpEx per slice row.
+
+    Product rows (country "All") carry the product's allocated costs, like
+    exec_overview_kpis; every other row keeps the company's costs.
+    """
+
+    product_costs = _product_costs_spine(conn, month)
+    products = index.get_level_values("product_id").astype(str)
+    countries = index.get_level_values("country").astype(str)
+    is_product = (products != ALL) & (countries == ALL)
+    allocated = product_costs.reindex(products, fill_value=0)
+    per_row = lambda col, company: pd.Series(
+        np.where(is_product, allocated[col], company), index=index
+    ).astype(MONEY)
+    return per_row("cogs", cogs), per_row("opex", opex)
+
+
+def kpis_from_flows(
+    flows: pd.DataFrame, cogs, opex, net_monthly_burn, ending_cash_balance
+) -> pd.DataFrame:
+    """Derive the KPI and bridge columns from summed MRR flows, one row per flow row.
+
+    ``cogs`` and ``opex`` are company totals or per-row Series aligned to ``flows``.
+    """
+
+    curr_rev = flows["curr_mrr"]
+    prev_q_rev = flows["prev_q_mrr"]
+    starting_mrr = flows["prev_mrr"]
+    has_start = starting_mrr > 0
+
+    out = pd.DataFrame(index=flows.index)
+    out["arr"] = curr_rev * 12
+    out["arr_growth"] = ((curr_rev - prev_q_rev) / prev_q_rev).where(
+        prev_q_rev > 0, 0.0
+    )
+    retained = starting_mrr - flows["churn"] - flows["contraction"]
+    out["nrr"] = ((retained + flows["expansion"]) / starting_mrr).where(has_start, 0.0)
+    out["grr"] = (retained / starting_mrr).where(has_start, 0.0)
+    out["gross_margin"] = ((curr_rev - cogs) / curr_rev).where(curr_rev != 0, np.nan)
+    out["op_margin"] = ((curr_rev - cogs - opex) / curr_rev).where(
+        curr_rev != 0, np.nan
+    )
+
+    net_new_arr = ((curr_rev - starting_mrr) * 12).clip(lower=0)
+    if net_monthly_burn <= 0:
+        out["burn_multiple"] = 0.0
+        runway_months = np.inf
+    else:
+        out["burn_multiple"] = (net_monthly_burn / net_new_arr).where(
+            net_new_arr > 0, np.inf
+        )
+        runway_months = (
+            ending_cash_balance / net_monthly_burn if ending_cash_balance > 0 else 0.0
+        )
+    out["runway_months"] = 9999.0 if not np.isfinite(runway_months) else runway_months
+    out["net_monthly_burn"] = net_monthly_burn
+    out["ending_cash_balance"] = ending_cash_balance
+
+    # ARR bridge (missing where the slice has no current/previous MRR, like arr_bridge)
+    bridge = pd.DataFrame(
+        {
+            "bridge_starting": starting_mrr * 12,
+            "bridge_new": flows["new"] * 12,
+            "bridge_expansion": flows["expansion"] * 12,
+            "bridge_contraction": -flows["contraction"] * 12,
+            "bridge_churn": -flows["churn"] * 12,
+            "bridge_ending": curr_rev * 12,
+        }
+    )
+    out = out.join(bridge.where(flows["rows"] > 0).astype("Int64"))
+    ratios = [c for c in KPI_COLUMNS if c not in MONEY_KPIS]
+    out[ratios] = out[ratios].astype(float)
+    out[MONEY_KPIS] = out[MONEY_KPIS].astype(MONEY)
+    return out
+
+
+def row_results(row: pd.Series) -> Tuple[Dict[str, float], pd.DataFrame]:
+    """Split one KPI row into the KPI dict and the ARR bridge (empty if missing)."""
+    kpis = {
+        col: int(row[col]) if col in MONEY_KPIS else float(row[col])
+        for col in KPI_COLUMNS
+    }
+    if pd.isna(row["bridge_starting"]):
+        bridge = pd.DataFrame()
+    else:
+        bridge = pd.DataFrame(
+            {
+                "step": [step for step, _, _ in BRIDGE_STEPS],
+                "value": [int(row[col]) for _, col, _ in BRIDGE_STEPS],
+                "type": [measure for _, _, measure in BRIDGE_STEPS],
+            }
+        )
+    return kpis, bridge
+
+
+# -------------- Cost Breakdown (monthly) --------------#
+def cost_breakdown(
+    conn, time_range="Last 12M", end_month=None, cost_group=None
+) -> pd.DataFrame:
+    """Get COGS/OpEx by category and subcategory for each month in the window."""
+
+    if end_month is None:
+        end_month = latest_month(conn)
+    start_month, end_month = window_bounds(conn, end_month, time_range)
+
+    return _cost_breakdown_spine(conn, start_month, end_month, cost_group)
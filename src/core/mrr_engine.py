@@ -0,0 +1,210 @@
+"""Event-delta MRR engine.
+
+Computes MRR series straight from core.fact_subscription: every subscription
+adds +MRR in its start month and -MRR in the month after it ends, and the
+series is the per-key cumulative sum of those deltas. Work scales with the
+number of subscription changes instead of subscriptions x active months, and
+the result matches core.fact_subscription_snapshot_monthly row for row:
+
+    PYTHONPATH=src python3 -m core.mrr_engine --check
+"""
+
+from __future__ import annotations
+import argparse
+import sys
+from typing import Iterable, List, Optional
+import numpy as np
+import pandas as pd
+from . import metrics
+from . import queries as q
+from core.cache import cached_read
+from core.db import DEFAULT_TENANT, tenant_session
+
+CUSTOMER_KEYS = ["customer_key"]
+SLICE_KEYS = ["customer_key", "product_id", "country"]
+
+
+# -------------- Events --------------#
+def _month_bounds(conn):
+    """Get the min and max month key of core.dim_month (the snapshot's months)."""
+    df = cached_read(conn, q.data_bounds_sql())
+    lo, hi = df["min_month"].iloc[0], df["max_month"].iloc[0]
+    return (None, None) if pd.isna(lo) or pd.isna(hi) else (int(lo), int(hi))
+
+
+def _subscriptions(conn, product_id=None, country=None) -> pd.DataFrame:
+    df = cached_read(conn, q.subscription_events_sql(product_id, country))
+    df["customer_key"] = df["customer_key"].astype("int32")
+    df["mrr"] = df["mrr"].astype(metrics.MONEY)
+    return df
+
+
+def _events(subs: pd.DataFrame, by: List[str], min_month: int, max_month: int):
+    """Turn subscriptions into +/- deltas at the first and one-past-last active month.
+
+    ``n`` counts active subscriptions, so keys whose subscriptions carry 0 MRR
+    still produce rows, like the snapshot.
+    """
+    start = subs["start_month"].astype("int64").clip(lower=min_month)
+    stop = subs["end_month"].fillna(max_month).astype("int64")
+    stop = stop.clip(upper=max_month) + 1
+    live = start < stop
+
+    on = subs.loc[live, by].assign(month=start[live], mrr=subs["mrr"][live], n=1)
+    off = subs.loc[live, by].assign(month=stop[live], mrr=-subs["mrr"][live], n=-1)
+    return pd.concat([on, off], ignore_index=True)
+
+
+def _intervals(events: pd.DataFrame, by: List[str], max_month: int) -> pd.DataFrame:
+    """Cumulate deltas per key into constant-MRR intervals [month, until)."""
+    ev = (
+        events.groupby(by + ["month"], observed=True, sort=True)[["mrr", "n"]]
+        .sum()
+        .reset_index()
+    )
+    ev[["mrr", "n"]] = ev.groupby(by, observed=True, sort=False)[["mrr", "n"]].cumsum()
+    ev["until"] = (
+        ev.groupby(by, observed=True, sort=False)["month"]
+        .shift(-1)
+        .fillna(max_month + 1)
+        .astype("int64")
+    )
+    return ev[ev["n"] > 0]
+
+
+def _expand(intervals: pd.DataFrame, by: List[str], months: np.ndarray) -> pd.DataFrame:
+    """Emit one row per key and requested month covered by its intervals."""
+    lo = np.searchsorted(months, intervals["month"].to_numpy(), side="left")
+    hi = np.searchsorted(months, intervals["until"].to_numpy(), side="left")
+    counts = hi - lo
+    rows = np.repeat(np.arange(len(intervals)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    out = intervals.iloc[rows][by].reset_index(drop=True)
+    out["month"] = months[np.repeat(lo, counts) + offsets].astype("int32")
+    out["mrr"] = intervals["mrr"].to_numpy()[rows].astype(metrics.MONEY)
+    return out
+
+
+def _series(
+    conn,
+    by: List[str],
+    product_id=None,
+    country=None,
+    start_month=None,
+    end_month=None,
+    months: Optional[Iterable[int]] = None,
+) -> pd.DataFrame:
+    empty = pd.DataFrame(
+        {k: pd.Series(dtype="int32" if k == "customer_key" else str) for k in by}
+    )
+    empty["month"] = pd.Series(dtype="int32")
+    empty["mrr"] = pd.Series(dtype=metrics.MONEY)
+
+    min_month, max_month = _month_bounds(conn)
+    if min_month is None:
+        return empty
+    if months is None:
+        lo = max(min_month, start_month or min_month)
+        hi = min(max_month, end_month or max_month)
+        wanted = np.arange(lo, hi + 1, dtype="int64")
+    else:
+        wanted = np.unique(np.asarray([int(m) for m in months], dtype="int64"))
+        wanted = wanted[(wanted >= min_month) & (wanted <= max_month)]
+    if wanted.size == 0:
+        return empty
+
+    subs = _subscriptions(conn, product_id, country)
+    events = _events(subs, by, min_month, max_month)
+    if events.empty:
+        return empty
+    return _expand(_intervals(events, by, max_month), by, wanted)
+
+
+# -------------- Public API --------------#
+def customer_mrr(
+    conn, product_id=None, country=None, start_month=None, end_month=None, months=None
+) -> pd.DataFrame:
+    """Get per-customer MRR (cents) for a month range or an explicit month set."""
+    return _series(
+        conn, CUSTOMER_KEYS, product_id, country, start_month, end_month, months
+    )
+
+
+def slice_mrr(conn, months) -> pd.DataFrame:
+    """Get per-customer MRR at the given months, annotated with product and country."""
+    return _series(conn, SLICE_KEYS, months=months)
+
+
+def total_mrr(
+    conn, product_id=None, country=None, start_month=None, end_month=None
+) -> pd.DataFrame:
+    """Get total MRR per month from one cumulative sum over the monthly deltas."""
+    min_month, max_month = _month_bounds(conn)
+    if min_month is None:
+        return pd.DataFrame(
+            {"month": pd.Series(dtype="int32"), "mrr": pd.Series(dtype=metrics.MONEY)}
+        )
+
+    subs = _subscriptions(conn, product_id, country)
+    events = _events(subs, [], min_month, max_month)
+    deltas = events.groupby("month")["mrr"].sum()
+    all_months = pd.RangeIndex(min_month, max_month + 2)
+    series = deltas.reindex(all_months, fill_value=0).cumsum().iloc[:-1]
+
+    lo = max(min_month, start_month or min_month)
+    hi = min(max_month, end_month or max_month)
+    series = series.loc[lo:hi]
+    return pd.DataFrame(
+        {
+            "month": series.index.astype("int32"),
+            "mrr": series.to_numpy(dtype=metrics.MONEY),
+        }
+    )
+
+
+# -------------- Parity --------------#
+def parity_check(conn, product_id=None, country=None) -> pd.DataFrame:
+    """Compare the engine with the snapshot table; return the mismatching rows."""
+    snapshot = cached_read(conn, q.monthly_customer_mrr_sql(product_id, country))
+    snapshot = snapshot[["customer_key", "month", "mrr"]].astype(
+        {"customer_key": "int32", "month": "int32", "mrr": metrics.MONEY}
+    )
+    engine = customer_mrr(conn, product_id, country)
+
+    merged = snapshot.merge(
+        engine,
+        on=["customer_key", "month"],
+        how="outer",
+        suffixes=("_snapshot", "_events"),
+        indicator=True,
+    )
+    return merged[
+        (merged["_merge"] != "both") | (merged["mrr_snapshot"] != merged["mrr_events"])
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Event-delta MRR engine.")
+    parser.add_argument(
+        "--check", action="store_true", help="Compare against the snapshot table."
+    )
+    parser.add_argument("--product-id", default=None)
+    parser.add_argument("--country", default=None)
+    parser.add_argument("--tenant", default=DEFAULT_TENANT)
+    args = parser.parse_args()
+
+    with tenant_session(args.tenant) as conn:
+        if args.check:
+            mismatches = parity_check(conn, args.product_id, args.country)
+            print(f"{len(mismatches)} customer-month(s) differ from the snapshot.")
+            if not mismatches.empty:
+                print(mismatches.head(20).to_string(index=False))
+                sys.exit(1)
+        else:
+            totals = total_mrr(conn, args.product_id, args.country)
+            print(totals.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,146 +1,357 @@
-from typing import Optional, Dict, Tuple
+from typing import Optional, Dict, List, Tuple
+
+
+def _cents(expr: str) -> str:
+    """Wrap a NUMERIC(18,2) money expression so it is returned as integer cents."""
+    return f"ROUND(({expr}) * 100)::BIGINT"
+
+
+def _tenant(alias: Optional[str] = None) -> str:
+    """Generate the predicate scoping a table to the session's tenant.
+
+    core.current_tenant() reads app.tenant_id (set by core.db.tenant_session), so
+    the SQL text is the same for every tenant and leads each tenant_id index.
+    """
+    column = f"{alias}.tenant_id" if alias else "tenant_id"
+    return f"{column} = core.current_tenant()"
 
 
 def _filters(
     product_id: Optional[str],
     country: Optional[str],
-    start_month: Optional[str],
-    end_month: Optional[str],
-) -> Tuple[str, Dict[str, str]]:
-    """Generate SQL WHERE clause and params based on optional filters."""
-    parts, params = [], {}
+    start_month: Optional[int],
+    end_month: Optional[int],
+) -> Tuple[str, Dict]:
+    """Generate SQL WHERE clause and params for the tenant and optional filters."""
+    parts, params = [_tenant("fr")], {}
     if product_id:
         parts.append("dp.product_id = %(product_id)s")
         params["product_id"] = product_id
     if country:
         parts.append("dc.country = %(country)s")
         params["country"] = country
-    if start_month:
-        parts.append("to_char(date_trunc('month', dd.date), 'YYYY-MM') >= %(start_m)s")
+    if start_month is not None:
+        parts.append("fr.month_key >= %(start_m)s")
         params["start_m"] = start_month
-    if end_month:
-        parts.append("to_char(date_trunc('month', dd.date), 'YYYY-MM') <= %(end_m)s")
+    if end_month is not None:
+        parts.append("fr.month_key <= %(end_m)s")
         params["end_m"] = end_month
     where = (" WHERE " + " AND ".join(parts)) if parts else ""
     return where, params
 
 
+def _dim_joins(product_id: Optional[str], country: Optional[str]) -> str:
+    """Join the text-keyed dimensions only when a filter needs them."""
+    joins = []
+    if country:
+        joins.append("JOIN core.dim_customer dc ON dc.customer_key = fr.customer_key")
+    if product_id:
+        joins.append("JOIN core.dim_product dp ON dp.product_key = fr.product_key")
+    return "\n        ".join(joins)
+
+
 def monthly_customer_mrr_sql(
     product_id: Optional[str] = None,
     country: Optional[str] = None,
-    start_month: Optional[str] = None,
-    end_month: Optional[str] = None,
+    start_month: Optional[int] = None,
+    end_month: Optional[int] = None,
 ) -> Tuple[str, Dict]:
     where, params = _filters(product_id, country, start_month, end_month)
+    joins = _dim_joins(product_id, country)
     sql = f"""
     WITH monthly AS (
         SELECT
-            fr.customer_id, 
-            TO_CHAR(DATE_TRUNC('month', fr.snapshot_month), 'YYYY-MM') AS month, 
+            fr.customer_key, 
+            fr.month_key AS month, 
             SUM(fr.mrr_value) AS mrr
         FROM core.fact_subscription_snapshot_monthly fr
-        JOIN core.dim_date dd ON dd.date_id = fr.snapshot_month
-        JOIN core.dim_customer dc ON dc.customer_id = fr.customer_id
-        JOIN core.dim_product dp ON dp.product_id = fr.product_id
+        {joins}
         {where}
         GROUP BY 1, 2
         ),
     anchors AS (
-        SELECT customer_id, MIN(month) AS first_paid_month
+        SELECT customer_key, MIN(month) AS first_paid_month
         FROM monthly
         WHERE mrr > 0
         GROUP BY 1
     )
-    SELECT m.customer_id, m.month, m.mrr::NUMERIC AS mrr, a.first_paid_month
+    SELECT m.customer_key, m.month, {_cents('m.mrr')} AS mrr, a.first_paid_month
         FROM monthly m
         LEFT JOIN anchors a
-        ON m.customer_id = a.customer_id;
+        ON m.customer_key = a.customer_key;
     """
     return sql, params
 
 
-def costs_by_month_sql(
-    start_month: Optional[str] = None, end_month: Optional[str] = None
+def _month_set(months: List[int]) -> Tuple[str, Dict]:
+    """Generate the explicit month-set filter for point-in-time spines."""
+    return "fr.month_key = ANY(%(months)s)", {"months": [int(m) for m in months]}
+
+
+def customer_mrr_at_months_sql(
+    months: List[int],
+    product_id: Optional[str] = None,
+    country: Optional[str] = None,
 ) -> Tuple[str, Dict]:
-    """Generate SQL to get monthly costs (COGS + OpEx) with optional date bounds."""
+    """Generate SQL for per-customer MRR at an explicit set of months (no anchors)."""
+    where, params = _filters(product_id, country, None, None)
+    month_filter, month_params = _month_set(months)
+    where = (where + " AND " if where else " WHERE ") + month_filter
+    params.update(month_params)
+    joins = _dim_joins(product_id, country)
+    sql = f"""
+    SELECT
+        fr.customer_key,
+        fr.month_key AS month,
+        {_cents('SUM(fr.mrr_value)')} AS mrr
+    FROM core.fact_subscription_snapshot_monthly fr
+    {joins}
+    {where}
+    GROUP BY 1, 2;
+    """
+    return sql, params
+
+
+def sample_mrr_at_months_sql(
+    months: List[int],
+    product_id: Optional[str] = None,
+    country: Optional[str] = None,
+) -> Tuple[str, Dict]:
+    """Generate SQL for sampled per-customer MRR and replicate group at a month set."""
+    where, params = _filters(product_id, country, None, None)
+    month_filter, month_params = _month_set(months)
+    where = (where + " AND " if where else " WHERE ") + month_filter
+    params.update(month_params)
+    joins = _dim_joins(product_id, country)
+    sql = f"""
+    SELECT
+        fr.customer_key,
+        fr.replicate,
+        fr.month_key AS month,
+        {_cents('SUM(fr.mrr_value)')} AS mrr
+    FROM core.fact_subscription_snapshot_sample fr
+    {joins}
+    {where}
+    GROUP BY 1, 2, 3;
+    """
+    return sql, params
+
+
+def sample_share_sql(
+    sample_buckets: int,
+    replicates: int,
+    product_id: Optional[str] = None,
+    country: Optional[str] = None,
+) -> Tuple[str, Dict]:
+    """Generate SQL for a slice's customers and sampled customers per replicate group.
+
+    The slice is every customer with a subscription matching the filters; a
+    customer is sampled when its hash bucket is below ``sample_buckets``.
+    """
+    where, params = _filters(product_id, country, None, None)
+    params.update(sample_buckets=sample_buckets, replicates=replicates)
+    joins = _dim_joins(product_id, country)
+    sql = f"""
+    WITH slice AS (
+        SELECT DISTINCT fr.customer_key
+        FROM core.fact_subscription fr
+        {joins}
+        {where}
+    ),
+    buckets AS (
+        SELECT core.customer_sample_bucket(c.customer_id) AS bucket
+        FROM slice s
+        JOIN core.dim_customer c ON c.customer_key = s.customer_key
+    )
+    SELECT
+        MOD(bucket, %(replicates)s) AS replicate,
+        COUNT(*) AS customers,
+        COUNT(*) FILTER (WHERE bucket < %(sample_buckets)s) AS sampled
+    FROM buckets
+    GROUP BY 1;
+    """
+    return sql, params
+
+
+def monthly_slice_mrr_sql(
+    start_month: Optional[int] = None,
+    end_month: Optional[int] = None,
+    months: Optional[List[int]] = None,
+) -> Tuple[str, Dict]:
+    """Generate SQL for the unfiltered MRR spine annotated with product and country.
+
+    Pass ``months`` to fetch only an explicit set of months instead of a range.
+    """
+    if months is not None:
+        month_filter, params = _month_set(months)
+        where = f" WHERE {_tenant('fr')} AND " + month_filter
+    else:
+        where, params = _filters(None, None, start_month, end_month)
+    sql = f"""
+    SELECT
+        fr.customer_key,
+        dp.product_id,
+        dc.country,
+        fr.month_key AS month,
+        {_cents('SUM(fr.mrr_value)')} AS mrr
+    FROM core.fact_subscription_snapshot_monthly fr
+    JOIN core.dim_customer dc ON dc.customer_key = fr.customer_key
+    JOIN core.dim_product dp ON dp.product_key = fr.product_key
+    {where}
+    GROUP BY 1, 2, 3, 4;
+    """
+    return sql, params
+
+
+def billing_mix_mrr_sql(months: List[int]) -> Tuple[str, Dict]:
+    """Generate SQL for customer MRR by product and billing cycle at given months."""
+    where, params = _month_set(months)
+    sql = f"""
+    SELECT
+        fr.customer_key,
+        dp.product_id,
+        fs.billing_cycle,
+        fr.month_key AS month,
+        {_cents('SUM(fr.mrr_value)')} AS mrr,
+        COUNT(*) AS subscriptions
+    FROM core.fact_subscription_snapshot_monthly fr
+    JOIN core.fact_subscription fs ON fs.subscription_id = fr.subscription_id
+    JOIN core.dim_product dp ON dp.product_key = fr.product_key
+    WHERE {_tenant('fr')} AND {_tenant('fs')} AND {where}
+    GROUP BY 1, 2, 3, 4;
+    """
+    return sql, params
+
+
+def product_prices_sql() -> Tuple[str, Dict]:
+    """SQL to get the list price (cents) of every product per billing cycle."""
+    sql = f"""
+    SELECT
+        product_id,
+        {_cents('price_monthly')} AS price_monthly,
+        {_cents('price_annual')} AS price_annual
+    FROM core.dim_product
+    WHERE {_tenant()};
+    """
+    return sql, {}
+
+
+def subscription_events_sql(
+    product_id: Optional[str] = None,
+    country: Optional[str] = None,
+) -> Tuple[str, Dict]:
+    """Generate SQL for the start/end month and MRR of every subscription."""
+    where, params = _filters(product_id, country, None, None)
+    where = (where + " AND " if where else " WHERE ") + (
+        "fr.customer_key IS NOT NULL AND fr.product_key IS NOT NULL"
+    )
+    sql = f"""
+    SELECT
+        fr.customer_key,
+        dp.product_id,
+        dc.country,
+        core.month_key(fr.start_date::DATE) AS start_month,
+        core.month_key(fr.end_date::DATE) AS end_month,
+        {_cents('fr.mrr_value')} AS mrr
+    FROM core.fact_subscription fr
+    JOIN core.dim_customer dc ON dc.customer_key = fr.customer_key
+    JOIN core.dim_product dp ON dp.product_key = fr.product_key
+    {where};
+    """
+    return sql, params
 
-    params: Dict = {}
-    bounds = []
 
-    if start_month:
-        bounds.append("TO_CHAR(DATE_TRUNC('month', date_id), 'YYYY-MM') >= %(start_m)s")
+def _cost_bounds(
+    start_month: Optional[int], end_month: Optional[int]
+) -> Tuple[List[str], Dict]:
+    """Generate the tenant and month bounds on core.agg_cost_month."""
+    parts, params = [_tenant()], {}
+    if start_month is not None:
+        parts.append("month_key >= %(start_m)s")
         params["start_m"] = start_month
-    if end_month:
-        bounds.append("TO_CHAR(DATE_TRUNC('month', date_id), 'YYYY-MM') <= %(end_m)s")
+    if end_month is not None:
+        parts.append("month_key <= %(end_m)s")
         params["end_m"] = end_month
+    return parts, params
+
+
+def costs_by_month_sql(
+    start_month: Optional[int] = None, end_month: Optional[int] = None
+) -> Tuple[str, Dict]:
+    """Generate SQL to get monthly costs (COGS + OpEx) with optional date bounds."""
+
+    bounds, params = _cost_bounds(start_month, end_month)
     bound = "WHERE " + " AND ".join(bounds) if bounds else ""
 
     sql = f"""
-    WITH cogs_cloud AS (
-        SELECT TO_CHAR(DATE_TRUNC('month', date_id), 'YYYY-MM') AS month,
-            SUM(amount_lcy) AS amount
-        FROM core.fact_cloud_cost
-        {bound}
-        GROUP BY 1
-    ),
-        cogs_payment AS (
-            SELECT TO_CHAR(DATE_TRUNC('month', date_id), 'YYYY-MM') AS month,
-                SUM(amount_lcy) AS amount
-            FROM core.fact_payment_processing_cost
-            {bound}
-            GROUP BY 1
-    ), 
-        opex_others AS (
-            SELECT TO_CHAR(DATE_TRUNC('month', date_id), 'YYYY-MM') AS month,
-                SUM(amount_lcy) AS amount
-            FROM core.fact_other_expenses
-            {bound}
-            GROUP BY 1
-    ),
-        opex_marketing AS (
-            SELECT TO_CHAR(DATE_TRUNC('month', date_id), 'YYYY-MM') AS month,
-                SUM(amount_lcy) AS amount
-            FROM core.fact_marketing_spend
-            {bound}
-            GROUP BY 1
-    )
-    SELECT m.month,
-        COALESCE(cc.amount, 0) + COALESCE(pp.amount, 0) AS cogs,
-        COALESCE(ox.amount, 0) + COALESCE(mkt.amount, 0) AS opex
-    FROM (
-        SELECT DISTINCT month FROM (
-            SELECT month FROM cogs_cloud
-            UNION
-            SELECT month FROM cogs_payment
-            UNION
-            SELECT month FROM opex_others
-            UNION
-            SELECT month FROM opex_marketing
-        ) u
-    ) m
-    LEFT JOIN cogs_cloud cc ON cc.month = m.month
-    LEFT JOIN cogs_payment pp ON pp.month = m.month
-    LEFT JOIN opex_others ox ON ox.month = m.month
-    LEFT JOIN opex_marketing mkt ON mkt.month = m.month
-    ORDER BY m.month;
+    SELECT month_key AS month,
+        {_cents("COALESCE(SUM(amount_lcy) FILTER (WHERE cost_group = 'cogs'), 0)")} AS cogs,
+        {_cents("COALESCE(SUM(amount_lcy) FILTER (WHERE cost_group = 'opex'), 0)")} AS opex
+    FROM core.agg_cost_month
+    {bound}
+    GROUP BY month_key
+    ORDER BY month_key;
+    """
+
+    return sql, params
+
+
+def cost_breakdown_by_month_sql(
+    start_month: Optional[int] = None,
+    end_month: Optional[int] = None,
+    cost_group: Optional[str] = None,
+) -> Tuple[str, Dict]:
+    """Generate SQL to get monthly costs by category and subcategory."""
+
+    bounds, params = _cost_bounds(start_month, end_month)
+    if cost_group:
+        bounds.append("cost_group = %(cost_group)s")
+        params["cost_group"] = cost_group
+    bound = "WHERE " + " AND ".join(bounds) if bounds else ""
+
+    sql = f"""
+    SELECT month_key AS month,
+        cost_group,
+        cost_category,
+        subcategory,
+        {_cents('amount_lcy')} AS amount
+    FROM core.agg_cost_month
+    {bound}
+    ORDER BY month_key, cost_group, cost_category, subcategory;
     """
 
     return sql, params
 
 
-def burn_and_cash_sql(month: Optional[str] = None) -> Tuple[str, Dict]:
+def product_costs_sql(month: int) -> Tuple[str, Dict]:
+    """Generate SQL to get the COGS and OpEx allocated to each product in a month."""
+    sql = f"""
+    SELECT dp.product_id,
+        {_cents("COALESCE(SUM(pc.amount_lcy) FILTER (WHERE pc.cost_group = 'cogs'), 0)")} AS cogs,
+        {_cents("COALESCE(SUM(pc.amount_lcy) FILTER (WHERE pc.cost_group = 'opex'), 0)")} AS opex
+    FROM core.agg_product_cost_month pc
+    JOIN core.dim_product dp ON dp.product_key = pc.product_key
+    WHERE {_tenant('pc')} AND pc.month_key = %(month)s
+    GROUP BY dp.product_id;
+    """
+    return sql, {"month": month}
+
+
+def burn_and_cash_sql(month: Optional[int] = None) -> Tuple[str, Dict]:
 
     params: Dict = {}
-    if month:
+    if month is not None:
         params["month"] = month
     else:
         raise ValueError("Month parameter is required for burn and cash SQL.")
 
-    sql = """
+    sql = f"""
     WITH bounds AS (
         SELECT
-            DATE_TRUNC('month', (%(month)s || '-01')::DATE) AS start_month,
-            (DATE_TRUNC('month', (%(month)s || '-01')::DATE) + INTERVAL '1 month - 1 day')::DATE AS end_month
+            month_start AS start_month,
+            month_end AS end_month
+        FROM core.dim_month
+        WHERE month_key = %(month)s
     ),
     flows AS (
         SELECT
@@ -148,28 +359,168 @@ def burn_and_cash_sql(month: Optional[str] = None) -> Tuple[str, Dict]:
             SUM(COALESCE(fb.cash_out, 0)) AS cash_out_m
         FROM core.fact_cash_balance fb
         JOIN bounds b ON fb.date_id BETWEEN b.start_month AND b.end_month
+        WHERE {_tenant('fb')}
     ),
     ending AS (
         SELECT
             fb.cash_balance
             FROM core.fact_cash_balance fb
             JOIN bounds b ON fb.date_id = b.end_month
+            WHERE {_tenant('fb')}
     )
     SELECT
-        GREATEST(flows.cash_out_m - flows.cash_in_m, 0) AS net_monthly_burn,
-        ending.cash_balance AS ending_cash_balance
+        {_cents('GREATEST(flows.cash_out_m - flows.cash_in_m, 0)')} AS net_monthly_burn,
+        {_cents('ending.cash_balance')} AS ending_cash_balance
     FROM flows, ending;
     """
 
     return sql, params
 
 
+def cash_history_sql(start_month: int, end_month: int) -> Tuple[str, Dict]:
+    """Generate SQL for monthly cash in/out and ending cash in a month range."""
+
+    params = {"start_m": start_month, "end_m": end_month}
+    sql = f"""
+    SELECT
+        dm.month_key AS month,
+        {_cents('COALESCE(SUM(fb.cash_in), 0)')} AS cash_in,
+        {_cents('COALESCE(SUM(fb.cash_out), 0)')} AS cash_out,
+        {_cents('MAX(fb.cash_balance) FILTER (WHERE fb.date_id = dm.month_end)')}
+            AS ending_cash_balance
+    FROM core.dim_month dm
+    JOIN core.fact_cash_balance fb
+        ON {_tenant('fb')}
+       AND fb.date_id BETWEEN dm.month_start AND dm.month_end
+    WHERE dm.month_key BETWEEN %(start_m)s AND %(end_m)s
+    GROUP BY dm.month_key
+    ORDER BY dm.month_key;
+    """
+
+    return sql, params
+
+
+def total_mrr_by_month_sql(start_month: int, end_month: int) -> Tuple[str, Dict]:
+    """Generate SQL for company-wide MRR per month in a month range."""
+
+    where, params = _filters(None, None, start_month, end_month)
+    sql = f"""
+    SELECT fr.month_key AS month, {_cents('SUM(fr.mrr_value)')} AS mrr
+    FROM core.fact_subscription_snapshot_monthly fr
+    {where}
+    GROUP BY fr.month_key
+    ORDER BY fr.month_key;
+    """
+
+    return sql, params
+
+
+def latest_month_sql() -> Tuple[str, Dict]:
+    """SQL to get the latest loaded month from load metadata."""
+    sql = f"""
+    SELECT COALESCE(
+        (SELECT latest_month_key FROM core.load_state WHERE {_tenant()}),
+        (SELECT MAX(month_key) FROM core.dim_month)
+    ) AS latest_month;
+    """
+    return sql, {}
+
+
+def sample_fraction_sql() -> Tuple[str, Dict]:
+    """SQL to get the share of customers in the approximate-mode sample."""
+    sql = f"""
+    SELECT COALESCE(
+        (SELECT sample_fraction FROM core.load_state WHERE {_tenant()}), 0
+    ) AS sample_fraction;
+    """
+    return sql, {}
+
+
 def data_bounds_sql() -> Tuple[str, Dict]:
     """SQL to get the min and max month available in the data."""
     sql = """
     SELECT
-        DATE_TRUNC('month', MIN(date_id))::DATE AS min_month,
-        DATE_TRUNC('month', MAX(date_id))::DATE AS max_month
-    FROM core.dim_date;
+        MIN(month_key) AS min_month,
+        MAX(month_key) AS max_month
+    FROM core.dim_month;
+    """
+    return sql, {}
+
+
+def kpi_cube_fingerprints_sql() -> Tuple[str, Dict]:
+    """SQL to fingerprint the cube inputs (MRR, costs, cash) of every month."""
+    sql = f"""
+    WITH mrr AS (
+        SELECT month_key, COUNT(*) AS n, SUM(mrr_value) AS total
+        FROM core.fact_subscription_snapshot_monthly
+        WHERE {_tenant()}
+        GROUP BY 1
+    ),
+    costs AS (
+        SELECT month_key, COUNT(*) AS n, SUM(amount_lcy) AS total
+        FROM core.agg_cost_month
+        WHERE {_tenant()}
+        GROUP BY 1
+    ),
+    product_costs AS (
+        SELECT month_key, COUNT(*) AS n, SUM(amount_lcy) AS total
+        FROM core.agg_product_cost_month
+        WHERE {_tenant()}
+        GROUP BY 1
+    ),
+    cash AS (
+        SELECT dm.month_key, COUNT(*) AS n,
+            SUM(COALESCE(fb.cash_in, 0) - COALESCE(fb.cash_out, 0)) AS total,
+            MAX(fb.cash_balance) FILTER (WHERE fb.date_id = dm.month_end) AS ending
+        FROM core.fact_cash_balance fb
+        JOIN core.dim_month dm
+          ON fb.date_id BETWEEN dm.month_start AND dm.month_end
+        WHERE {_tenant('fb')}
+        GROUP BY 1
+    )
+    SELECT dm.month_key AS month,
+        MD5(CONCAT_WS('|',
+            mrr.n, mrr.total, costs.n, costs.total, cash.n, cash.total, cash.ending,
+            product_costs.n, product_costs.total
+        )) AS fingerprint
+    FROM core.dim_month dm
+    LEFT JOIN mrr ON mrr.month_key = dm.month_key
+    LEFT JOIN costs ON costs.month_key = dm.month_key
+    LEFT JOIN product_costs ON product_costs.month_key = dm.month_key
+    LEFT JOIN cash ON cash.month_key = dm.month_key
+    ORDER BY dm.month_key;
     """
     return sql, {}
+
+
+def kpi_cube_state_sql() -> Tuple[str, Dict]:
+    """SQL to get the input fingerprints the cube was last built from."""
+    sql = f"""
+    SELECT month_key AS month, fingerprint
+    FROM core.kpi_cube_state
+    WHERE {_tenant()}
+    ORDER BY month_key;
+    """
+    return sql, {}
+
+
+def kpi_cube_lookup_sql(
+    month: int, time_range: str, product_id: str, country: str
+) -> Tuple[str, Dict]:
+    """SQL to get one precomputed KPI cube row by its primary key."""
+    sql = f"""
+    SELECT *
+    FROM core.kpi_cube
+    WHERE {_tenant()}
+      AND month_key = %(month)s
+      AND time_range = %(time_range)s
+      AND product_id = %(product_id)s
+      AND country = %(country)s;
+    """
+    params = {
+        "month": month,
+        "time_range": time_range,
+        "product_id": product_id,
+        "country": country,
+    }
+    return sql, params
@@ -0,0 +1,214 @@
+from __future__ import annotations
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from . import queries as q
+from core.cache import cached_read
+from core.helpers import safe_margin
+from core.metrics import (
+    BRIDGE_STEPS,
+    MONEY,
+    company_costs_and_cash,
+    flow_columns,
+    latest_month,
+    month_anchors,
+    window_bounds,
+)
+
+BILLING_CYCLES = ["monthly", "annual"]
+
+# Overrides per product_id, e.g.
+#   {"PROD-001": {"price_monthly": 549.99, "annual_share": 0.6}}
+# price_monthly / price_annual are new list prices in dollars; annual_share is
+# the target share of the product's subscriptions billed annually.
+Overrides = Dict[str, Dict[str, float]]
+
+
+class PricingScenarios:
+    """What-if pricing and billing-mix scenarios over an in-memory MRR spine.
+
+    The spine (customer x product x billing cycle at the KPI anchor months) and
+    the baseline customer flows are loaded once. A scenario rescales only the
+    rows of overridden products and reclassifies only the customers holding
+    them, then adjusts the baseline totals, so comparing scenarios never
+    touches Postgres.
+    """
+
+    def __init__(self, conn, end_month: Optional[int] = None, time_range="Last 12M"):
+        if end_month is None:
+            end_month = latest_month(conn)
+        start_month, end_month = window_bounds(conn, end_month, time_range)
+        self.end_month = end_month
+        self.anchors = month_anchors(start_month, end_month)
+
+        self.spine = self._load_spine(conn, list(self.anchors.values()))
+        self.prices = cached_read(conn, q.product_prices_sql()).set_index("product_id")
+        self.cogs, self.opex, _, _ = company_costs_and_cash(
+            conn, end_month, start_month, end_month
+        )
+
+        self._base_flows = self._customer_flows(self.spine)
+        self.baseline = self._results(self._base_flows.sum())
+
+    # -------------- Spine --------------#
+    @staticmethod
+    def _load_spine(conn, months) -> pd.DataFrame:
+        if not months:
+            return pd.DataFrame(
+                {
+                    "customer_key": pd.Series(dtype="int32"),
+                    "product_id": pd.Series(dtype=str),
+                    "billing_cycle": pd.Series(dtype=str),
+                    "month": pd.Series(dtype="int32"),
+                    "mrr": pd.Series(dtype=MONEY),
+                    "subscriptions": pd.Series(dtype="int64"),
+                }
+            )
+        df = cached_read(conn, q.billing_mix_mrr_sql(months))
+        df["customer_key"] = df["customer_key"].astype("int32")
+        df["month"] = df["month"].astype("int32")
+        df["mrr"] = df["mrr"].fillna(0).astype(MONEY)
+        df["subscriptions"] = df["subscriptions"].astype("int64")
+        return df
+
+    def _customer_flows(self, spine: pd.DataFrame) -> pd.DataFrame:
+        """Per-customer MRR flows at the anchor months."""
+        wide = (
+            spine.groupby(["customer_key", "month"])["mrr"]
+            .sum()
+            .unstack("month", fill_value=0)
+        )
+        col = lambda name: (
+            wide[self.anchors[name]]
+            if name in self.anchors and self.anchors[name] in wide.columns
+            else pd.Series(0, index=wide.index, dtype=MONEY)
+        )
+        return flow_columns(col("curr"), col("prev"), col("prev_q"))
+
+    # -------------- Overrides --------------#
+    def _factors(self, overrides: Overrides) -> pd.Series:
+        """Get the MRR scale factor per (product_id, billing_cycle, month).
+
+        The billing mix is taken at each anchor month, so prev and prev_q keep
+        their own mix. In a month with no subscriptions on one cycle, the ones
+        moved there stay on the other cycle's rows, repriced by the ratio of
+        the two cycles' monthly list prices.
+        """
+        factors = {}
+        months = sorted(set(self.anchors.values()))
+        for product_id, override in overrides.items():
+            if product_id not in self.prices.index:
+                raise ValueError(f"Unknown product_id: {product_id}")
+            counts = (
+                self.spine[self.spine["product_id"] == product_id]
+                .groupby(["month", "billing_cycle"])["subscriptions"]
+                .sum()
+            )
+
+            # Monthly-equivalent list prices (cents) before and after the override
+            old, new, price_factor = {}, {}, {}
+            for cycle in BILLING_CYCLES:
+                periods = 12 if cycle == "annual" else 1
+                old[cycle] = self.prices.loc[product_id, f"price_{cycle}"] / periods
+                new_price = override.get(f"price_{cycle}")
+                new[cycle] = old[cycle]
+                price_factor[cycle] = 1.0
+                if new_price is not None and old[cycle] > 0:
+                    new[cycle] = round(new_price * 100) / periods
+                    price_factor[cycle] = new[cycle] / old[cycle]
+
+            share = override.get("annual_share")
+            target = {"annual": share, "monthly": None if share is None else 1 - share}
+            for month in months:
+                n = {cycle: counts.get((month, cycle), 0) for cycle in BILLING_CYCLES}
+                total = sum(n.values())
+                for cycle, other in zip(BILLING_CYCLES, reversed(BILLING_CYCLES)):
+                    factor = price_factor[cycle]
+                    # Moving subscriptions between cycles rescales each cycle's volume
+                    if share is not None and n[cycle] > 0:
+                        if n[other] > 0:
+                            factor *= target[cycle] / (n[cycle] / total)
+                        elif target[other] > 0:
+                            if old[cycle] <= 0:
+                                raise ValueError(
+                                    f"{product_id} has no {cycle} list price to "
+                                    f"move subscriptions to {other} billing"
+                                )
+                            factor = (
+                                target[cycle] * factor
+                                + target[other] * new[other] / old[cycle]
+                            )
+                    factors[(product_id, cycle, month)] = factor
+        return pd.Series(factors, dtype=float)
+
+    # -------------- Results --------------#
+    def _results(self, totals: pd.Series) -> Tuple[Dict[str, float], pd.DataFrame]:
+        """Get the scenario KPIs and ARR bridge from summed customer flows."""
+        curr_rev = int(totals["curr_mrr"])
+        prev_q_rev = int(totals["prev_q_mrr"])
+        starting_mrr = int(totals["prev_mrr"])
+        retained = starting_mrr - int(totals["churn"]) - int(totals["contraction"])
+
+        kpis = dict(
+            arr=curr_rev * 12,
+            arr_growth=(
+                float((curr_rev - prev_q_rev) / prev_q_rev) if prev_q_rev > 0 else 0.0
+            ),
+            nrr=(
+                float((retained + int(totals["expansion"])) / starting_mrr)
+                if starting_mrr > 0
+                else 0.0
+            ),
+            grr=float(retained / starting_mrr) if starting_mrr > 0 else 0.0,
+            gross_margin=float(safe_margin(curr_rev - self.cogs, curr_rev)),
+            op_margin=float(safe_margin(curr_rev - self.cogs - self.opex, curr_rev)),
+        )
+
+        values = {
+            "bridge_starting": starting_mrr * 12,
+            "bridge_new": int(totals["new"]) * 12,
+            "bridge_expansion": int(totals["expansion"]) * 12,
+            "bridge_contraction": -int(totals["contraction"]) * 12,
+            "bridge_churn": -int(totals["churn"]) * 12,
+            "bridge_ending": curr_rev * 12,
+        }
+        bridge = pd.DataFrame(
+            {
+                "step": [step for step, _, _ in BRIDGE_STEPS],
+                "value": [values[col] for _, col, _ in BRIDGE_STEPS],
+                "type": [measure for _, _, measure in BRIDGE_STEPS],
+            }
+        )
+        return kpis, bridge
+
+    def run(self, overrides: Overrides) -> Tuple[Dict[str, float], pd.DataFrame]:
+        """Recompute KPIs (money in cents) and the ARR bridge under the overrides."""
+        if not overrides:
+            return self.baseline
+
+        factors = self._factors(overrides)
+        keys = pd.MultiIndex.from_frame(
+            self.spine[["product_id", "billing_cycle", "month"]]
+        )
+        row_factor = factors.reindex(keys).to_numpy()
+        affected = ~np.isnan(row_factor)
+
+        # Only customers holding an overridden product are reclassified
+        customers = self.spine.loc[affected, "customer_key"].unique()
+        held = self.spine["customer_key"].isin(customers).to_numpy()
+        rows = self.spine[held].copy()
+        scale = np.nan_to_num(row_factor[held], nan=1.0)
+        rows["mrr"] = np.round(rows["mrr"].to_numpy() * scale).astype(MONEY)
+
+        base = self._base_flows.loc[self._base_flows.index.isin(customers)]
+        totals = (
+            self._base_flows.sum() - base.sum() + self._customer_flows(rows).sum()
+        )
+        return self._results(totals)
+
+    def compare(self, scenarios: Dict[str, Overrides]) -> pd.DataFrame:
+        """Get the KPIs of the baseline and each named scenario side by side."""
+        results = {"Baseline": self.baseline[0]}
+        for name, overrides in scenarios.items():
+            results[name] = self.run(overrides)[0]
+        return pd.DataFrame(results).T
@@ -1,145 +1,481 @@
 import streamlit as st
-from core.db import get_engine
-from core.metrics import exec_overview_kpis, arr_bridge
-from core.dim_data import get_all_products, get_all_countries, get_all_months
-from ui.components import fmt_money, fmt_pct, fmt_months, fmt_multiple, fmt_margin
-import plotly.graph_objects as go
-
-engine = get_engine()
+from ui.layout import (
+    is_memoized,
+    load_listener,
+    memoized,
+    query_scope,
+    refresh_on_load,
+    search_picker,
+    skeleton_slot,
+    tenant_names,
+    track_queries,
+)
 
 st.set_page_config(page_title="Executive Overview", layout="wide")
 st.title("Executive Overview")
 
+# ---- Skeleton ----
+# Sections A-B are drawn as placeholders before the imports and queries below,
+# so a cold start paints while pandas, plotly and SQLAlchemy load
+st.subheader("North Star KPIs")
+north_star = skeleton_slot(
+    ["ARR", "NRR", "GRR", "Net Monthly Burn"],
+    ["Gross Margin", "Op Margin", "Burn Multiple", "Runway Months"],
+)
+st.divider()
 
-# Get product, country and month options from the database
-@st.cache_data(ttl=600)
+st.subheader("Runway Forecast")
+forecast_slot = skeleton_slot(
+    ["Runway P10", "Runway P50", "Runway P90", "Cash-out"], height=350
+)
+st.divider()
+
+st.subheader("ARR Bridge")
+bridge_slot = skeleton_slot(height=400)
+st.divider()
+
+import plotly.graph_objects as go  # noqa: E402 - deferred until after first paint
+from core.db import DEFAULT_TENANT, tenant_session  # noqa: E402
+from core.metrics import (  # noqa: E402
+    exec_overview_kpis,
+    arr_bridge,
+    cost_breakdown,
+    BRIDGE_STEPS,
+)
+from core.kpi_cube import cube_kpis  # noqa: E402
+from core.forecast import runway_forecast  # noqa: E402
+from core.scenarios import PricingScenarios  # noqa: E402
+from core.dim_data import (  # noqa: E402
+    get_all_products,
+    search_countries,
+    search_products,
+    get_all_months,
+    get_data_version,
+)
+from core.helpers import month_label  # noqa: E402
+from ui.components import (  # noqa: E402
+    fmt_money,
+    fmt_pct,
+    fmt_months,
+    fmt_multiple,
+    fmt_margin,
+    fmt_bound,
+    to_dollars,
+)
+
+# A newer rerun cancels this run's in-flight SQL; each run has a query budget
+track_queries()
+
+# Loads are pushed to this process (LISTEN/NOTIFY) instead of polled for
+load_listener()
+
+
+# Portfolio company whose data the whole page shows
+tenants = tenant_names()
+tenant_ids = list(tenants) or [DEFAULT_TENANT]
+tenant_id = st.sidebar.selectbox(
+    "Company",
+    options=tenant_ids,
+    index=tenant_ids.index(DEFAULT_TENANT) if DEFAULT_TENANT in tenant_ids else 0,
+    format_func=lambda t: tenants.get(t, t),
+)
+
+
+# Get product and month options from the database (result-cached per data version);
+# the Section C filters search their dimensions on demand instead
 def load_dim_options():
-    with engine.begin() as conn:
+    with tenant_session(tenant_id) as conn:
         products = (
             get_all_products(conn).set_index("product_name").to_dict(orient="index")
         )
-        countries = get_all_countries(conn)["country"].tolist()
         months = get_all_months(conn)["month"].tolist()
+        data_version = get_data_version(conn)
     months = sorted(months, reverse=True)
-    return products, countries, months
+    return products, months, data_version
 
 
-products, countries, months = load_dim_options()
-current_month = st.sidebar.selectbox("Current Month", options=months, index=0)
+products, months, data_version = load_dim_options()
+current_month = st.sidebar.selectbox(
+    "Current Month", options=months, index=0, format_func=month_label
+)
 
 # ---- Sidebar Filters ----
 # import debugpy; debugpy.breakpoint()
 st.sidebar.header("Filters")
 time_range = st.sidebar.radio("Time Range", options=["Last 12M", "YTD", "QTD"], index=0)
 
-# ---- Load Data ----
-with engine.begin() as conn:
-    global_kpis = exec_overview_kpis(
-        conn,
-        time_range=time_range,
-        end_month=current_month,
-    )
-    arr_bridge_data = arr_bridge(
-        conn,
-        time_range=time_range,
-        end_month=current_month,
-    )
+# Sections recompute only when these inputs change; Sections C and D are
+# fragments, so their widgets rerun just that section
+page_inputs = (tenant_id, data_version, current_month, time_range)
 
-# ---- Section A: North Star KPIs ----
-st.subheader("North Star KPIs")
-c1, c2, c3, c4 = st.columns(4)
-c1.metric("ARR", fmt_money(global_kpis["arr"]), fmt_pct(global_kpis["arr_growth"]))
-c2.metric("NRR", fmt_pct(global_kpis["nrr"]))
-c3.metric("GRR", fmt_pct(global_kpis["grr"]))
-c4.metric("Net Monthly Burn", fmt_money(global_kpis["net_monthly_burn"]))
-
-c5, c6, c7, c8 = st.columns(4)
-c5.metric("Gross Margin", fmt_margin(global_kpis["gross_margin"]))
-c6.metric("Op Margin", fmt_margin(global_kpis["op_margin"]))
-c7.metric(
-    "Burn Multiple",
-    (
-        "-"
-        if global_kpis["burn_multiple"] == 0
-        else fmt_multiple(global_kpis["burn_multiple"])
-    ),
+# Pick up a new load as soon as it is pushed
+refresh_on_load(tenant_id, data_version)
+
+
+# Approximate mode shows KPIs from the load-time customer sample first, then
+# swaps in the exact values
+approximate = st.sidebar.toggle(
+    "Fast Approximate Mode",
+    value=False,
+    help="Show sampled estimates with 95% bounds while the exact KPIs load.",
 )
-c8.metric("Runway Months", fmt_months(global_kpis["runway_months"]))
-# c8.metric(
-#     "Runway Months",
-#     "∞" if global_kpis['runway_months'] >= 9999
-#     else f"{global_kpis['runway_months']:.0f} mo"
-# ),
-# )
 
 
-st.write("Ending Cash Balance", f"${global_kpis['ending_cash_balance']:,.0f}")
+# ---- Load Data ----
+def load_overview_cube():
+    with tenant_session(tenant_id) as conn:
+        return cube_kpis(conn, current_month, time_range)
 
-st.divider()
 
-# ---- Section B: ARR Bridge ----
-st.subheader("ARR Bridge")
+def load_overview():
+    with tenant_session(tenant_id) as conn:
+        # Precomputed slice from the KPI cube, falling back to live queries
+        cached = cube_kpis(conn, current_month, time_range)
+        if cached is not None:
+            return cached
+        global_kpis = exec_overview_kpis(
+            conn,
+            time_range=time_range,
+            end_month=current_month,
+        )
+        arr_bridge_data = arr_bridge(
+            conn,
+            time_range=time_range,
+            end_month=current_month,
+        )
+    return global_kpis, arr_bridge_data
 
-# Prepare data for waterfall
-steps = arr_bridge_data
 
-if steps.empty:
-    st.info("No ARR bridge data available for the selected filters.")
-else:
+def load_overview_estimate():
+    # Imported on first use: most sessions never turn approximate mode on
+    from core.approx import approximate_kpis
+
+    with tenant_session(tenant_id) as conn:
+        return approximate_kpis(conn, current_month, time_range)
+
+
+def load_cost_breakdown():
+    with tenant_session(tenant_id) as conn:
+        return cost_breakdown(
+            conn,
+            time_range=time_range,
+            end_month=current_month,
+        )
+
+
+def render_north_star(global_kpis, margins=None):
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric(
+        "ARR", fmt_money(global_kpis["arr"]), fmt_pct(global_kpis["arr_growth"])
+    )
+    c2.metric("NRR", fmt_pct(global_kpis["nrr"]))
+    c3.metric("GRR", fmt_pct(global_kpis["grr"]))
+    c4.metric("Net Monthly Burn", fmt_money(global_kpis["net_monthly_burn"]))
+
+    c5, c6, c7, c8 = st.columns(4)
+    c5.metric("Gross Margin", fmt_margin(global_kpis["gross_margin"]))
+    c6.metric("Op Margin", fmt_margin(global_kpis["op_margin"]))
+    c7.metric(
+        "Burn Multiple",
+        (
+            "-"
+            if global_kpis["burn_multiple"] == 0
+            else fmt_multiple(global_kpis["burn_multiple"])
+        ),
+    )
+    c8.metric("Runway Months", fmt_months(global_kpis["runway_months"]))
+    # c8.metric(
+    #     "Runway Months",
+    #     "∞" if global_kpis['runway_months'] >= 9999
+    #     else f"{global_kpis['runway_months']:.0f} mo"
+    # ),
+    # )
+
+    st.write("Ending Cash Balance", fmt_money(global_kpis["ending_cash_balance"]))
+
+    if margins is not None:
+        st.caption(
+            "Approximate (customer sample, 95% bounds): "
+            f"ARR {fmt_bound(margins['arr'], fmt_money)}, "
+            f"ARR growth {fmt_bound(margins['arr_growth'], fmt_pct)}, "
+            f"NRR {fmt_bound(margins['nrr'], fmt_pct)}, "
+            f"GRR {fmt_bound(margins['grr'], fmt_pct)}, "
+            f"gross margin {fmt_bound(margins['gross_margin'], fmt_pct)}. "
+            "Loading exact values..."
+        )
+
+
+def render_bridge(steps, margins=None):
+    if steps.empty:
+        st.info("No ARR bridge data available for the selected filters.")
+        return
+
     waterfall = go.Figure(
         go.Waterfall(
             name="ARR Bridge",
             orientation="v",
             measure=steps["type"],
             x=steps["step"],
-            y=steps["value"],
+            y=to_dollars(steps["value"]),
             connector={"line": {"color": "rgba(90,90,90,0.5)"}},
         )
     )
     waterfall.update_layout(
-        title="ARR Waterfall Bridge",
+        title="ARR Waterfall Bridge" + (" (approximate)" if margins else ""),
         showlegend=False,
         margin=dict(l=20, r=20, t=40, b=20),
         height=400,
     )
     st.plotly_chart(waterfall, use_container_width=True)
 
+    if margins is not None:
+        st.caption(
+            "95% bounds: "
+            + ", ".join(
+                f"{step} {fmt_bound(margins[col], fmt_money)}"
+                for step, col, _ in BRIDGE_STEPS
+            )
+        )
+
+
+# ---- Section A: North Star KPIs / Section B: ARR Bridge ----
+# Estimate first only when the exact KPIs are not already at hand: neither
+# memoized nor precomputed in the cube (a cube hit is exact and as fast)
+estimate = None
+if (
+    approximate
+    and not is_memoized("overview", page_inputs)
+    and load_overview_cube() is None
+):
+    estimate = memoized("overview_estimate", page_inputs, load_overview_estimate)
+if estimate is not None:
+    with north_star.container():
+        render_north_star(estimate[0], estimate[2])
+    with bridge_slot.container():
+        render_bridge(estimate[1], estimate[2])
+
+# Exact KPIs and bridge replace the skeleton (or the estimates) in place
+global_kpis, arr_bridge_data = memoized("overview", page_inputs, load_overview)
+with north_star.container():
+    render_north_star(global_kpis)
+with bridge_slot.container():
+    render_bridge(arr_bridge_data)
+
+
+# ---- Section A2: Runway Forecast ----
+def load_forecast():
+    with tenant_session(tenant_id) as conn:
+        return runway_forecast(conn, current_month)
+
+
+forecast = memoized("forecast", (tenant_id, data_version, current_month), load_forecast)
+
+with forecast_slot.container():
+    if forecast is None:
+        st.info("Not enough cash history to forecast runway.")
+    else:
+        summary, bands = forecast
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Runway P10", fmt_months(summary["runway_p10"]))
+        c2.metric("Runway P50", fmt_months(summary["runway_p50"]))
+        c3.metric("Runway P90", fmt_months(summary["runway_p90"]))
+        c4.metric(
+            f"Cash-out within {summary['horizon_months']:.0f} mo",
+            fmt_pct(summary["prob_cash_out"]),
+        )
+        if summary["anchor_month"] < current_month:
+            st.caption(
+                "Forecast from the last month with an ending cash balance, "
+                f"{month_label(int(summary['anchor_month']))}."
+            )
+
+        x = bands["month"].map(month_label)
+        fan = go.Figure(
+            [
+                go.Scatter(
+                    x=x, y=to_dollars(bands["p90"]), name="P90", line=dict(width=0)
+                ),
+                go.Scatter(
+                    x=x,
+                    y=to_dollars(bands["p10"]),
+                    name="P10-P90",
+                    fill="tonexty",
+                    line=dict(width=0),
+                ),
+                go.Scatter(x=x, y=to_dollars(bands["p50"]), name="P50"),
+            ]
+        )
+        fan.update_layout(
+            title="Ending Cash Balance Forecast",
+            margin=dict(l=20, r=20, t=40, b=20),
+            height=350,
+        )
+        st.plotly_chart(fan, use_container_width=True)
+
+# ---- Section B2: Cost Breakdown ----
+st.subheader("Cost Breakdown")
+
+cost_breakdown_data = memoized("cost_breakdown", page_inputs, load_cost_breakdown)
+
+if cost_breakdown_data.empty:
+    st.info("No cost data available for the selected filters.")
+else:
+    c1, c2 = st.columns(2)
+    for col, (group, label) in zip((c1, c2), (("cogs", "COGS"), ("opex", "OpEx"))):
+        group_costs = (
+            cost_breakdown_data[cost_breakdown_data["cost_group"] == group]
+            .groupby(["month", "cost_category"], as_index=False)["amount"]
+            .sum()
+        )
+        breakdown = go.Figure(
+            [
+                go.Bar(
+                    name=category,
+                    x=rows["month"].map(month_label),
+                    y=to_dollars(rows["amount"]),
+                )
+                for category, rows in group_costs.groupby("cost_category")
+            ]
+        )
+        breakdown.update_layout(
+            title=f"{label} by Category",
+            barmode="stack",
+            margin=dict(l=20, r=20, t=40, b=20),
+            height=350,
+        )
+        col.plotly_chart(breakdown, use_container_width=True)
+
 st.divider()
 
 # ---- Section C: Product KPIs ----
-st.subheader("Product KPIs")
+@st.fragment
+def product_kpis_section(tenant_id, data_version, current_month, time_range):
+    st.subheader("Product KPIs")
 
-c1, c2 = st.columns(2)
+    c1, c2 = st.columns(2)
 
-# Filters for product and country
-product_name = c1.selectbox(
-    "Product Name",
-    options=["All"] + [p for p in products.keys()],
-    index=0,
-)
-country = c2.selectbox(
-    "Country",
-    options=["All"] + countries,
-    index=0,
-)
+    # Filters for product and country, searched server-side a page at a time
+    def search(dim_search):
+        def page(term, after):
+            with tenant_session(tenant_id) as conn:
+                return dim_search(conn, term, after)
 
-# Get product_id from product_name
-product_id = (
-    products.get(product_name, {}).get("product_id") if product_name != "All" else None
-)
+        return page
+
+    with c1:
+        product_id = search_picker(
+            "Product Name",
+            search(search_products),
+            (tenant_id, data_version),
+            key="product_filter",
+            value="product_id",
+            text="product_name",
+        )
+    with c2:
+        country = search_picker(
+            "Country",
+            search(search_countries),
+            (tenant_id, data_version),
+            key="country_filter",
+            value="country",
+        )
+    country = country or "All"
+
+    # Load product-specific KPIs if a specific product is selected
+    def load_product_kpis():
+        with query_scope("product_kpis"), tenant_session(tenant_id) as conn:
+            cached = cube_kpis(conn, current_month, time_range, product_id, country)
+            if cached is not None:
+                return cached[0]
+            return exec_overview_kpis(
+                conn,
+                product_id=product_id,
+                country=country,
+                time_range=time_range,
+                end_month=current_month,
+            )
+
+    product_kpis = memoized(
+        "product_kpis",
+        (tenant_id, data_version, current_month, time_range, product_id, country),
+        load_product_kpis,
+    )
+
+    c1, c2, c3, c4, c5 = st.columns(5)
+
+    c1.metric(
+        "ARR", fmt_money(product_kpis["arr"]), fmt_pct(product_kpis["arr_growth"])
+    )
+    c2.metric("NRR", fmt_pct(product_kpis["nrr"]))
+    c3.metric("GRR", fmt_pct(product_kpis["grr"]))
+
+    # Costs are allocated to products at load time, not to countries
+    by_product = country == "All"
+    allocation = "Payment fees by transaction; other costs by each category's driver."
+    c4.metric(
+        "Gross Margin",
+        fmt_margin(product_kpis["gross_margin"]) if by_product else "N/A",
+        help=allocation if by_product else "Not available for a single country.",
+    )
+    c5.metric(
+        "Op Margin",
+        fmt_margin(product_kpis["op_margin"]) if by_product else "N/A",
+        help=allocation if by_product else "Not available for a single country.",
+    )
+
+
+product_kpis_section(*page_inputs)
+
+st.divider()
+
+
+# ---- Section D: Pricing Scenario ----
+@st.fragment
+def pricing_scenario_section(tenant_id, data_version, current_month, time_range):
+    st.subheader("Pricing Scenario")
+
+    def load_scenarios():
+        with query_scope("scenarios"), tenant_session(tenant_id) as conn:
+            return PricingScenarios(conn, current_month, time_range)
+
+    # The spine is loaded once per page inputs; each scenario runs in memory
+    scenarios = memoized(
+        "scenarios",
+        (tenant_id, data_version, current_month, time_range),
+        load_scenarios,
+    )
+
+    c1, c2, c3, c4 = st.columns(4)
+    scenario_product = c1.selectbox("Scenario Product", options=list(products.keys()))
+    scenario_product_id = products[scenario_product]["product_id"]
+    list_prices = scenarios.prices.loc[scenario_product_id]
+    price_monthly = c2.number_input(
+        "Monthly Price",
+        min_value=0.0,
+        value=float(to_dollars(list_prices["price_monthly"])),
+    )
+    price_annual = c3.number_input(
+        "Annual Price",
+        min_value=0.0,
+        value=float(to_dollars(list_prices["price_annual"])),
+    )
+    shift_mix = c4.checkbox("Shift Billing Mix")
+
+    override = dict(price_monthly=price_monthly, price_annual=price_annual)
+    if shift_mix:
+        override["annual_share"] = c4.slider("Annual Share", 0.0, 1.0, 0.5, step=0.05)
+    scenario_kpis, _ = scenarios.run({scenario_product_id: override})
+    baseline_kpis, _ = scenarios.baseline
 
-# Load product-specific KPIs if a specific product is selected
-with engine.begin() as conn:
-    product_kpis = exec_overview_kpis(
-        conn,
-        product_id=product_id,
-        country=country,
-        time_range=time_range,
-        end_month=current_month,
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric(
+        "Scenario ARR",
+        fmt_money(scenario_kpis["arr"]),
+        f"{to_dollars(scenario_kpis['arr'] - baseline_kpis['arr']):+,.0f}",
     )
+    c2.metric("Scenario NRR", fmt_pct(scenario_kpis["nrr"]))
+    c3.metric("Scenario GRR", fmt_pct(scenario_kpis["grr"]))
+    c4.metric("Scenario Gross Margin", fmt_margin(scenario_kpis["gross_margin"]))
 
-c1, c2, c3 = st.columns(3)
 
-c1.metric("ARR", fmt_money(product_kpis["arr"]), fmt_pct(product_kpis["arr_growth"]))
-c2.metric("NRR", fmt_pct(product_kpis["nrr"]))
-c3.metric("GRR", fmt_pct(product_kpis["grr"]))
+pricing_scenario_section(*page_inputs)
@@ -2,8 +2,13 @@ import math
 import pandas as pd
 
 
-def fmt_money(x):
-    return f"${x:,.0f}"
+def to_dollars(cents):
+    """Convert integer cents (scalar or Series) to dollars for display."""
+    return cents / 100
+
+
+def fmt_money(cents):
+    return f"${to_dollars(cents):,.0f}"
 
 
 def fmt_pct(x):
@@ -20,3 +25,8 @@ def fmt_multiple(x):
 
 def fmt_margin(x):
     return "N/A" if pd.isna(x) else fmt_pct(x)
+
+
+def fmt_bound(x, fmt):
+    """Format an error-bound half-width with the value's own formatter."""
+    return "n/a" if x is None else f"±{fmt(x)}"
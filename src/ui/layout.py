@@ -1,5 +1,16 @@
+import contextlib
+import logging
+import os
 import streamlit as st
 
+logger = logging.getLogger(__name__)
+
+# Interval (e.g. "60s") at which open pages check for a pushed load and rerun;
+# unset, pages pick up a load on their next interaction instead
+REFRESH_EVERY = os.getenv("REFRESH_ON_LOAD_EVERY") or None
+# Seconds the tenant list is kept while the load listener is not connected
+TENANTS_TTL = 60
+
 
 def page_frame(title, subtitle=None, show_filters=True):
     """Standard page frame with title, subtitle, divider, and optional sidebar filters."""
@@ -10,3 +21,191 @@ def page_frame(title, subtitle=None, show_filters=True):
     if show_filters:
         with st.sidebar:
             st.subheader("Filters")
+
+
+def skeleton_slot(*rows, height=None):
+    """Reserve a section's slot and draw a placeholder until its data arrives.
+
+    Each of ``rows`` is a list of metric labels drawn without values; ``height``
+    reserves a chart's space. Fill the returned slot with ``slot.container()``.
+    """
+    slot = st.empty()
+    with slot.container():
+        for labels in rows:
+            for col, label in zip(st.columns(len(labels)), labels):
+                col.metric(label, "—")
+        if height:
+            st.container(height=height, border=True).caption("Loading…")
+    return slot
+
+
+def search_picker(label, search, inputs, key, value, text=None):
+    """Selectbox over a server-side dimension search, paged with a "More" button.
+
+    ``search(term, after)`` returns a page of rows and the next page's cursor
+    (core.dim_data.search_*). Pages are kept per session until the typed term or
+    ``inputs`` (e.g. tenant and data version) change. Returns the selected
+    ``value`` column entry, or None for "All".
+    """
+    term = st.text_input(
+        f"Search {label}", key=f"{key}_term", placeholder="Type to filter"
+    ).strip()
+    state = st.session_state.setdefault(f"_{key}_pages", {})
+    if state.get("query") != (term, inputs):
+        page, cursor = search(term, None)
+        state.update(query=(term, inputs), rows=[page], cursor=cursor)
+    if state["cursor"] is not None and st.button("More", key=f"{key}_more"):
+        page, cursor = search(term, state["cursor"])
+        state.update(rows=state["rows"] + [page], cursor=cursor)
+
+    labels = {}
+    for page in state["rows"]:
+        labels.update(zip(page[value], page[text or value]))
+    return st.selectbox(
+        label,
+        options=[None] + list(labels),
+        format_func=lambda v: "All" if v is None else labels[v],
+        key=key,
+    )
+
+
+def memoized(section, inputs, compute):
+    """Recompute a section's data only when its inputs change (per session)."""
+    memo = st.session_state.setdefault("_section_memo", {})
+    hit = memo.get(section)
+    if hit is not None and hit[0] == inputs:
+        return hit[1]
+    value = compute()
+    memo[section] = (inputs, value)
+    return value
+
+
+def is_memoized(section, inputs) -> bool:
+    """Whether memoized() would return ``section`` without recomputing it."""
+    hit = st.session_state.get("_section_memo", {}).get(section)
+    return hit is not None and hit[0] == inputs
+
+
+_warned_private_api = False
+
+
+def _rerun_pending(requests) -> bool:
+    """Whether Streamlit has a STOP or preempting RERUN request for this run.
+
+    Mirrors ScriptRequests.on_scriptrunner_yield without consuming the request:
+    fragment reruns queued behind a full run do not preempt it. This reads
+    private ScriptRequests attributes of the pinned Streamlit (requirements.txt);
+    if they are gone, superseded reruns are no longer cancelled, and that is
+    logged once.
+    """
+    global _warned_private_api
+    if not (hasattr(requests, "_state") and hasattr(requests, "_rerun_data")):
+        if not _warned_private_api:
+            _warned_private_api = True
+            logger.warning(
+                "ScriptRequests has no _state/_rerun_data in streamlit %s; "
+                "superseded reruns will not cancel their queries",
+                st.__version__,
+            )
+        return False
+    state = requests._state.value
+    if state == "STOP":
+        return True
+    if state != "RERUN":
+        return False
+    data = requests._rerun_data
+    return not data.fragment_id_queue or data.is_fragment_scoped_rerun
+
+
+def _scope_kwargs(name):
+    """Rerun scope key and hooks for this session's run of ``name``, or None."""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return None
+    requests = ctx.script_requests
+    return dict(
+        key=f"{ctx.session_id}/{name}",
+        superseded=lambda: _rerun_pending(requests),
+        on_cancel=st.empty,  # a yield point: raises Streamlit's pending rerun
+    )
+
+
+def track_queries(name="page"):
+    """Scope this run's SQL so a newer rerun cancels it and the query budget applies.
+
+    Superseded statements are cancelled server-side while they run; the run
+    then yields to Streamlit, which starts the pending rerun.
+    """
+    from core.inflight import begin_rerun
+
+    kwargs = _scope_kwargs(name)
+    if kwargs is not None:
+        begin_rerun(**kwargs)
+
+
+def query_scope(name):
+    """track_queries for one section (e.g. a fragment) as a context manager."""
+    from core.inflight import rerun_scope
+
+    kwargs = _scope_kwargs(name)
+    return rerun_scope(**kwargs) if kwargs is not None else contextlib.nullcontext()
+
+
+@st.cache_resource
+def shared_engine():
+    """Create the pooled engine once per Streamlit server, on first use."""
+    from core.db import get_engine
+
+    return get_engine()
+
+
+@st.cache_resource
+def load_listener():
+    """Start the process-wide load listener once per Streamlit server."""
+    from core.listener import start_listener
+
+    return start_listener()
+
+
+@st.cache_data(ttl=TENANTS_TTL, show_spinner=False)
+def _tenant_names(load_versions):
+    from core.dim_data import get_all_tenants
+
+    with shared_engine().connect() as conn:
+        tenants = get_all_tenants(conn)
+    return tenants.set_index("tenant_id")["tenant_name"].to_dict()
+
+
+def tenant_names():
+    """Get tenant names by id, read again only after a load is pushed.
+
+    Tenants appear with their first load, so the pushed data versions key the
+    cache; without a live listener the list expires after TENANTS_TTL instead.
+    """
+    from core.cache import pushed_versions
+
+    versions = pushed_versions()
+    return _tenant_names(None if versions is None else tuple(sorted(versions.items())))
+
+
+def refresh_on_load(tenant_id, data_version, every=REFRESH_EVERY):
+    """Rerun the page once the load listener has pushed a newer data version.
+
+    Opt-in (REFRESH_ON_LOAD_EVERY): every open session runs the check on that
+    timer. Only the in-process pushed version is checked, so waiting costs no
+    queries, and the page reruns only when the version changed.
+    """
+    from core.cache import pushed_version
+
+    if every is None:
+        return
+
+    @st.fragment(run_every=every)
+    def watch_data_version():
+        version = pushed_version(tenant_id)
+        if version is not None and version != data_version:
+            st.rerun()
+
+    watch_data_version()
@@ -0,0 +1,187 @@
+"""Parity of the event-delta MRR engine with the monthly snapshot.
+
+The snapshot side is built the way db/transform_upsert.sql fills
+core.fact_subscription_snapshot_monthly: a subscription is in every dim_month
+month from its start month through its end month (through the last month when
+open-ended), and a customer's MRR for a month is the sum over those rows.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import mrr_engine
+from core import queries as q
+
+MIN_MONTH, MAX_MONTH = 600, 611  # dim_month: twelve consecutive month keys
+
+# customer_key, product_id, country, start_month, end_month (None: open), mrr
+SUBSCRIPTIONS = [
+    # Starts and ends in the same month
+    (1, "p1", "DE", 603, 603, 5_000),
+    # Open-ended, and open-ended from before the first snapshot month
+    (2, "p1", "US", 605, None, 2_500),
+    (3, "p2", "US", 590, None, 1_000),
+    # Upgrade: the old plan ends the month before the new one starts
+    (4, "p1", "FR", 600, 604, 3_000),
+    (4, "p2", "FR", 605, None, 9_000),
+    # Upgrade within a month: both plans are billed in the switch month
+    (5, "p1", "DE", 601, 606, 1_200),
+    (5, "p1", "DE", 606, 609, 4_800),
+    # Gap, then a restart
+    (6, "p2", "US", 600, 602, 7_000),
+    (6, "p2", "US", 606, None, 7_500),
+    # Zero MRR keeps the customer-month, like the snapshot's rows
+    (7, "p2", "DE", 604, 607, 0),
+    # Ends before the first snapshot month
+    (8, "p1", "US", 580, 595, 4_000),
+]
+
+
+def _subscriptions(product_id=None, country=None):
+    """The subscription_events_sql result: one row per fact_subscription row."""
+    subs = pd.DataFrame(
+        SUBSCRIPTIONS,
+        columns=[
+            "customer_key",
+            "product_id",
+            "country",
+            "start_month",
+            "end_month",
+            "mrr",
+        ],
+    )
+    subs["end_month"] = subs["end_month"].astype("float64")  # NULL reads as NaN
+    if product_id is not None:
+        subs = subs[subs["product_id"] == product_id]
+    if country is not None:
+        subs = subs[subs["country"] == country]
+    return subs.reset_index(drop=True)
+
+
+def _snapshot(subs):
+    """Per-customer monthly MRR with the snapshot's month-join semantics."""
+    rows = [
+        (sub.customer_key, month, sub.mrr)
+        for sub in subs.itertuples()
+        for month in range(MIN_MONTH, MAX_MONTH + 1)
+        if sub.start_month <= month
+        and (np.isnan(sub.end_month) or sub.end_month >= month)
+    ]
+    snapshot = pd.DataFrame(rows, columns=["customer_key", "month", "mrr"])
+    snapshot = snapshot.groupby(["customer_key", "month"], as_index=False)["mrr"].sum()
+    return snapshot.astype({"customer_key": "int32", "month": "int32", "mrr": "int64"})
+
+
+class FakeReads:
+    """Serve the engine's and the snapshot's SQL from synthetic frames."""
+
+    def __init__(self, snapshot=None):
+        self.snapshot = snapshot
+        self.results = {}
+        self._add(
+            q.data_bounds_sql(),
+            pd.DataFrame({"min_month": [MIN_MONTH], "max_month": [MAX_MONTH]}),
+        )
+
+    def _add(self, sql_params, df):
+        sql, params = sql_params
+        self.results[(sql, tuple(sorted(params.items())))] = df
+
+    def __call__(self, conn, sql_params):
+        sql, params = sql_params
+        key = (sql, tuple(sorted(params.items())))
+        if key not in self.results:
+            filters = dict(
+                product_id=params.get("product_id"), country=params.get("country")
+            )
+            subs = _subscriptions(**filters)
+            snapshot = self.snapshot if self.snapshot is not None else _snapshot(subs)
+            self._add(q.subscription_events_sql(**filters), subs)
+            self._add(q.monthly_customer_mrr_sql(**filters), snapshot)
+        return self.results[key].copy()
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    fake = FakeReads()
+    monkeypatch.setattr(mrr_engine, "cached_read", fake)
+    return fake
+
+
+def _sorted(df):
+    df = df.sort_values(["customer_key", "month"]).reset_index(drop=True)
+    return df[["customer_key", "month", "mrr"]]
+
+
+def test_customer_mrr_matches_snapshot(reads):
+    engine = mrr_engine.customer_mrr(conn=None)
+    pd.testing.assert_frame_equal(_sorted(engine), _sorted(_snapshot(_subscriptions())))
+
+
+@pytest.mark.parametrize(
+    "customer_key, expected",
+    [
+        (1, {603: 5_000}),
+        (2, {m: 2_500 for m in range(605, 612)}),
+        (3, {m: 1_000 for m in range(600, 612)}),
+        (
+            4,
+            {
+                **{m: 3_000 for m in range(600, 605)},
+                **{m: 9_000 for m in range(605, 612)},
+            },
+        ),
+        (
+            5,
+            {
+                **{m: 1_200 for m in range(601, 606)},
+                606: 6_000,
+                **{m: 4_800 for m in range(607, 610)},
+            },
+        ),
+        (
+            6,
+            {600: 7_000, 601: 7_000, 602: 7_000, **{m: 7_500 for m in range(606, 612)}},
+        ),
+        (7, {m: 0 for m in range(604, 608)}),
+        (8, {}),
+    ],
+)
+def test_customer_mrr_cases(reads, customer_key, expected):
+    engine = mrr_engine.customer_mrr(conn=None)
+    rows = engine[engine["customer_key"] == customer_key]
+    assert dict(zip(rows["month"].tolist(), rows["mrr"].tolist())) == expected
+
+
+@pytest.mark.parametrize(
+    "product_id, country",
+    [(None, None), ("p1", None), ("p2", None), (None, "DE"), ("p1", "DE")],
+)
+def test_parity_check_finds_no_differences(reads, product_id, country):
+    mismatches = mrr_engine.parity_check(None, product_id, country)
+    assert mismatches.empty, mismatches
+
+
+def test_parity_check_reports_differences(monkeypatch):
+    snapshot = _snapshot(_subscriptions())
+    snapshot.loc[
+        (snapshot["customer_key"] == 6) & (snapshot["month"] == 606), "mrr"
+    ] += 1
+    snapshot = snapshot[~((snapshot["customer_key"] == 1) & (snapshot["month"] == 603))]
+    monkeypatch.setattr(mrr_engine, "cached_read", FakeReads(snapshot))
+
+    mismatches = mrr_engine.parity_check(None)
+    assert sorted(zip(mismatches["customer_key"], mismatches["month"])) == [
+        (1, 603),
+        (6, 606),
+    ]
+
+
+def test_total_mrr_matches_snapshot(reads):
+    expected = _snapshot(_subscriptions()).groupby("month")["mrr"].sum()
+    totals = mrr_engine.total_mrr(conn=None).set_index("month")["mrr"]
+    assert (
+        totals.to_dict()
+        == expected.reindex(range(MIN_MONTH, MAX_MONTH + 1), fill_value=0).to_dict()
+    )
@@ -0,0 +1,356 @@
+"""Validate the data/*.csv files against schema.json before the staging COPY.
+
+Each file is streamed in blocks with pyarrow's CSV reader, one file per worker
+process, and checked for column types, dates, missing values and foreign keys
+(against the key columns of the dimension files). Bad rows are written to a
+row-level reject file:
+
+    python3 utils/validate_csv.py --rejects validation_rejects.csv
+
+Exits 1 when any row or file is rejected, or when a file seed_all.sh loads is
+skipped (not in schema.json, or its key file is missing) unless --allow-skip is
+given, so seed_all.sh stops before COPY.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+
+# --- Configuration: where the CSVs and the load differ from schema.json ---
+# date_id columns (and employee dates) are YYYYMMDD, the transform's TO_DATE
+# format; dim_date's parts are cast to INT
+COLUMN_TYPES = {
+    "dim_date": {
+        "year": "integer",
+        "quarter": "integer",
+        "month": "integer",
+        "day": "integer",
+    },
+    "dim_employee": {"hire_date": "yyyymmdd", "termination_date": "yyyymmdd"},
+}
+DATE_ID_TYPE = "yyyymmdd"
+
+# Headers as they appear in the files -> schema.json column
+HEADER_ALIASES = {"dim_department": {"deparment_name": "department_name"}}
+
+# Schema columns the load assigns or resolves rather than reads from the CSV
+NOT_IN_CSV = {
+    "fact_payment_processing_cost": {
+        "payment_proc_cost_id",  # BIGSERIAL
+        "customer_id",  # from the revenue transaction
+        "transaction_id",  # from sub_source_record_id
+    }
+}
+
+# Columns that may be empty (NULL); every other schema column is NOT NULL in core
+NULLABLE = {
+    "dim_employee": {"termination_date"},
+    "fact_cash_balance": {"cash_in", "cash_out"},
+}
+
+# (table, column) -> (table, key column) it must reference
+FOREIGN_KEYS = {
+    ("dim_employee", "department_id"): ("dim_department", "department_id"),
+    ("fact_subscription_revenue", "date_id"): ("dim_date", "date_id"),
+    ("fact_subscription_revenue", "customer_id"): ("dim_customer", "customer_id"),
+    ("fact_subscription_revenue", "product_id"): ("dim_product", "product_id"),
+    ("fact_subscription_revenue", "currency_code"): ("dim_currency", "currency_code"),
+    ("fact_payment_processing_cost", "sub_source_record_id"): (
+        "fact_subscription_revenue",
+        "source_record_id",
+    ),
+    ("fact_payment_processing_cost", "date_id"): ("dim_date", "date_id"),
+    ("fact_payment_processing_cost", "currency_code"): (
+        "dim_currency",
+        "currency_code",
+    ),
+    ("fact_cloud_cost", "date_id"): ("dim_date", "date_id"),
+    ("fact_cloud_cost", "currency_code"): ("dim_currency", "currency_code"),
+    ("fact_other_expenses", "date_id"): ("dim_date", "date_id"),
+    ("fact_other_expenses", "other_expense_type_id"): (
+        "dim_other_expense_type",
+        "other_expense_type_id",
+    ),
+    ("fact_other_expenses", "currency_code"): ("dim_currency", "currency_code"),
+    ("fact_marketing_spend", "date_id"): ("dim_date", "date_id"),
+    ("fact_marketing_spend", "currency_code"): ("dim_currency", "currency_code"),
+    ("fact_fx_rate", "date_id"): ("dim_date", "date_id"),
+    ("fact_fx_rate", "currency_code"): ("dim_currency", "currency_code"),
+    ("fact_cash_balance", "date_id"): ("dim_date", "date_id"),
+}
+
+# Tables scripts/seed_all.sh COPYs into staging; skipping one fails the run
+SEEDED = {
+    "dim_currency",
+    "dim_customer",
+    "dim_date",
+    "dim_department",
+    "dim_employee",
+    "dim_other_expense_type",
+    "dim_product",
+    "fact_cloud_cost",
+    "fact_fx_rate",
+    "fact_marketing_spend",
+    "fact_other_expenses",
+    "fact_subscription_revenue",
+    "fact_payment_processing_cost",
+    "fact_cash_balance",
+}
+
+PATTERNS = {
+    "number": r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$",
+    "integer": r"^[+-]?\d+$",
+    "date": r"^\d{4}-\d{2}-\d{2}$",
+    "yyyymmdd": r"^\d{8}$",
+}
+DATE_FORMATS = {"date": "%Y-%m-%d", "yyyymmdd": "%Y%m%d"}
+# Postgres boolean input literals
+BOOLEANS = pa.array(
+    ["true", "false", "t", "f", "yes", "no", "y", "n", "on", "off", "1", "0"]
+)
+
+REJECT_COLUMNS = ["file", "row", "column", "value", "reason"]
+
+Reject = Tuple[str, int, str, Optional[str], str]
+
+
+# -------------- Schema --------------#
+def read_header(path: Path) -> List[str]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return next(csv.reader(f), [])
+
+
+def column_type(table: str, column: str, schema_type: str) -> str:
+    if column == "date_id":
+        return DATE_ID_TYPE
+    return COLUMN_TYPES.get(table, {}).get(column, schema_type)
+
+
+def _key_values(path: Path, table: str, column: str) -> pa.Array:
+    """Get the distinct values of a key column of a (dimension) file."""
+    raw = {v: k for k, v in HEADER_ALIASES.get(table, {}).items()}.get(column, column)
+    keys = pv.read_csv(
+        path,
+        convert_options=pv.ConvertOptions(
+            include_columns=[raw], column_types={raw: pa.string()}
+        ),
+    )
+    return pc.unique(keys.column(raw).drop_null().combine_chunks())
+
+
+# -------------- Checks (worker process) --------------#
+_key_files: Dict[str, str] = {}  # table -> CSV path
+_keys: Dict[Tuple[str, str], pa.Array] = {}
+
+
+def _init_worker(key_files: Dict[str, str]) -> None:
+    """Tell the worker where the referenced key columns are read from."""
+    global _key_files
+    _key_files = key_files
+
+
+def _key_set(ref: Tuple[str, str]) -> pa.Array:
+    """Get a referenced key set, read on first use and kept for the worker's life.
+
+    Only the workers validating a file that references it ever read a key set,
+    so a large one (fact_subscription_revenue.source_record_id) is not copied
+    to every process.
+    """
+    if ref not in _keys:
+        _keys[ref] = _key_values(Path(_key_files[ref[0]]), *ref)
+    return _keys[ref]
+
+
+def _invalid_type(values: pa.Array, kind: str) -> pa.Array:
+    """Mask of non-null values that do not parse as ``kind``."""
+    if kind == "string":
+        return pa.array([False] * len(values))
+    if kind == "boolean":
+        valid = pc.is_in(pc.utf8_lower(values), value_set=BOOLEANS)
+    else:
+        valid = pc.match_substring_regex(values, PATTERNS[kind])
+        if kind in DATE_FORMATS:
+            # strptime rolls 2023-02-31 over to March; only round trips are dates
+            fmt = DATE_FORMATS[kind]
+            parsed = pc.strptime(values, format=fmt, unit="s", error_is_null=True)
+            same = pc.equal(pc.strftime(parsed, format=fmt), values)
+            valid = pc.and_kleene(valid, same.fill_null(False))
+    return pc.and_(pc.is_valid(values), pc.invert(valid.fill_null(False)))
+
+
+def _checks(table: str, header: List[str], schema: Dict[str, str]):
+    """Get (raw column, schema column, type, nullable, key ref) per checked column."""
+    aliases = HEADER_ALIASES.get(table, {})
+    checks = []
+    for raw in header:
+        column = aliases.get(raw, raw)
+        ref = FOREIGN_KEYS.get((table, column))
+        if column not in schema and ref is None:
+            continue  # lineage and other load-only columns
+        kind = column_type(table, column, schema.get(column, "string"))
+        nullable = column in NULLABLE.get(table, set())
+        checks.append((raw, column, kind, nullable, ref))
+    return checks
+
+
+def validate_file(
+    path: str, table: str, schema: Dict[str, str], block_size: int, max_rejects: int
+) -> dict:
+    """Stream one CSV and collect its rejected rows (up to ``max_rejects``)."""
+    start = time.perf_counter()
+    name = Path(path).name
+    header = read_header(Path(path))
+    aliases = HEADER_ALIASES.get(table, {})
+    present = {aliases.get(c, c) for c in header}
+    missing = sorted(set(schema) - present - NOT_IN_CSV.get(table, set()))
+    result = dict(file=name, rows=0, rejected=0, stopped=False, rejects=[])
+    if missing:
+        result["rejects"] = [(name, 0, c, None, "missing column") for c in missing]
+        result.update(rejected=len(missing), stopped=True)
+        result["seconds"] = time.perf_counter() - start
+        return result
+
+    checks = _checks(table, header, schema)
+    reader = pv.open_csv(
+        path,
+        read_options=pv.ReadOptions(block_size=block_size),
+        convert_options=pv.ConvertOptions(
+            column_types={c: pa.string() for c in header},
+            null_values=[""],  # like COPY ... NULL ''
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+        ),
+    )
+    rejects: List[Reject] = []
+    for batch in reader:
+        first_row = result["rows"] + 1
+        bad_rows = pa.array([False] * batch.num_rows)
+        for raw, column, kind, nullable, ref in checks:
+            values = batch.column(raw)
+            problems = [(_invalid_type(values, kind), f"not a valid {kind}")]
+            if not nullable:
+                problems.append((pc.is_null(values), "missing value"))
+            if ref is not None:
+                unknown = pc.invert(pc.is_in(values, value_set=_key_set(ref)))
+                problems.append(
+                    (pc.and_(pc.is_valid(values), unknown), f"not in {ref[0]}.{ref[1]}")
+                )
+            for mask, reason in problems:
+                bad_rows = pc.or_(bad_rows, mask)
+                for i in pc.indices_nonzero(mask).to_pylist():
+                    if not max_rejects or len(rejects) < max_rejects:
+                        value = values[i].as_py()
+                        rejects.append((name, first_row + i, column, value, reason))
+
+        result["rows"] += batch.num_rows
+        result["rejected"] += pc.sum(bad_rows.cast(pa.int64())).as_py() or 0
+        if max_rejects and result["rejected"] >= max_rejects:
+            result["stopped"] = True  # fail fast: the file is already bad enough
+            break
+
+    result["rejects"] = sorted(rejects, key=lambda r: r[1])
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+# -------------- Main --------------#
+def validate(
+    paths: List[Path],
+    schema: Dict[str, Dict[str, str]],
+    workers: int,
+    block_size: int,
+    max_rejects: int,
+) -> Tuple[List[dict], List[str]]:
+    """Validate files in parallel; returns per-file results and skipped files."""
+    tables = {p.stem: p for p in paths}
+    skipped = [f"{p.name} (not in schema.json)" for p in paths if p.stem not in schema]
+
+    # Key sets come from the files in this run, so a bad dimension fails its facts
+    results = []
+    for (table, _), ref in FOREIGN_KEYS.items():
+        if table in tables and ref[0] not in tables:
+            skipped.append(f"{table}.csv (no {ref[0]}.csv to check keys)")
+    skipped_tables = {s.split(".")[0] for s in skipped}
+    key_files = {table: str(path) for table, path in tables.items()}
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(key_files,)
+    ) as pool:
+        futures = [
+            pool.submit(
+                validate_file, str(p), p.stem, schema[p.stem], block_size, max_rejects
+            )
+            for p in paths
+            if p.stem in schema and p.stem not in skipped_tables
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+    return sorted(results, key=lambda r: r["file"]), skipped
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", type=Path, help="Default: data/*.csv.")
+    parser.add_argument("--schema", type=Path, default=Path("schema.json"))
+    parser.add_argument("--rejects", type=Path, default=Path("validation_rejects.csv"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--block-size", type=int, default=16 << 20, help="Bytes per streamed block."
+    )
+    parser.add_argument(
+        "--max-rejects",
+        type=int,
+        default=1000,
+        help="Stop reading a file once this many of its rows are rejected (0: never).",
+    )
+    parser.add_argument(
+        "--allow-skip",
+        action="store_true",
+        help="Do not fail when a file seed_all.sh loads is skipped.",
+    )
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(Path("data").glob("*.csv"))
+    schema = json.loads(args.schema.read_text())
+    results, skipped = validate(
+        paths, schema, args.workers, args.block_size, args.max_rejects
+    )
+
+    with open(args.rejects, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(REJECT_COLUMNS)
+        for r in results:
+            writer.writerows(r["rejects"])
+
+    print(f"{'file':<36}{'rows':>10}{'rejected':>10}{'seconds':>9}")
+    for r in results:
+        rejected = f"{r['rejected']}{'+' if r['stopped'] else ''}"
+        print(f"{r['file']:<36}{r['rows']:>10}{rejected:>10}{r['seconds']:>9.2f}")
+    for name in skipped:
+        print(f"skipped: {name}")
+
+    failed = [r["file"] for r in results if r["rejected"]]
+    unchecked = [s for s in skipped if s.split(".")[0] in SEEDED]
+    if failed:
+        print(f"\nRejected rows in {len(failed)} file(s); see {args.rejects}")
+    if unchecked and not args.allow_skip:
+        print(f"\n{len(unchecked)} loaded file(s) not validated (see --allow-skip)")
+    if failed or (unchecked and not args.allow_skip):
+        sys.exit(1)
+    print(f"\nAll {'checked ' if skipped else ''}files valid.")
+
+
+if __name__ == "__main__":
+    main()